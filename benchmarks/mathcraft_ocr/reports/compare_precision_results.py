@@ -0,0 +1,125 @@
+# coding: utf-8
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from statistics import mean
+import sys
+from typing import Any
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+from analyze_unimer_results import (  # noqa: E402
+    _compute_metrics,
+    _percentile,
+    _rate,
+    _read_jsonl,
+    _read_manifest,
+    normalize_latex,
+    normalized_edit_distance,
+    tokenize_latex,
+)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare accuracy and latency of two MathCraft runs, e.g. fp32 against int8."
+    )
+    parser.add_argument("--baseline", required=True, help="Baseline JSONL result file (usually fp32).")
+    parser.add_argument("--candidate", required=True, help="Candidate JSONL result file (usually int8).")
+    parser.add_argument("--manifest", default="", help="Optional manifest JSONL with target_latex.")
+    parser.add_argument("--output", default="", help="Markdown report path. Prints to stdout when omitted.")
+    args = parser.parse_args(argv)
+
+    baseline = _read_jsonl(Path(args.baseline))
+    candidate = _read_jsonl(Path(args.candidate))
+    manifest = _read_manifest(Path(args.manifest)) if args.manifest else None
+    report = render_report(baseline, candidate, manifest)
+    if args.output:
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(report, encoding="utf-8")
+        print(f"wrote {output_path}")
+    else:
+        print(report)
+    return 0
+
+
+def summarize_run(rows: list[dict[str, Any]], manifest: dict[str, dict[str, Any]] | None) -> dict[str, Any]:
+    latencies = [float(row.get("latency_ms") or 0.0) for row in rows if row.get("ok")]
+    tokens_per_sec = [float(row["formula_tokens_per_sec"]) for row in rows if row.get("formula_tokens_per_sec")]
+    precisions = sorted({str(row.get("precision") or "fp32") for row in rows})
+    summary: dict[str, Any] = {
+        "precision": "/".join(precisions) or "fp32",
+        "rows": len(rows),
+        "ok_rate": _rate(sum(1 for row in rows if row.get("ok")), len(rows)),
+        "latency_mean_ms": round(mean(latencies), 3) if latencies else 0.0,
+        "latency_p50_ms": _percentile(latencies, 50),
+        "latency_p95_ms": _percentile(latencies, 95),
+        "tokens_per_sec": round(mean(tokens_per_sec), 3) if tokens_per_sec else 0.0,
+    }
+    if manifest is not None:
+        metrics = _compute_metrics(rows, manifest)
+        summary["norm_exact_rate"] = _rate(sum(1 for item in metrics if item["norm_exact"]), len(metrics))
+        summary["token_ned_mean"] = (
+            round(mean(item["token_normalized_edit_distance"] for item in metrics), 6) if metrics else 0.0
+        )
+    return summary
+
+
+def compare_outputs(baseline: list[dict[str, Any]], candidate: list[dict[str, Any]]) -> dict[str, Any]:
+    by_id = {str(row.get("sample_id", "")): row for row in baseline}
+    agree = 0
+    distances: list[float] = []
+    for row in candidate:
+        other = by_id.get(str(row.get("sample_id", "")))
+        if other is None:
+            continue
+        left = normalize_latex(str(other.get("text", "")))
+        right = normalize_latex(str(row.get("text", "")))
+        agree += int(left == right)
+        distances.append(normalized_edit_distance(tokenize_latex(left), tokenize_latex(right)))
+    return {
+        "paired_rows": len(distances),
+        "agreement_rate": _rate(agree, len(distances)),
+        "token_ned_mean": round(mean(distances), 6) if distances else 0.0,
+    }
+
+
+def render_report(
+    baseline: list[dict[str, Any]],
+    candidate: list[dict[str, Any]],
+    manifest: dict[str, dict[str, Any]] | None = None,
+) -> str:
+    runs = [("baseline", summarize_run(baseline, manifest)), ("candidate", summarize_run(candidate, manifest))]
+    columns = ["precision", "rows", "ok_rate", "latency_mean_ms", "latency_p50_ms", "latency_p95_ms", "tokens_per_sec"]
+    if manifest is not None:
+        columns += ["norm_exact_rate", "token_ned_mean"]
+    lines = [
+        "# MathCraft Precision Comparison",
+        "",
+        "| run | " + " | ".join(columns) + " |",
+        "|---|" + "---:|" * len(columns),
+    ]
+    for name, summary in runs:
+        lines.append(f"| {name} | " + " | ".join(str(summary[column]) for column in columns) + " |")
+
+    base_p50 = runs[0][1]["latency_p50_ms"]
+    cand_p50 = runs[1][1]["latency_p50_ms"]
+    paired = compare_outputs(baseline, candidate)
+    lines += [
+        "",
+        f"- p50 speedup: {round(base_p50 / cand_p50, 3) if cand_p50 else 0.0}x",
+        f"- paired rows: {paired['paired_rows']}",
+        f"- output agreement (normalized exact): {paired['agreement_rate']}",
+        f"- output token NED vs baseline: {paired['token_ned_mean']}",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,139 @@
+# coding: utf-8
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import mathcraft_ocr.adapters.formula_recognizer as formula_recognizer_mod  # noqa: E402
+
+
+class _NodeArg:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+
+class _Tokenizer:
+    bos_token_id = 0
+    eos_token_id = 1
+
+    def decode(self, ids, skip_special_tokens=True):
+        _ = skip_special_tokens
+        return " ".join(f"t{token}" for token in ids)
+
+
+class _Processor:
+    tokenizer = _Tokenizer()
+
+    def __call__(self, images, return_tensors="np"):
+        _ = return_tensors
+        return {"pixel_values": np.zeros((len(images), 3, 2, 2), dtype=np.float32)}
+
+
+class _EncoderSession:
+    def get_inputs(self):
+        return [_NodeArg("pixel_values")]
+
+    def run(self, _outputs, feeds):
+        return [np.zeros((feeds["pixel_values"].shape[0], 1, 1), dtype=np.float32)]
+
+
+class _DecoderSession:
+    def __init__(self, vocab_size: int, max_batch: int) -> None:
+        rng = np.random.default_rng(0)
+        self._logits = rng.standard_normal((max_batch, 1, vocab_size)).astype(np.float32)
+        self._logits[:, :, 1] = -1e4
+
+    def get_inputs(self):
+        return [_NodeArg("input_ids"), _NodeArg("encoder_hidden_states")]
+
+    def get_outputs(self):
+        return [_NodeArg("logits")]
+
+    def run(self, _outputs, feeds):
+        return [self._logits[: feeds["input_ids"].shape[0]]]
+
+
+def _legacy_decode(decoder: _DecoderSession, encoder_hidden_states: np.ndarray, steps: int) -> None:
+    batch_size = encoder_hidden_states.shape[0]
+    input_ids = np.zeros((batch_size, 1), dtype=np.int64)
+    token_ids: list[list[int]] = [[] for _ in range(batch_size)]
+    token_scores: list[list[float]] = [[] for _ in range(batch_size)]
+    for _ in range(steps):
+        logits = decoder.run(None, {"input_ids": input_ids, "encoder_hidden_states": encoder_hidden_states})[0]
+        logits = logits[:, -1, :]
+        shifted = logits - np.max(logits, axis=-1, keepdims=True)
+        exp = np.exp(shifted)
+        probs = exp / np.sum(exp, axis=-1, keepdims=True)
+        next_tokens = np.argmax(probs, axis=1).astype(np.int64)
+        for row, next_token in enumerate(next_tokens.tolist()):
+            token_ids[row].append(next_token)
+            token_scores[row].append(float(probs[row, next_token]))
+        input_ids = np.concatenate([input_ids, next_tokens.reshape(-1, 1)], axis=1)
+
+
+def _measure(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure per-step formula decode bookkeeping overhead.")
+    parser.add_argument("--batch-sizes", default="1,8,32", help="Comma-separated batch sizes.")
+    parser.add_argument("--steps", type=int, default=256, help="Decode steps per run.")
+    parser.add_argument("--vocab-size", type=int, default=50000, help="Decoder vocabulary size.")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per measurement; the best is reported.")
+    args = parser.parse_args(argv)
+
+    batch_sizes = [int(item) for item in args.batch_sizes.split(",") if item.strip()]
+    encoder = _EncoderSession()
+    decoder = _DecoderSession(args.vocab_size, max(batch_sizes))
+    sessions = {
+        formula_recognizer_mod.ENCODER_FILENAME: encoder,
+        formula_recognizer_mod.DECODER_FILENAME: decoder,
+    }
+    formula_recognizer_mod._load_processor = lambda model_dir: _Processor()
+    formula_recognizer_mod.create_session = lambda model_path, provider_info, session_options: sessions[Path(model_path).name]
+
+    print("batch  legacy_us_per_step  current_us_per_step")
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = Path(tmp)
+        (model_dir / "generation_config.json").write_text(
+            '{"decoder_start_token_id": 0, "eos_token_id": 1}',
+            encoding="utf-8",
+        )
+        for batch_size in batch_sizes:
+            images = [np.zeros((2, 2, 3), dtype=np.uint8) for _ in range(batch_size)]
+            states = np.zeros((batch_size, 1, 1), dtype=np.float32)
+            legacy = _measure(lambda: _legacy_decode(decoder, states, args.steps), args.repeats)
+            current = _measure(
+                lambda: formula_recognizer_mod.recognize_formula_images(
+                    images,
+                    model_dir,
+                    None,
+                    max_new_tokens=args.steps,
+                    decode_mode="full",
+                    repetition_guard=False,
+                ),
+                args.repeats,
+            )
+            print(f"{batch_size:5d}  {legacy / args.steps * 1e6:18.1f}  {current / args.steps * 1e6:19.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,82 @@
+# coding: utf-8
+
+from __future__ import annotations
+
+import argparse
+import os
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from mathcraft_ocr.image import load_image_rgb  # noqa: E402
+from mathcraft_ocr.transport import SharedImageWriter, attach_shared_image  # noqa: E402
+
+
+A4_INCHES = (8.27, 11.69)
+
+
+def _page_image(width: int, height: int) -> Image.Image:
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    line_height = max(12, height // 60)
+    for row, top in enumerate(range(line_height * 2, height - line_height * 2, line_height)):
+        text = f"{row:03d} integral_0^1 x^{row % 7} dx = 1/{row % 7 + 1}  " * 4
+        draw.text((width // 12, top), text, fill=(20, 20, 20))
+    return image
+
+
+def _png_round_trip(image: Image.Image) -> None:
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
+        tmp_path = tmp.name
+        image.save(tmp, format="PNG", compress_level=1)
+    try:
+        load_image_rgb(tmp_path)
+    finally:
+        os.unlink(tmp_path)
+
+
+def _shm_round_trip(image: Image.Image) -> None:
+    with SharedImageWriter(image) as shared:
+        with attach_shared_image(shared.descriptor) as pixels:
+            load_image_rgb(pixels)
+
+
+def _measure(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare temp-PNG and shared-memory image hand-off between the app and the worker."
+    )
+    parser.add_argument("--dpis", default="144,200,300", help="Comma-separated A4 page render DPIs.")
+    parser.add_argument("--repeats", type=int, default=7, help="Runs per measurement; the best is reported.")
+    args = parser.parse_args(argv)
+
+    print("size          png_ms   shm_ms  speedup")
+    sizes = [("crop", 640, 160)]
+    for dpi in (int(item) for item in args.dpis.split(",") if item.strip()):
+        sizes.append((f"a4@{dpi}", round(A4_INCHES[0] * dpi), round(A4_INCHES[1] * dpi)))
+    for label, width, height in sizes:
+        image = _page_image(width, height)
+        png = _measure(lambda: _png_round_trip(image), args.repeats)
+        shm = _measure(lambda: _shm_round_trip(image), args.repeats)
+        print(f"{label:10s} {png * 1e3:9.1f} {shm * 1e3:8.1f} {png / shm:7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
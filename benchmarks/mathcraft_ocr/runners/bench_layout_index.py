@@ -0,0 +1,124 @@
+# coding: utf-8
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import replace
+from pathlib import Path
+import random
+import sys
+import time
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import mathcraft_ocr.layout as layout_mod  # noqa: E402
+from mathcraft_ocr.results import MathCraftBlock  # noqa: E402
+from mathcraft_ocr.spatial import BoxGrid  # noqa: E402
+
+
+PAGE_SIZE = (1240, 1754)
+FORMULA_KINDS = {"formula", "embedding", "inline_formula", "isolated", "display_formula"}
+
+
+def _synthetic_page(box_count: int, seed: int) -> list[MathCraftBlock]:
+    rng = random.Random(seed)
+    width, height = PAGE_SIZE
+    columns = ((80.0, 600.0), (640.0, 1160.0))
+    per_line = 6
+    lines_per_column = max(1, -(-box_count // (per_line * len(columns))))
+    pitch = (height - 160.0) / lines_per_column
+    line_height = max(4.0, pitch * 0.7)
+    blocks: list[MathCraftBlock] = []
+    for left, right in columns:
+        segment = (right - left) / per_line
+        for row in range(lines_per_column):
+            top = 80.0 + row * pitch + rng.uniform(-1.0, 1.0)
+            for slot in range(per_line):
+                if len(blocks) >= box_count:
+                    break
+                x1 = left + slot * segment + rng.uniform(0.0, 4.0)
+                x2 = x1 + segment * rng.uniform(0.6, 0.95)
+                box = layout_mod.xyxy_to_box(x1, top, x2, top + line_height)
+                if rng.random() < 0.2:
+                    blocks.append(MathCraftBlock(kind="embedding", box=box, text="x^2", score=0.9, source="formula_rec"))
+                else:
+                    text = rng.choice(("the value", "is given by", "where", "(3)", "hence"))
+                    blocks.append(MathCraftBlock(kind="text", box=box, text=text, score=0.9))
+    rng.shuffle(blocks)
+    return [replace(block, image_size=(width, height)) for block in blocks]
+
+
+def _legacy_resolve(blocks: list[MathCraftBlock]) -> tuple[MathCraftBlock, ...]:
+    # Full scan over every formula for every text block, as before the grid.
+    formula_blocks = tuple(
+        block for block in blocks if block.kind in FORMULA_KINDS or block.source == "formula_rec"
+    )
+    resolved: list[MathCraftBlock] = []
+    for block in blocks:
+        if block in formula_blocks or block.kind != "text":
+            resolved.append(block)
+            continue
+        text = block.text.strip()
+        adjacent = layout_mod._is_formula_adjacent(block, formula_blocks, image_size=PAGE_SIZE)
+        if layout_mod._is_formula_label_text(text) and adjacent:
+            resolved.append(replace(block, role=block.role or "formula_label"))
+            continue
+        if layout_mod._is_formula_anchor_text(text) and adjacent:
+            resolved.append(replace(block, role=block.role or "formula_anchor"))
+            continue
+        if layout_mod._is_text_swallowed_by_formula(block, formula_blocks):
+            continue
+        resolved.append(block)
+    return tuple(resolved)
+
+
+def _split_all(blocks: list[MathCraftBlock], *, indexed: bool) -> None:
+    formula_boxes = [block.box for block in blocks if block.kind != "text"]
+    grid = BoxGrid(formula_boxes) if indexed else None
+    for block in blocks:
+        if block.kind == "text":
+            layout_mod.split_text_box_around_formulas(block.box, formula_boxes, formula_grid=grid)
+
+
+def _measure(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure formula/text overlap passes on synthetic pages with and without the grid index."
+    )
+    parser.add_argument("--box-counts", default="250,500,1000,2000", help="Comma-separated boxes per page.")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per measurement; the best is reported.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print("boxes   split_scan_ms split_grid_ms resolve_scan_ms resolve_grid_ms")
+    for count in (int(item) for item in args.box_counts.split(",") if item.strip()):
+        blocks = _synthetic_page(count, args.seed)
+        if _legacy_resolve(blocks) != layout_mod.resolve_formula_text_conflicts(blocks, image_size=PAGE_SIZE):
+            raise SystemExit(f"grid and scan results differ for {count} boxes")
+        split_scan = _measure(lambda: _split_all(blocks, indexed=False), args.repeats)
+        split_grid = _measure(lambda: _split_all(blocks, indexed=True), args.repeats)
+        resolve_scan = _measure(lambda: _legacy_resolve(blocks), args.repeats)
+        resolve_grid = _measure(
+            lambda: layout_mod.resolve_formula_text_conflicts(blocks, image_size=PAGE_SIZE),
+            args.repeats,
+        )
+        print(
+            f"{count:5d} {split_scan * 1e3:15.1f} {split_grid * 1e3:13.1f}"
+            f" {resolve_scan * 1e3:15.1f} {resolve_grid * 1e3:15.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -5,6 +5,7 @@ from __future__ import annotations
 import argparse
 import json
 from pathlib import Path
+import statistics
 import sys
 import time
 import traceback
@@ -15,6 +16,8 @@ ROOT = Path(__file__).resolve().parents[3]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
+from mathcraft_ocr.manifest import MODEL_PRECISIONS  # noqa: E402
+from mathcraft_ocr.profiles import FORMULA_RECOGNIZER_ID  # noqa: E402
 from mathcraft_ocr.runtime import MathCraftRuntime  # noqa: E402
 from mathcraft_ocr.serialization import formula_result_to_json, mixed_result_to_json  # noqa: E402
 
@@ -26,6 +29,24 @@ def main(argv: list[str] | None = None) -> int:
     parser.add_argument("--provider", default="auto", help="MathCraft provider preference.")
     parser.add_argument("--offset", type=int, default=0, help="Number of manifest rows to skip.")
     parser.add_argument("--limit", type=int, default=0, help="Maximum rows to run. 0 means all rows.")
+    parser.add_argument(
+        "--formula-decode-mode",
+        choices=("auto", "full", "cached"),
+        default="auto",
+        help="Formula decoder path: cached past-key-values, full-sequence fallback, or auto.",
+    )
+    parser.add_argument(
+        "--mixed-pipeline",
+        choices=("auto", "sequential", "concurrent"),
+        default=None,
+        help="Run mixed-page detectors and recognizers sequentially or on two threads.",
+    )
+    parser.add_argument(
+        "--precision",
+        choices=MODEL_PRECISIONS,
+        default=None,
+        help="Model precision variant; models without that variant fall back to fp32.",
+    )
     args = parser.parse_args(argv)
 
     manifest_path = Path(args.manifest)
@@ -40,15 +61,33 @@ def main(argv: list[str] | None = None) -> int:
     samples = samples[args.offset :]
     if args.limit:
         samples = samples[: args.limit]
-    runtime = MathCraftRuntime(provider_preference=args.provider)
+    runtime = MathCraftRuntime(
+        provider_preference=args.provider,
+        formula_decode_mode=args.formula_decode_mode,
+        precision=args.precision,
+        mixed_pipeline_mode=args.mixed_pipeline,
+    )
 
+    peak_growths: list[float] = []
     with output_path.open("w", encoding="utf-8") as fh:
         for sample in samples:
             result = _run_sample(runtime, sample, args.provider, manifest_path.parent)
+            if result["peak_rss_growth_mb"] is not None:
+                peak_growths.append(result["peak_rss_growth_mb"])
             fh.write(json.dumps(result, ensure_ascii=False) + "\n")
             fh.flush()
 
     print(f"wrote {len(samples)} results to {output_path}")
+    if peak_growths:
+        print(
+            f"peak RSS growth per page: median {statistics.median(peak_growths):.1f} MB, "
+            f"max {max(peak_growths):.1f} MB"
+        )
+    for mode, totals in sorted(runtime.formula_decode_summary().items()):
+        print(
+            f"formula decode [{mode}]: {int(totals['tokens'])} tokens in "
+            f"{totals['seconds']:.3f}s ({totals['tokens_per_second']:.1f} tokens/s)"
+        )
     return 0
 
 
@@ -77,6 +116,8 @@ def _run_sample(
     profile = _profile_for_sample(sample)
     image_path = _resolve_path(str(sample.get("image", "")), manifest_dir)
 
+    decode_before = runtime.formula_decode_summary()
+    rss_before = _reset_peak_rss()
     started = time.perf_counter()
     try:
         if profile == "formula":
@@ -137,9 +178,76 @@ def _run_sample(
             "blocks": [],
             "errors": [f"{type(exc).__name__}: {exc}", traceback.format_exc()],
         }
+    result.update(_formula_decode_fields(decode_before, runtime.formula_decode_summary()))
+    result["precision"] = runtime.model_precisions().get(FORMULA_RECOGNIZER_ID)
+    result.update(_peak_rss_fields(rss_before, _peak_rss_bytes()))
+    if profile == "mixed" and result["ok"]:
+        result["stage_ms"] = {
+            stage: round(seconds * 1000.0, 3)
+            for stage, seconds in runtime.mixed_stage_timings().items()
+        }
     return result
 
 
+def _formula_decode_fields(
+    before: dict[str, dict[str, float]],
+    after: dict[str, dict[str, float]],
+) -> dict[str, Any]:
+    for mode, totals in after.items():
+        previous = before.get(mode, {})
+        tokens = totals["tokens"] - previous.get("tokens", 0.0)
+        seconds = totals["seconds"] - previous.get("seconds", 0.0)
+        if tokens > 0 and seconds > 0:
+            return {
+                "formula_decode_mode": mode,
+                "formula_tokens_per_sec": round(tokens / seconds, 3),
+            }
+    return {"formula_decode_mode": None, "formula_tokens_per_sec": None}
+
+
+def _reset_peak_rss() -> int | None:
+    # Linux can reset the high-water mark to the current RSS, so the page's peak is its own.
+    # Elsewhere the process-wide peak only grows, and the growth is what the page added.
+    try:
+        Path("/proc/self/clear_refs").write_text("5", encoding="ascii")
+    except OSError:
+        pass
+    return _peak_rss_bytes()
+
+
+def _peak_rss_bytes() -> int | None:
+    try:
+        status = Path("/proc/self/status").read_text(encoding="ascii")
+    except OSError:
+        status = ""
+    for line in status.splitlines():
+        if line.startswith("VmHWM:"):
+            return int(line.split()[1]) * 1024
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        peak = getattr(psutil.Process().memory_info(), "peak_wset", None)
+        if peak is not None:
+            return int(peak)
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return int(peak) if sys.platform == "darwin" else int(peak) * 1024
+
+
+def _peak_rss_fields(before: int | None, after: int | None) -> dict[str, Any]:
+    if after is None:
+        return {"peak_rss_mb": None, "peak_rss_growth_mb": None}
+    return {
+        "peak_rss_mb": round(after / 2**20, 3),
+        "peak_rss_growth_mb": round(max(0, after - (before or 0)) / 2**20, 3),
+    }
+
+
 def _profile_for_sample(sample: dict[str, Any]) -> str:
     profile = str(sample.get("profile", "") or "").strip().lower()
     if profile in {"formula", "text", "mixed"}:
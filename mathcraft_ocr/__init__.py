@@ -6,7 +6,9 @@ __version__ = "0.2.4"
 
 __all__ = [
     "DoctorReport",
+    "FormulaBatchPolicy",
     "FormulaRecognitionResult",
+    "FormulaResultCachePolicy",
     "MathCraftBlock",
     "MathCraftError",
     "MathCraftRuntime",
@@ -19,7 +21,9 @@ __all__ = [
 
 def __getattr__(name: str) -> object:
     if name in {
+        "FormulaBatchPolicy",
         "FormulaRecognitionResult",
+        "FormulaResultCachePolicy",
         "MathCraftBlock",
         "MathCraftRuntime",
         "MixedRecognitionResult",
@@ -2,11 +2,89 @@
 
 from __future__ import annotations
 
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+import functools
+import hashlib
 import importlib
+import json
+import os
+import platform
+import threading
+import time
 from functools import lru_cache
 from pathlib import Path
 
 from ..providers import GPU_PROVIDER_NAMES, ProviderInfo
+from ..session_options import DEFAULT_SESSION_OPTIONS, SessionOptionsProfile
+
+
+@dataclass(frozen=True)
+class SessionBuildStats:
+    model_path: str
+    seconds: float
+    cache_hit: bool
+    saved_seconds: float = 0.0
+
+
+_GRAPH_OPTIMIZATION_ATTRS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+_session_build_stats: list[SessionBuildStats] = []
+
+
+class ModelDirCache:
+    """LRU cache keyed by call arguments whose first argument is a model path.
+
+    Unlike ``functools.lru_cache`` it can drop only the entries under some model
+    directories, so repairing one model keeps the sessions of the others.
+    """
+
+    def __init__(self, fn: Callable, maxsize: int) -> None:
+        functools.update_wrapper(self, fn)
+        self._fn = fn
+        self._maxsize = maxsize
+        self._entries: OrderedDict[tuple, object] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, *args):
+        with self._lock:
+            if args in self._entries:
+                self._entries.move_to_end(args)
+                return self._entries[args]
+        value = self._fn(*args)
+        with self._lock:
+            self._entries[args] = value
+            self._entries.move_to_end(args)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def cache_clear(self, model_dirs: Iterable[str | Path] | None = None) -> None:
+        with self._lock:
+            if model_dirs is None:
+                self._entries.clear()
+                return
+            roots = [_path_key(path) for path in model_dirs]
+            for args in list(self._entries):
+                key = _path_key(args[0])
+                if any(key == root or key.startswith(root + os.sep) for root in roots):
+                    del self._entries[args]
+
+
+def model_dir_cache(maxsize: int) -> Callable[[Callable], ModelDirCache]:
+    return lambda fn: ModelDirCache(fn, maxsize)
+
+
+def _path_key(path: str | Path) -> str:
+    return os.path.normcase(os.path.realpath(str(path)))
 
 
 def _ort():
@@ -23,10 +101,25 @@ def session_providers(provider_info: ProviderInfo) -> list[str]:
     return available
 
 
-def create_session(model_path: str | Path, provider_info: ProviderInfo):
-    model_path = str(Path(model_path).resolve())
+@lru_cache(maxsize=64)
+def _resolved_model_path(model_path: str) -> str:
+    return str(Path(model_path).resolve())
+
+
+def drain_session_build_stats() -> list[SessionBuildStats]:
+    stats = list(_session_build_stats)
+    _session_build_stats.clear()
+    return stats
+
+
+def create_session(
+    model_path: str | Path,
+    provider_info: ProviderInfo,
+    session_options: SessionOptionsProfile = DEFAULT_SESSION_OPTIONS,
+):
+    model_path = _resolved_model_path(str(model_path))
     providers = tuple(session_providers(provider_info))
-    session = _create_session_cached(model_path, providers)
+    session = _create_session_cached(model_path, providers, session_options)
     actual = list(session.get_providers() or [])
     active = provider_info.active_provider
     if active and active in GPU_PROVIDER_NAMES and active not in actual:
@@ -36,11 +129,163 @@ def create_session(model_path: str | Path, provider_info: ProviderInfo):
     return session
 
 
-@lru_cache(maxsize=16)
-def _create_session_cached(model_path: str, providers: tuple[str, ...]):
+@model_dir_cache(maxsize=16)
+def _create_session_cached(
+    model_path: str,
+    providers: tuple[str, ...],
+    options: SessionOptionsProfile,
+):
     ort = _ort()
-    return ort.InferenceSession(model_path, providers=list(providers))
+    started = time.perf_counter()
+    cached_path = _optimized_model_path(model_path, providers, options, str(getattr(ort, "__version__", "")))
+    if cached_path is not None and cached_path.is_file():
+        try:
+            session = ort.InferenceSession(
+                str(cached_path),
+                sess_options=_build_session_options(ort, options, optimize=False),
+                providers=list(providers),
+            )
+        except Exception:
+            _discard_optimized_model(cached_path)
+        else:
+            seconds = time.perf_counter() - started
+            _session_build_stats.append(
+                SessionBuildStats(
+                    model_path=model_path,
+                    seconds=seconds,
+                    cache_hit=True,
+                    saved_seconds=max(0.0, _recorded_build_seconds(cached_path) - seconds),
+                )
+            )
+            return session
+
+    session = None
+    if cached_path is not None:
+        # Threads of one process may build the same model, so the pid alone does not make the name unique.
+        temp_path = cached_path.with_name(f"{cached_path.stem}.{os.getpid()}-{threading.get_ident()}.tmp.onnx")
+        try:
+            cached_path.parent.mkdir(parents=True, exist_ok=True)
+            sess_options = _build_session_options(ort, options)
+            sess_options.optimized_model_filepath = str(temp_path)
+            session = ort.InferenceSession(model_path, sess_options=sess_options, providers=list(providers))
+        except Exception:
+            session = None
+        seconds = time.perf_counter() - started
+        if session is not None and temp_path.is_file():
+            try:
+                signature = _source_signature(model_path)
+                _discard_stale_optimized_models(cached_path, model_path, signature)
+                os.replace(temp_path, cached_path)
+                _metadata_path(cached_path).write_text(
+                    json.dumps({"source": model_path, "source_signature": signature, "build_seconds": seconds}),
+                    encoding="utf-8",
+                )
+            except OSError:
+                _discard_optimized_model(cached_path)
+        _discard_optimized_model(temp_path)
+    if session is None:
+        started = time.perf_counter()
+        session = ort.InferenceSession(
+            model_path,
+            sess_options=_build_session_options(ort, options),
+            providers=list(providers),
+        )
+    _session_build_stats.append(
+        SessionBuildStats(model_path=model_path, seconds=time.perf_counter() - started, cache_hit=False)
+    )
+    return session
+
+
+def _build_session_options(ort, options: SessionOptionsProfile, *, optimize: bool = True):
+    sess_options = ort.SessionOptions()
+    if options.intra_op_threads > 0:
+        sess_options.intra_op_num_threads = options.intra_op_threads
+    if options.inter_op_threads > 0:
+        sess_options.inter_op_num_threads = options.inter_op_threads
+    if options.execution_mode == "parallel":
+        sess_options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    else:
+        sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    level = options.graph_optimization if optimize else "disable"
+    sess_options.graph_optimization_level = getattr(
+        ort.GraphOptimizationLevel,
+        _GRAPH_OPTIMIZATION_ATTRS[level],
+    )
+    return sess_options
+
+
+def _optimized_model_path(
+    model_path: str,
+    providers: tuple[str, ...],
+    options: SessionOptionsProfile,
+    ort_version: str,
+) -> Path | None:
+    if not options.optimized_cache or not options.optimized_cache_dir or options.graph_optimization == "disable":
+        return None
+    signature = _source_signature(model_path)
+    if signature is None:
+        return None
+    key = "|".join(
+        (
+            model_path,
+            str(signature[0]),
+            str(signature[1]),
+            ",".join(providers),
+            options.graph_optimization,
+            ort_version,
+            platform.machine(),
+            platform.processor(),
+        )
+    )
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    source = Path(model_path)
+    return Path(options.optimized_cache_dir) / source.parent.name / f"{source.stem}.{digest}.onnx"
+
+
+def _source_signature(model_path: str) -> list[int] | None:
+    try:
+        stat = os.stat(model_path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _metadata_path(cached_path: Path) -> Path:
+    return cached_path.with_suffix(".json")
+
+
+def _recorded_build_seconds(cached_path: Path) -> float:
+    try:
+        data = json.loads(_metadata_path(cached_path).read_text(encoding="utf-8"))
+        return float(data.get("build_seconds", 0.0))
+    except Exception:
+        return 0.0
+
+
+def _discard_stale_optimized_models(cached_path: Path, model_path: str, signature: list[int] | None) -> None:
+    # Other providers and session profiles keep their own graphs; only a changed source makes one stale.
+    source_stem = cached_path.stem.rsplit(".", 1)[0]
+    for item in cached_path.parent.glob(f"{source_stem}.*.onnx"):
+        if item == cached_path or ".tmp" in item.suffixes:
+            continue
+        try:
+            data = json.loads(_metadata_path(item).read_text(encoding="utf-8"))
+        except Exception:
+            continue
+        recorded = data.get("source_signature")
+        if data.get("source") == model_path and recorded is not None and recorded != signature:
+            _discard_optimized_model(item)
+
+
+def _discard_optimized_model(path: Path) -> None:
+    for item in (path, _metadata_path(path)):
+        try:
+            item.unlink()
+        except OSError:
+            pass
 
 
-def clear_session_cache() -> None:
-    _create_session_cached.cache_clear()
+def clear_session_cache(model_dirs: Iterable[str | Path] | None = None) -> None:
+    if model_dirs is None:
+        _resolved_model_path.cache_clear()
+    _create_session_cached.cache_clear(model_dirs)
@@ -2,13 +2,17 @@
 
 from __future__ import annotations
 
+from collections.abc import Iterable
 from dataclasses import dataclass
 from pathlib import Path
 
-import cv2
 import numpy as np
 
-from .common import create_session
+from ..session_options import DEFAULT_SESSION_OPTIONS, SessionOptionsProfile
+from .common import create_session, model_dir_cache
+
+
+_LETTERBOX_FILL = 114
 
 
 @dataclass(frozen=True)
@@ -23,21 +27,37 @@ class FormulaBox:
     label: str
 
 
-def warmup_formula_detector(model_dir: str | Path, provider_info) -> None:
+@model_dir_cache(maxsize=8)
+def _find_detector_model(model_dir: str) -> Path:
     root = Path(model_dir)
     candidates = sorted(root.glob("*mfd*.onnx"))
     if not candidates:
         raise FileNotFoundError(f"no mfd onnx file found under {root}")
-    create_session(candidates[0], provider_info)
+    return candidates[0]
+
+
+def clear_formula_detector_cache(model_dirs: Iterable[str | Path] | None = None) -> None:
+    _find_detector_model.cache_clear(model_dirs)
+
+
+def warmup_formula_detector(
+    model_dir: str | Path,
+    provider_info,
+    *,
+    session_options: SessionOptionsProfile = DEFAULT_SESSION_OPTIONS,
+) -> None:
+    create_session(_find_detector_model(str(model_dir)), provider_info, session_options)
 
 
 def _letterbox(image: np.ndarray, target_size: int = 768) -> tuple[np.ndarray, float, tuple[float, float]]:
+    import cv2
+
     height, width = image.shape[:2]
     scale = min(target_size / width, target_size / height)
     new_w = int(round(width * scale))
     new_h = int(round(height * scale))
     resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
-    canvas = np.full((target_size, target_size, 3), 114, dtype=np.uint8)
+    canvas = np.full((target_size, target_size, 3), _LETTERBOX_FILL, dtype=np.uint8)
     pad_x = (target_size - new_w) / 2
     pad_y = (target_size - new_h) / 2
     left = int(round(pad_x - 0.1))
@@ -83,18 +103,86 @@ def detect_formula_boxes(
     confidence_threshold: float = 0.25,
     iou_threshold: float = 0.45,
     input_size: int = 768,
+    session_options: SessionOptionsProfile = DEFAULT_SESSION_OPTIONS,
 ) -> tuple[FormulaBox, ...]:
-    root = Path(model_dir)
-    candidates = sorted(root.glob("*mfd*.onnx"))
-    if not candidates:
-        raise FileNotFoundError(f"no mfd onnx file found under {root}")
-    session = create_session(candidates[0], provider_info)
-    preprocessed, scale, (pad_x, pad_y) = _letterbox(image_rgb, input_size)
-    model_input = (
-        preprocessed.astype(np.float32).transpose(2, 0, 1)[np.newaxis, ...] / 255.0
-    )
+    session = create_session(_find_detector_model(str(model_dir)), provider_info, session_options)
+    preprocessed, scale, pad = _letterbox(image_rgb, input_size)
+    model_input = _to_model_input([preprocessed])
     output = session.run(None, {session.get_inputs()[0].name: model_input})[0]
-    preds = np.asarray(output[0]).T
+    return _decode_predictions(
+        np.asarray(output[0]),
+        image_rgb.shape[:2],
+        scale,
+        pad,
+        confidence_threshold=confidence_threshold,
+        iou_threshold=iou_threshold,
+    )
+
+
+def detect_formula_boxes_batch(
+    images_rgb: list[np.ndarray],
+    model_dir: str | Path,
+    provider_info,
+    *,
+    batch_size: int = 4,
+    confidence_threshold: float = 0.25,
+    iou_threshold: float = 0.45,
+    input_size: int = 768,
+    session_options: SessionOptionsProfile = DEFAULT_SESSION_OPTIONS,
+) -> list[tuple[FormulaBox, ...]]:
+    if not images_rgb:
+        return []
+    session = create_session(_find_detector_model(str(model_dir)), provider_info, session_options)
+    model_input_meta = session.get_inputs()[0]
+    static_batch = model_input_meta.shape[0] if model_input_meta.shape else None
+    fixed_batch = isinstance(static_batch, int) and static_batch > 0
+    if fixed_batch:
+        batch_size = static_batch
+    batch_size = max(1, int(batch_size))
+    results: list[tuple[FormulaBox, ...]] = []
+    for start in range(0, len(images_rgb), batch_size):
+        chunk = images_rgb[start : start + batch_size]
+        letterboxed = [_letterbox(image, input_size) for image in chunk]
+        canvases = [item[0] for item in letterboxed]
+        if fixed_batch:
+            # A fixed batch axis needs a full last chunk; blank letterbox canvases fill it.
+            canvases.extend(
+                np.full((input_size, input_size, 3), _LETTERBOX_FILL, dtype=np.uint8)
+                for _ in range(batch_size - len(chunk))
+            )
+        output = session.run(
+            None,
+            {model_input_meta.name: _to_model_input(canvases)},
+        )[0]
+        for row, image, (_canvas, scale, pad) in zip(np.asarray(output)[: len(chunk)], chunk, letterboxed):
+            results.append(
+                _decode_predictions(
+                    row,
+                    image.shape[:2],
+                    scale,
+                    pad,
+                    confidence_threshold=confidence_threshold,
+                    iou_threshold=iou_threshold,
+                )
+            )
+    return results
+
+
+def _to_model_input(canvases: list[np.ndarray]) -> np.ndarray:
+    return np.stack(canvases).astype(np.float32).transpose(0, 3, 1, 2) / 255.0
+
+
+def _decode_predictions(
+    output: np.ndarray,
+    image_shape: tuple[int, ...],
+    scale: float,
+    pad: tuple[float, float],
+    *,
+    confidence_threshold: float,
+    iou_threshold: float,
+) -> tuple[FormulaBox, ...]:
+    pad_x, pad_y = pad
+    preds = output.T
     if preds.size == 0 or preds.shape[1] < 6:
         return ()
     xywh = preds[:, :4]
@@ -112,7 +200,7 @@ def detect_formula_boxes(
     boxes = np.stack([x - w / 2, y - h / 2, x + w / 2, y + h / 2], axis=1)
     boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad_x) / scale
     boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad_y) / scale
-    height, width = image_rgb.shape[:2]
+    height, width = image_shape[:2]
     boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width)
     boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height)
 
@@ -0,0 +1,205 @@
+# coding: utf-8
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+
+_VIT_PROCESSOR_TYPES = {"ViTImageProcessor", "ViTFeatureExtractor"}
+_SPECIAL_TOKEN_KEYS = ("bos_token", "eos_token", "unk_token", "sep_token", "pad_token", "cls_token", "mask_token")
+
+
+@dataclass(frozen=True)
+class ViTPreprocessConfig:
+    height: int = 224
+    width: int = 224
+    do_resize: bool = True
+    resample: int = 2
+    do_rescale: bool = True
+    rescale_factor: float = 1 / 255
+    do_normalize: bool = True
+    image_mean: tuple[float, ...] = (0.5, 0.5, 0.5)
+    image_std: tuple[float, ...] = (0.5, 0.5, 0.5)
+
+
+class FormulaTokenizer:
+    def __init__(self, tokenizer, *, clean_up_tokenization_spaces: bool = False) -> None:
+        self._tokenizer = tokenizer
+        self._clean_up = clean_up_tokenization_spaces
+        self.bos_token_id: int | None = None
+        self.eos_token_id: int | None = None
+
+    def decode(self, ids, skip_special_tokens: bool = True) -> str:
+        text = self._tokenizer.decode(list(ids), skip_special_tokens=skip_special_tokens)
+        return _clean_up_tokenization(text) if self._clean_up else text
+
+
+class FormulaProcessor:
+    def __init__(self, config: ViTPreprocessConfig, tokenizer: FormulaTokenizer) -> None:
+        self.config = config
+        self.tokenizer = tokenizer
+
+    def __call__(self, images, return_tensors: str = "np") -> dict[str, np.ndarray]:
+        _ = return_tensors
+        return {"pixel_values": np.stack([preprocess_vit_image(image, self.config) for image in images])}
+
+
+def preprocess_vit_image(image: Image.Image | np.ndarray, config: ViTPreprocessConfig) -> np.ndarray:
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(np.asarray(image, dtype=np.uint8))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if config.do_resize:
+        image = image.resize((config.width, config.height), resample=config.resample, reducing_gap=None)
+    pixels = np.asarray(image)
+    if config.do_rescale:
+        pixels = (pixels.astype(np.float64) * config.rescale_factor).astype(np.float32)
+    elif not np.issubdtype(pixels.dtype, np.floating):
+        pixels = pixels.astype(np.float32)
+    if config.do_normalize:
+        mean = np.asarray(config.image_mean, dtype=pixels.dtype)
+        std = np.asarray(config.image_std, dtype=pixels.dtype)
+        pixels = (pixels - mean) / std
+    return np.ascontiguousarray(pixels.transpose(2, 0, 1))
+
+
+def load_vit_preprocess_config(model_dir: Path) -> ViTPreprocessConfig | None:
+    data = _read_json(model_dir / "preprocessor_config.json")
+    if data is None:
+        return None
+    processor_type = data.get("image_processor_type") or data.get("feature_extractor_type")
+    if processor_type and processor_type not in _VIT_PROCESSOR_TYPES:
+        return None
+    defaults = ViTPreprocessConfig()
+    size = data.get("size", {"height": defaults.height, "width": defaults.width})
+    if isinstance(size, int):
+        height = width = size
+    elif isinstance(size, dict) and "height" in size and "width" in size:
+        height, width = size["height"], size["width"]
+    else:
+        return None
+    return ViTPreprocessConfig(
+        height=int(height),
+        width=int(width),
+        do_resize=bool(data.get("do_resize", defaults.do_resize)),
+        resample=int(data.get("resample", defaults.resample)),
+        do_rescale=bool(data.get("do_rescale", defaults.do_rescale)),
+        rescale_factor=float(data.get("rescale_factor", defaults.rescale_factor)),
+        do_normalize=bool(data.get("do_normalize", defaults.do_normalize)),
+        image_mean=_channel_values(data.get("image_mean", defaults.image_mean)),
+        image_std=_channel_values(data.get("image_std", defaults.image_std)),
+    )
+
+
+def load_formula_tokenizer(model_dir: Path) -> FormulaTokenizer | None:
+    tokenizer_path = model_dir / "tokenizer.json"
+    if not tokenizer_path.is_file():
+        return None
+    try:
+        from tokenizers import AddedToken, Tokenizer
+    except ImportError:
+        return None
+
+    backend = Tokenizer.from_file(str(tokenizer_path))
+    config = _read_json(model_dir / "tokenizer_config.json") or {}
+    special_map = _read_json(model_dir / "special_tokens_map.json") or {}
+    special_tokens = _special_token_contents(config, special_map)
+    already_special = {
+        str(token.content)
+        for token in backend.get_added_tokens_decoder().values()
+        if getattr(token, "special", False)
+    }
+    missing = [
+        AddedToken(content, special=True, normalized=False)
+        for content in special_tokens
+        if content not in already_special and backend.token_to_id(content) is not None
+    ]
+    if missing:
+        backend.add_special_tokens(missing)
+    tokenizer = FormulaTokenizer(
+        backend,
+        clean_up_tokenization_spaces=bool(config.get("clean_up_tokenization_spaces", False)),
+    )
+    tokenizer.bos_token_id = _special_token_id(backend, config, special_map, "bos_token")
+    tokenizer.eos_token_id = _special_token_id(backend, config, special_map, "eos_token")
+    return tokenizer
+
+
+def load_formula_processor(model_dir: str | Path) -> FormulaProcessor | None:
+    root = Path(model_dir)
+    config = load_vit_preprocess_config(root)
+    if config is None:
+        return None
+    tokenizer = load_formula_tokenizer(root)
+    if tokenizer is None:
+        return None
+    return FormulaProcessor(config, tokenizer)
+
+
+def _read_json(path: Path) -> dict | None:
+    if not path.is_file():
+        return None
+    try:
+        data = json.loads(path.read_text(encoding="utf-8-sig"))
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _channel_values(value) -> tuple[float, ...]:
+    if isinstance(value, (int, float)):
+        return (float(value),) * 3
+    return tuple(float(item) for item in value)
+
+
+def _token_content(value) -> str | None:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict) and isinstance(value.get("content"), str):
+        return value["content"]
+    return None
+
+
+def _special_token_contents(config: dict, special_map: dict) -> list[str]:
+    contents: list[str] = []
+    for source in (config, special_map):
+        for key in _SPECIAL_TOKEN_KEYS:
+            content = _token_content(source.get(key))
+            if content and content not in contents:
+                contents.append(content)
+        for item in source.get("additional_special_tokens") or ():
+            content = _token_content(item)
+            if content and content not in contents:
+                contents.append(content)
+    for item in (config.get("added_tokens_decoder") or {}).values():
+        content = _token_content(item)
+        if content and isinstance(item, dict) and item.get("special") and content not in contents:
+            contents.append(content)
+    return contents
+
+
+def _special_token_id(backend, config: dict, special_map: dict, key: str) -> int | None:
+    content = _token_content(special_map.get(key)) or _token_content(config.get(key))
+    if not content:
+        return None
+    return backend.token_to_id(content)
+
+
+def _clean_up_tokenization(text: str) -> str:
+    return (
+        text.replace(" .", ".")
+        .replace(" ?", "?")
+        .replace(" !", "!")
+        .replace(" ,", ",")
+        .replace(" ' ", "'")
+        .replace(" n't", "n't")
+        .replace(" 'm", "'m")
+        .replace(" 's", "'s")
+        .replace(" 've", "'ve")
+        .replace(" 're", "'re")
+    )
@@ -4,13 +4,47 @@ from __future__ import annotations
 
 import json
 import os
-from functools import lru_cache
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
 from pathlib import Path
 
 import numpy as np
 from PIL import Image
 
-from .common import create_session
+from ..cancellation import raise_if_cancelled
+from ..latex_quality import has_degenerate_repetition
+from ..session_options import DEFAULT_SESSION_OPTIONS, SessionOptionsProfile
+from .common import create_session, model_dir_cache
+from .formula_processor import load_formula_processor
+
+
+ENCODER_FILENAME = "encoder_model.onnx"
+DECODER_FILENAME = "decoder_model.onnx"
+DECODER_WITH_PAST_FILENAME = "decoder_with_past_model.onnx"
+DECODER_MERGED_FILENAME = "decoder_model_merged.onnx"
+DECODE_MODES = ("auto", "full", "cached")
+
+_PAST_INPUT_PREFIX = "past_key_values."
+_PRESENT_OUTPUT_PREFIX = "present."
+_REPETITION_CHECK_INTERVAL = 8
+_REPETITION_MIN_TOKENS = 16
+_REPETITION_MAX_DISTINCT = 4
+_REPETITION_WINDOW = 64
+
+
+@dataclass(frozen=True)
+class FormulaDecodeStats:
+    mode: str
+    batch_size: int
+    generated_tokens: int
+    steps: int
+    seconds: float
+    degenerate_rows: int = 0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.generated_tokens / self.seconds if self.seconds > 0 else 0.0
 
 
 def _disable_transformers_framework_imports() -> None:
@@ -28,14 +62,34 @@ def _disable_transformers_torchvision_probe() -> None:
     import_utils._torchvision_version = "0.0"
 
 
-def _softmax(logits: np.ndarray) -> np.ndarray:
-    shifted = logits - np.max(logits, axis=-1, keepdims=True)
-    exp = np.exp(shifted)
-    return exp / np.sum(exp, axis=-1, keepdims=True)
+def _greedy_pick(logits: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    next_tokens = np.argmax(logits, axis=-1)
+    chosen = np.take_along_axis(logits, next_tokens[:, np.newaxis], axis=-1)
+    log_norm = chosen[:, 0] + np.log(np.sum(np.exp(logits - chosen), axis=-1))
+    scores = np.exp(chosen[:, 0] - log_norm)
+    return next_tokens.astype(np.int64, copy=False), scores
+
+
+def _is_repetition_check_step(count: int) -> bool:
+    return count >= _REPETITION_MIN_TOKENS and count % _REPETITION_CHECK_INTERVAL == 0
+
 
+def _is_degenerate_tail(ids: np.ndarray, tokenizer) -> bool:
+    if np.unique(ids[-_REPETITION_MIN_TOKENS:]).size > _REPETITION_MAX_DISTINCT:
+        return False
+    tail = tokenizer.decode(ids[-_REPETITION_WINDOW:].tolist(), skip_special_tokens=True)
+    return has_degenerate_repetition(tail)
 
-@lru_cache(maxsize=8)
+
+@model_dir_cache(maxsize=8)
 def _load_processor(model_dir: str):
+    processor = load_formula_processor(model_dir)
+    if processor is not None:
+        return processor
+    return _load_transformers_processor(model_dir)
+
+
+def _load_transformers_processor(model_dir: str):
     _disable_transformers_framework_imports()
     _disable_transformers_torchvision_probe()
     from transformers import AutoTokenizer, TrOCRProcessor, ViTImageProcessor
@@ -45,23 +99,43 @@ def _load_processor(model_dir: str):
     return TrOCRProcessor(image_processor=image_processor, tokenizer=tokenizer)
 
 
-def warmup_formula_recognizer(model_dir: str | Path, provider_info) -> None:
+def warmup_formula_recognizer(
+    model_dir: str | Path,
+    provider_info,
+    *,
+    session_options: SessionOptionsProfile = DEFAULT_SESSION_OPTIONS,
+) -> None:
     root = Path(model_dir)
-    encoder = root / "encoder_model.onnx"
-    decoder = root / "decoder_model.onnx"
+    encoder = root / ENCODER_FILENAME
+    decoder = root / DECODER_FILENAME
     if not encoder.is_file():
         raise FileNotFoundError(f"missing encoder model under {root}")
     if not decoder.is_file():
         raise FileNotFoundError(f"missing decoder model under {root}")
-    create_session(encoder, provider_info)
-    create_session(decoder, provider_info)
+    create_session(encoder, provider_info, session_options)
+    create_session(decoder, provider_info, session_options)
+    for filename in sorted(_cached_decoder_exports(str(root))):
+        create_session(root / filename, provider_info, session_options)
 
 
 def _load_generation_ids(model_dir: Path, tokenizer) -> tuple[int, int | None]:
+    decoder_start_id, eos_id = _read_generation_ids(str(model_dir))
+    if decoder_start_id is None:
+        decoder_start_id = tokenizer.bos_token_id
+    if decoder_start_id is None:
+        raise ValueError(f"missing decoder_start_token_id under {model_dir}")
+    if eos_id is None:
+        eos_id = tokenizer.eos_token_id
+    return int(decoder_start_id), int(eos_id) if eos_id is not None else None
+
+
+@model_dir_cache(maxsize=8)
+def _read_generation_ids(model_dir: str) -> tuple[int | None, int | None]:
+    root = Path(model_dir)
     decoder_start_id = None
     eos_id = None
     for filename in ("generation_config.json", "config.json"):
-        path = model_dir / filename
+        path = root / filename
         if not path.is_file():
             continue
         try:
@@ -76,13 +150,170 @@ def _load_generation_ids(model_dir: Path, tokenizer) -> tuple[int, int | None]:
             eos_id = decoder_config.get("eos_token_id", eos_id)
         if decoder_start_id is not None and eos_id is not None:
             break
-    if decoder_start_id is None:
-        decoder_start_id = tokenizer.bos_token_id
-    if decoder_start_id is None:
-        raise ValueError(f"missing decoder_start_token_id under {model_dir}")
-    if eos_id is None:
-        eos_id = tokenizer.eos_token_id
-    return int(decoder_start_id), int(eos_id) if eos_id is not None else None
+    return decoder_start_id, eos_id
+
+
+def clear_formula_recognizer_cache(model_dirs: Iterable[str | Path] | None = None) -> None:
+    _load_processor.cache_clear(model_dirs)
+    _read_generation_ids.cache_clear(model_dirs)
+    _cached_decoder_exports.cache_clear(model_dirs)
+
+
+class _FullSequenceDecoder:
+    """Feeds the whole growing sequence to ``decoder_model.onnx`` every step."""
+
+    mode = "full"
+
+    def __init__(self, session) -> None:
+        self._session = session
+        inputs = session.get_inputs()
+        self._input_ids_name = inputs[0].name
+        self._encoder_states_name = inputs[1].name
+
+    def step(
+        self,
+        input_ids: np.ndarray,
+        next_column: np.ndarray | None,
+        encoder_hidden_states: np.ndarray,
+    ) -> np.ndarray:
+        _ = next_column
+        logits = self._session.run(
+            None,
+            {
+                self._input_ids_name: np.ascontiguousarray(input_ids),
+                self._encoder_states_name: encoder_hidden_states,
+            },
+        )[0]
+        return logits[:, -1, :]
+
+    def select_rows(self, keep: np.ndarray) -> None:
+        _ = keep
+
+
+class _CachedDecoder:
+    """Feeds only the newest token and carries ``present.*`` outputs forward."""
+
+    mode = "cached"
+
+    def __init__(self, first_session, past_session, *, merged: bool) -> None:
+        self._first_session = first_session
+        self._past_session = past_session
+        self._merged = merged
+        self._past: dict[str, np.ndarray] = {}
+
+    def step(
+        self,
+        input_ids: np.ndarray,
+        next_column: np.ndarray | None,
+        encoder_hidden_states: np.ndarray,
+    ) -> np.ndarray:
+        if next_column is None:
+            session = self._first_session
+            step_ids = np.ascontiguousarray(input_ids)
+            if self._merged:
+                self._past = _empty_past_inputs(session, batch_size=int(input_ids.shape[0]))
+        else:
+            session = self._past_session
+            step_ids = next_column.reshape(-1, 1)
+        feeds = _decoder_feeds(
+            session,
+            step_ids,
+            encoder_hidden_states,
+            self._past,
+            use_cache_branch=next_column is not None,
+        )
+        outputs = session.run(None, feeds)
+        logits = None
+        for meta, value in zip(session.get_outputs(), outputs):
+            if meta.name.startswith(_PRESENT_OUTPUT_PREFIX):
+                self._past[_PAST_INPUT_PREFIX + meta.name[len(_PRESENT_OUTPUT_PREFIX):]] = value
+            elif meta.name == "logits":
+                logits = value
+        if logits is None:
+            logits = outputs[0]
+        return logits[:, -1, :]
+
+    def select_rows(self, keep: np.ndarray) -> None:
+        self._past = {name: value[keep] for name, value in self._past.items()}
+
+
+def _decoder_feeds(
+    session,
+    input_ids: np.ndarray,
+    encoder_hidden_states: np.ndarray,
+    past: dict[str, np.ndarray],
+    *,
+    use_cache_branch: bool,
+) -> dict[str, np.ndarray]:
+    feeds: dict[str, np.ndarray] = {}
+    for meta in session.get_inputs():
+        name = meta.name
+        if name == "input_ids":
+            feeds[name] = input_ids
+        elif name == "encoder_hidden_states":
+            feeds[name] = encoder_hidden_states
+        elif name == "encoder_attention_mask":
+            feeds[name] = np.ones(encoder_hidden_states.shape[:2], dtype=np.int64)
+        elif name == "use_cache_branch":
+            feeds[name] = np.asarray([use_cache_branch], dtype=bool)
+        elif name.startswith(_PAST_INPUT_PREFIX):
+            if name not in past:
+                raise ValueError(f"decoder input {name} has no cached value")
+            feeds[name] = past[name]
+        else:
+            raise ValueError(f"unsupported decoder input: {name}")
+    return feeds
+
+
+def _empty_past_inputs(session, *, batch_size: int) -> dict[str, np.ndarray]:
+    past: dict[str, np.ndarray] = {}
+    for meta in session.get_inputs():
+        if not meta.name.startswith(_PAST_INPUT_PREFIX):
+            continue
+        shape = list(meta.shape)
+        if len(shape) != 4 or not isinstance(shape[1], int) or not isinstance(shape[3], int):
+            raise ValueError(f"merged decoder input {meta.name} has no static head shape")
+        dtype = np.float16 if "float16" in str(meta.type) else np.float32
+        past[meta.name] = np.zeros((batch_size, shape[1], 0, shape[3]), dtype=dtype)
+    return past
+
+
+def _has_past_outputs(session) -> bool:
+    return any(meta.name.startswith(_PRESENT_OUTPUT_PREFIX) for meta in session.get_outputs())
+
+
+def _has_past_inputs(session) -> bool:
+    return any(meta.name.startswith(_PAST_INPUT_PREFIX) for meta in session.get_inputs())
+
+
+@model_dir_cache(maxsize=8)
+def _cached_decoder_exports(model_dir: str) -> frozenset[str]:
+    root = Path(model_dir)
+    return frozenset(
+        filename
+        for filename in (DECODER_MERGED_FILENAME, DECODER_WITH_PAST_FILENAME)
+        if (root / filename).is_file()
+    )
+
+
+def _create_decoder(root: Path, provider_info, decode_mode: str, session_options: SessionOptionsProfile):
+    if decode_mode not in DECODE_MODES:
+        raise ValueError(f"unsupported formula decode mode: {decode_mode}")
+    if decode_mode != "full":
+        exports = _cached_decoder_exports(str(root))
+        merged_path = root / DECODER_MERGED_FILENAME
+        if DECODER_MERGED_FILENAME in exports:
+            merged = create_session(merged_path, provider_info, session_options)
+            if _has_past_inputs(merged) and _has_past_outputs(merged):
+                return _CachedDecoder(merged, merged, merged=True)
+        past_path = root / DECODER_WITH_PAST_FILENAME
+        if DECODER_WITH_PAST_FILENAME in exports:
+            first = create_session(root / DECODER_FILENAME, provider_info, session_options)
+            if _has_past_outputs(first):
+                return _CachedDecoder(first, create_session(past_path, provider_info, session_options), merged=False)
+        if decode_mode == "cached":
+            raise FileNotFoundError(f"no past-key-values decoder export found under {root}")
+    return _FullSequenceDecoder(create_session(root / DECODER_FILENAME, provider_info, session_options))
 
 
 def recognize_formula_image(
@@ -91,12 +322,20 @@ def recognize_formula_image(
     provider_info,
     *,
     max_new_tokens: int = 256,
+    decode_mode: str = "auto",
+    stats_callback: Callable[[FormulaDecodeStats], None] | None = None,
+    repetition_guard: bool = True,
+    session_options: SessionOptionsProfile = DEFAULT_SESSION_OPTIONS,
 ) -> tuple[str, float]:
     return recognize_formula_images(
         [image],
         model_dir,
         provider_info,
         max_new_tokens=max_new_tokens,
+        decode_mode=decode_mode,
+        stats_callback=stats_callback,
+        repetition_guard=repetition_guard,
+        session_options=session_options,
     )[0]
 
 
@@ -106,13 +345,17 @@ def recognize_formula_images(
     provider_info,
     *,
     max_new_tokens: int = 256,
+    decode_mode: str = "auto",
+    stats_callback: Callable[[FormulaDecodeStats], None] | None = None,
+    repetition_guard: bool = True,
+    session_options: SessionOptionsProfile = DEFAULT_SESSION_OPTIONS,
 ) -> list[tuple[str, float]]:
     if not images:
         return []
     root = Path(model_dir)
     processor = _load_processor(str(root))
-    encoder_session = create_session(root / "encoder_model.onnx", provider_info)
-    decoder_session = create_session(root / "decoder_model.onnx", provider_info)
+    encoder_session = create_session(root / ENCODER_FILENAME, provider_info, session_options)
+    decoder = _create_decoder(root, provider_info, decode_mode, session_options)
 
     pil_images = [image if isinstance(image, Image.Image) else Image.fromarray(image) for image in images]
     features = processor(images=pil_images, return_tensors="np")
@@ -127,43 +370,61 @@ def recognize_formula_images(
     tokenizer = processor.tokenizer
     decoder_start_id, eos_id = _load_generation_ids(root, tokenizer)
     batch_size = len(pil_images)
-    input_ids = np.full((batch_size, 1), decoder_start_id, dtype=np.int64)
-    token_ids: list[list[int]] = [[] for _ in range(batch_size)]
-    token_scores: list[list[float]] = [[] for _ in range(batch_size)]
-    finished = np.zeros((batch_size,), dtype=bool)
-    pad_after_finish_id = eos_id if eos_id is not None else decoder_start_id
-
-    for _ in range(max_new_tokens):
-        decoder_inputs = {
-            decoder_session.get_inputs()[0].name: input_ids,
-            decoder_session.get_inputs()[1].name: encoder_hidden_states,
-        }
-        logits = decoder_session.run(None, decoder_inputs)[0]
-        step_logits = logits[:, -1, :]
-        step_probs = _softmax(step_logits)
-        next_tokens = np.argmax(step_probs, axis=1).astype(np.int64)
-        next_column = next_tokens.copy()
-        for row, next_token in enumerate(next_tokens.tolist()):
-            if finished[row]:
-                next_column[row] = pad_after_finish_id
-                continue
-            next_prob = float(step_probs[row, next_token])
-            if eos_id is not None and next_token == eos_id:
-                finished[row] = True
-                next_column[row] = pad_after_finish_id
-                continue
-            token_ids[row].append(int(next_token))
-            token_scores[row].append(next_prob)
-        if bool(np.all(finished)):
-            break
-        input_ids = np.concatenate(
-            [input_ids, next_column.reshape(batch_size, 1)],
-            axis=1,
-        )
+    token_ids = np.zeros((batch_size, max_new_tokens), dtype=np.int64)
+    lengths = np.zeros(batch_size, dtype=np.int64)
+    score_sums = np.zeros(batch_size, dtype=np.float64)
+    sequence = np.empty((batch_size, max_new_tokens + 1), dtype=np.int64)
+    sequence[:, 0] = decoder_start_id
+    active_rows = np.arange(batch_size)
+    next_column: np.ndarray | None = None
+    steps = 0
+    degenerate_rows = 0
+    started = time.perf_counter()
 
+    for step in range(max_new_tokens):
+        raise_if_cancelled()
+        step_logits = decoder.step(sequence[:, : step + 1], next_column, encoder_hidden_states)
+        steps += 1
+        next_tokens, next_scores = _greedy_pick(step_logits)
+        if eos_id is None:
+            live = np.ones(next_tokens.shape, dtype=bool)
+        else:
+            live = next_tokens != eos_id
+        live_rows = active_rows[live]
+        token_ids[live_rows, step] = next_tokens[live]
+        score_sums[live_rows] += next_scores[live]
+        lengths[live_rows] = step + 1
+        if repetition_guard and _is_repetition_check_step(step + 1):
+            for local_row in np.flatnonzero(live).tolist():
+                row = int(active_rows[local_row])
+                if _is_degenerate_tail(token_ids[row, : step + 1], tokenizer):
+                    live[local_row] = False
+                    degenerate_rows += 1
+        if not bool(np.all(live)):
+            if not bool(np.any(live)):
+                break
+            active_rows = active_rows[live]
+            sequence = sequence[live]
+            encoder_hidden_states = encoder_hidden_states[live]
+            decoder.select_rows(live)
+            next_tokens = next_tokens[live]
+        sequence[:, step + 1] = next_tokens
+        next_column = next_tokens
+
+    if stats_callback is not None:
+        stats_callback(
+            FormulaDecodeStats(
+                mode=decoder.mode,
+                batch_size=batch_size,
+                generated_tokens=int(lengths.sum()),
+                steps=steps,
+                seconds=time.perf_counter() - started,
+                degenerate_rows=degenerate_rows,
+            )
+        )
     results: list[tuple[str, float]] = []
-    for ids, scores in zip(token_ids, token_scores):
-        text = tokenizer.decode(ids, skip_special_tokens=True).strip()
-        score = float(sum(scores) / len(scores)) if scores else 0.0
+    for row, length in enumerate(lengths.tolist()):
+        text = tokenizer.decode(token_ids[row, :length].tolist(), skip_special_tokens=True).strip()
+        score = float(score_sums[row] / length) if length else 0.0
         results.append((text, score))
     return results
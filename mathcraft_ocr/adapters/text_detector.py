@@ -2,24 +2,35 @@
 
 from __future__ import annotations
 
+from collections.abc import Iterable
 from pathlib import Path
 
 import numpy as np
-from rapidocr.ch_ppocr_det.utils import DBPostProcess, DetPreProcess
 
-from .common import create_session
+from ..session_options import DEFAULT_SESSION_OPTIONS, SessionOptionsProfile
+from .common import create_session, model_dir_cache
 
 
-def _find_detector_model(root: Path) -> Path:
+@model_dir_cache(maxsize=8)
+def _find_detector_model(model_dir: str) -> Path:
+    root = Path(model_dir)
     candidates = sorted(root.glob("**/*det*.onnx"))
     if not candidates:
         raise FileNotFoundError(f"missing text detector model under {root}")
     return candidates[0]
 
 
-def warmup_text_detector(model_dir: str | Path, provider_info) -> None:
-    root = Path(model_dir)
-    create_session(_find_detector_model(root), provider_info)
+def clear_text_detector_cache(model_dirs: Iterable[str | Path] | None = None) -> None:
+    _find_detector_model.cache_clear(model_dirs)
+
+
+def warmup_text_detector(
+    model_dir: str | Path,
+    provider_info,
+    *,
+    session_options: SessionOptionsProfile = DEFAULT_SESSION_OPTIONS,
+) -> None:
+    create_session(_find_detector_model(str(model_dir)), provider_info, session_options)
 
 
 def _limit_side_len(image: np.ndarray) -> int:
@@ -31,10 +42,13 @@ def detect_text_boxes(
     image_bgr: np.ndarray,
     model_dir: str | Path,
     provider_info,
+    *,
+    session_options: SessionOptionsProfile = DEFAULT_SESSION_OPTIONS,
 ) -> tuple[np.ndarray, tuple[float, ...]]:
-    root = Path(model_dir)
-    model_path = _find_detector_model(root)
-    session = create_session(model_path, provider_info)
+    from rapidocr.ch_ppocr_det.utils import DBPostProcess, DetPreProcess
+
+    model_path = _find_detector_model(str(model_dir))
+    session = create_session(model_path, provider_info, session_options)
     pre = DetPreProcess(
         limit_side_len=_limit_side_len(image_bgr),
         limit_type="max",
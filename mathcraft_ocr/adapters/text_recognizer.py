@@ -2,13 +2,18 @@
 
 from __future__ import annotations
 
-from functools import lru_cache
+from collections.abc import Iterable
 from pathlib import Path
 
+from typing import TYPE_CHECKING
+
 import numpy as np
-from rapidocr import EngineType, LangRec, ModelType, OCRVersion
-from rapidocr.ch_ppocr_rec import TextRecInput, TextRecognizer
-from rapidocr.utils.typings import TaskType
+
+from ..session_options import DEFAULT_SESSION_OPTIONS, SessionOptionsProfile
+from .common import model_dir_cache
+
+if TYPE_CHECKING:
+    from rapidocr.ch_ppocr_rec import TextRecognizer
 
 
 class _Config(dict):
@@ -30,8 +35,13 @@ class _Config(dict):
         self[name] = value
 
 
-def warmup_pp_text_recognizer(model_dir: str | Path, provider_info) -> None:
-    recognizer = _create_pp_text_recognizer(Path(model_dir), provider_info)
+def warmup_pp_text_recognizer(
+    model_dir: str | Path,
+    provider_info,
+    *,
+    session_options: SessionOptionsProfile = DEFAULT_SESSION_OPTIONS,
+) -> None:
+    recognizer = _create_pp_text_recognizer(Path(model_dir), provider_info, session_options)
     recognizer.rec_batch_num = 1
 
 
@@ -41,10 +51,13 @@ def recognize_pp_text_lines(
     provider_info,
     *,
     rec_batch_num: int | None = None,
+    session_options: SessionOptionsProfile = DEFAULT_SESSION_OPTIONS,
 ) -> list[tuple[str, float]]:
     if not images_bgr:
         return []
-    recognizer = _create_pp_text_recognizer(Path(model_dir), provider_info)
+    from rapidocr.ch_ppocr_rec import TextRecInput
+
+    recognizer = _create_pp_text_recognizer(Path(model_dir), provider_info, session_options)
     max_batch = max(1, int(rec_batch_num or 6))
     recognizer.rec_batch_num = min(max(len(images_bgr), 1), max_batch)
     rec_input = TextRecInput(img=images_bgr, return_word_box=False)
@@ -52,16 +65,36 @@ def recognize_pp_text_lines(
     return [(str(text), float(score)) for text, score in zip(output.txts, output.scores)]
 
 
-def _create_pp_text_recognizer(model_dir: Path, provider_info) -> TextRecognizer:
+def _create_pp_text_recognizer(
+    model_dir: Path,
+    provider_info,
+    options: SessionOptionsProfile,
+) -> TextRecognizer:
     model_dir = model_dir.resolve()
     active_provider = str(getattr(provider_info, "active_provider", "") or "")
     use_cuda = active_provider in {"CUDAExecutionProvider", "TensorrtExecutionProvider"}
     use_dml = active_provider == "DmlExecutionProvider"
-    return _create_pp_text_recognizer_cached(str(model_dir), use_cuda, use_dml)
-
+    return _create_pp_text_recognizer_cached(
+        str(model_dir),
+        use_cuda,
+        use_dml,
+        options.intra_op_threads or -1,
+        options.inter_op_threads or -1,
+    )
+
+
+@model_dir_cache(maxsize=8)
+def _create_pp_text_recognizer_cached(
+    model_dir: str,
+    use_cuda: bool,
+    use_dml: bool,
+    intra_op_threads: int = -1,
+    inter_op_threads: int = -1,
+) -> TextRecognizer:
+    from rapidocr import EngineType, LangRec, ModelType, OCRVersion
+    from rapidocr.ch_ppocr_rec import TextRecognizer
+    from rapidocr.utils.typings import TaskType
 
-@lru_cache(maxsize=8)
-def _create_pp_text_recognizer_cached(model_dir: str, use_cuda: bool, use_dml: bool) -> TextRecognizer:
     model_dir = Path(model_dir)
     model_candidates = sorted(model_dir.glob("**/*rec*.onnx"))
     if not model_candidates:
@@ -87,8 +120,8 @@ def _create_pp_text_recognizer_cached(model_dir: str, use_cuda: bool, use_dml: b
         "rec_batch_num": 6,
         "font_path": None,
         "engine_cfg": {
-            "intra_op_num_threads": -1,
-            "inter_op_num_threads": -1,
+            "intra_op_num_threads": intra_op_threads,
+            "inter_op_num_threads": inter_op_threads,
             "enable_cpu_mem_arena": False,
             "cpu_ep_cfg": {"arena_extend_strategy": "kSameAsRequested"},
             "use_cuda": use_cuda,
@@ -114,8 +147,8 @@ def _create_pp_text_recognizer_cached(model_dir: str, use_cuda: bool, use_dml: b
     return TextRecognizer(config)
 
 
-def clear_text_recognizer_cache() -> None:
-    _create_pp_text_recognizer_cached.cache_clear()
+def clear_text_recognizer_cache(model_dirs: Iterable[str | Path] | None = None) -> None:
+    _create_pp_text_recognizer_cached.cache_clear(model_dirs)
 
 
 def _find_pp_vocab(model_dir: Path) -> Path | None:
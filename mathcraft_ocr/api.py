@@ -1,10 +1,14 @@
 # coding: utf-8
 
+from .batching import FormulaBatchPolicy
+from .result_cache import FormulaResultCachePolicy
 from .results import FormulaRecognitionResult, MathCraftBlock, MixedRecognitionResult, OCRRegion
 from .runtime import MathCraftRuntime, WarmupComponentStatus, WarmupPlan
 
 __all__ = [
+    "FormulaBatchPolicy",
     "FormulaRecognitionResult",
+    "FormulaResultCachePolicy",
     "MathCraftBlock",
     "MathCraftRuntime",
     "MixedRecognitionResult",
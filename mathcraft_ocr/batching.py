@@ -0,0 +1,148 @@
+# coding: utf-8
+
+from __future__ import annotations
+
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, replace
+import os
+from typing import TypeVar
+
+import numpy as np
+
+from .errors import MathCraftError
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass(frozen=True)
+class FormulaBatchPolicy:
+    """Aspect-ratio buckets and per-batch caps; 0 keeps the hardware probe or disables the budget."""
+
+    aspect_ratio_edges: tuple[float, ...] = (2.0, 4.0, 8.0, 16.0)
+    max_batch_size: int = 0
+    max_batch_aspect_sum: float = 64.0
+
+
+DEFAULT_FORMULA_BATCH_POLICY = FormulaBatchPolicy()
+
+
+def formula_batch_policy_from_env() -> FormulaBatchPolicy:
+    policy = DEFAULT_FORMULA_BATCH_POLICY
+    max_batch = os.environ.get("MATHCRAFT_FORMULA_MAX_BATCH", "").strip()
+    if max_batch:
+        policy = replace(policy, max_batch_size=_parse_non_negative("MATHCRAFT_FORMULA_MAX_BATCH", max_batch, int))
+    aspect_budget = os.environ.get("MATHCRAFT_FORMULA_BATCH_ASPECT_SUM", "").strip()
+    if aspect_budget:
+        policy = replace(
+            policy,
+            max_batch_aspect_sum=_parse_non_negative("MATHCRAFT_FORMULA_BATCH_ASPECT_SUM", aspect_budget, float),
+        )
+    edges = os.environ.get("MATHCRAFT_FORMULA_BUCKET_EDGES", "").strip()
+    if edges:
+        policy = replace(policy, aspect_ratio_edges=_parse_bucket_edges(edges))
+    return policy
+
+
+def _parse_non_negative(name: str, value: str, kind: Callable[[str], T]) -> T:
+    try:
+        number = kind(value)
+    except ValueError as exc:
+        raise MathCraftError(f"invalid {name}: {value!r}") from exc
+    if not number >= 0:
+        raise MathCraftError(f"{name} must be non-negative: {value!r}")
+    return number
+
+
+def _parse_bucket_edges(value: str) -> tuple[float, ...]:
+    edges: list[float] = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            edge = float(item)
+        except ValueError as exc:
+            raise MathCraftError(f"invalid MATHCRAFT_FORMULA_BUCKET_EDGES entry: {item!r}") from exc
+        if not edge > 0 or edge == float("inf"):
+            raise MathCraftError(f"MATHCRAFT_FORMULA_BUCKET_EDGES entries must be positive: {item!r}")
+        if edges and edge <= edges[-1]:
+            raise MathCraftError(f"MATHCRAFT_FORMULA_BUCKET_EDGES must be increasing: {value!r}")
+        edges.append(edge)
+    return tuple(edges)
+
+
+def image_size(image) -> tuple[int, int]:
+    if isinstance(image, np.ndarray):
+        height, width = image.shape[:2]
+        return int(width), int(height)
+    width, height = image.size
+    return int(width), int(height)
+
+
+def aspect_ratio(size: tuple[int, int]) -> float:
+    width, height = size
+    return float(width) / float(max(1, height))
+
+
+def bucket_index(ratio: float, edges: Sequence[float]) -> int:
+    for index, edge in enumerate(edges):
+        if ratio < edge:
+            return index
+    return len(edges)
+
+
+def plan_formula_batches(
+    sizes: Sequence[tuple[int, int]],
+    policy: FormulaBatchPolicy = DEFAULT_FORMULA_BATCH_POLICY,
+    *,
+    max_batch_size: int,
+) -> list[list[int]]:
+    limit = int(policy.max_batch_size or max_batch_size)
+    limit = max(1, limit)
+    budget = float(policy.max_batch_aspect_sum or 0.0)
+    ratios = [aspect_ratio(size) for size in sizes]
+    if not ratios:
+        return []
+    if len(ratios) <= limit and (budget <= 0 or sum(ratios) <= budget):
+        return [list(range(len(ratios)))]
+    buckets: dict[int, list[int]] = {}
+    for index, ratio in enumerate(ratios):
+        buckets.setdefault(bucket_index(ratio, policy.aspect_ratio_edges), []).append(index)
+
+    batches: list[list[int]] = []
+    for key in sorted(buckets):
+        members = sorted(buckets[key], key=lambda item: (ratios[item], item))
+        current: list[int] = []
+        current_sum = 0.0
+        for index in members:
+            ratio = ratios[index]
+            over_budget = budget > 0 and current and current_sum + ratio > budget
+            if len(current) >= limit or over_budget:
+                batches.append(current)
+                current = []
+                current_sum = 0.0
+            current.append(index)
+            current_sum += ratio
+        if current:
+            batches.append(current)
+    return batches
+
+
+def run_in_batches(
+    items: Sequence[T],
+    batches: Sequence[Sequence[int]],
+    run_batch: Callable[[list[T]], list[R]],
+    on_batch: Callable[[list[int], list[R]], None] | None = None,
+) -> list[R]:
+    results: list[R | None] = [None] * len(items)
+    for indices in batches:
+        batch_results = run_batch([items[index] for index in indices])
+        for index, result in zip(indices, batch_results):
+            results[index] = result
+        if on_batch is not None:
+            on_batch(list(indices), list(batch_results))
+    if any(result is None for result in results):
+        raise RuntimeError("formula batch scheduler dropped one or more crops")
+    return results  # type: ignore[return-value]
@@ -88,7 +88,7 @@ def model_dir(root: str | Path, model_id: str) -> Path:
 
 
 def inspect_model_cache(root: str | Path, spec: ModelSpec) -> ModelCacheState:
-    target = model_dir(root, spec.model_id)
+    target = model_dir(root, spec.dir_name)
     exists = target.is_dir()
     missing: list[str] = []
     if exists:
@@ -118,6 +118,26 @@ def inspect_model_roots(roots: tuple[Path, ...] | list[Path], spec: ModelSpec) -
     return states[-1]
 
 
+def manifest_roots_fingerprint(
+    roots: tuple[Path, ...] | list[Path],
+    manifest: Manifest,
+) -> tuple[tuple[str, int | None], ...]:
+    dirs: set[Path] = set()
+    for root in roots:
+        for spec in manifest.models.values():
+            target = model_dir(root, spec.dir_name)
+            dirs.add(target)
+            dirs.update((target / file_spec.path).parent for file_spec in spec.files)
+    return tuple((str(path), _mtime_ns(path)) for path in sorted(dirs))
+
+
+def _mtime_ns(path: Path) -> int | None:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
 def inspect_manifest_cache(
     root: str | Path, manifest: Manifest, include_optional: bool = True
 ) -> dict[str, ModelCacheState]:
@@ -0,0 +1,40 @@
+# coding: utf-8
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+
+from .errors import RecognitionCancelled
+
+
+class CancelToken:
+    def __init__(self) -> None:
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+
+_CURRENT_TOKEN: ContextVar[CancelToken | None] = ContextVar("mathcraft_cancel_token", default=None)
+
+
+@contextmanager
+def cancellation_scope(token: CancelToken) -> Iterator[CancelToken]:
+    reset = _CURRENT_TOKEN.set(token)
+    try:
+        yield token
+    finally:
+        _CURRENT_TOKEN.reset(reset)
+
+
+def raise_if_cancelled() -> None:
+    token = _CURRENT_TOKEN.get()
+    if token is not None and token.cancelled:
+        raise RecognitionCancelled("recognition was cancelled")
@@ -7,6 +7,7 @@ import json
 import sys
 from pathlib import Path
 
+from .manifest import MODEL_PRECISIONS
 from .serialization import (
     cache_state_to_json,
     doctor_report_to_json,
@@ -14,6 +15,7 @@ from .serialization import (
     mixed_result_to_json,
     warmup_plan_to_json,
 )
+from .session_options import parse_session_options, session_options_from_env
 
 
 def _resolve_ocr_output_path(args: argparse.Namespace) -> Path | None:
@@ -42,14 +44,19 @@ def build_parser() -> argparse.ArgumentParser:
 
     models = sub.add_parser("models")
     models_sub = models.add_subparsers(dest="models_command", required=True)
-    models_sub.add_parser("check")
+    models_check = models_sub.add_parser("check")
+    models_check.add_argument("--precision", choices=MODEL_PRECISIONS, default=None)
 
     doctor = sub.add_parser("doctor")
     doctor.add_argument("--provider", default="auto")
+    doctor.add_argument("--cached", action="store_true")
 
     warmup = sub.add_parser("warmup")
     warmup.add_argument("--profile", default="formula")
     warmup.add_argument("--provider", default="auto")
+    warmup.add_argument("--ort-options", default="")
+    warmup.add_argument("--precision", choices=MODEL_PRECISIONS, default=None)
+    warmup.add_argument("--deep", action="store_true")
 
     ocr = sub.add_parser("ocr")
     ocr.add_argument("image")
@@ -58,12 +65,21 @@ def build_parser() -> argparse.ArgumentParser:
     ocr.add_argument("--output", "-o", default="")
     ocr.add_argument("--output-dir", default="")
     ocr.add_argument("--json", action="store_true", dest="as_json")
+    ocr.add_argument("--ort-options", default="")
+    ocr.add_argument("--precision", choices=MODEL_PRECISIONS, default=None)
 
     worker = sub.add_parser("worker")
     worker.add_argument("--provider", default="auto")
+    worker.add_argument("--ort-options", default="")
+    worker.add_argument("--precision", choices=MODEL_PRECISIONS, default=None)
+    worker.add_argument("--concurrency", type=int, default=None)
     return parser
 
 
+def _session_options(args: argparse.Namespace):
+    return parse_session_options(str(getattr(args, "ort_options", "") or ""), session_options_from_env())
+
+
 def main(argv: list[str] | None = None) -> int:
     parser = build_parser()
     args = parser.parse_args(argv)
@@ -71,7 +87,7 @@ def main(argv: list[str] | None = None) -> int:
     if args.command == "models" and args.models_command == "check":
         from .runtime import MathCraftRuntime
 
-        runtime = MathCraftRuntime()
+        runtime = MathCraftRuntime(precision=args.precision)
         data = {
             key: cache_state_to_json(state)
             for key, state in runtime.check_models().items()
@@ -80,6 +96,13 @@ def main(argv: list[str] | None = None) -> int:
         return 0
 
     if args.command == "doctor":
+        if args.cached:
+            from .doctor import read_doctor_snapshot
+
+            data = read_doctor_snapshot()
+            if data is not None:
+                print(json.dumps(data, ensure_ascii=False, indent=2))
+                return 0
         from .runtime import MathCraftRuntime
 
         runtime = MathCraftRuntime(provider_preference=args.provider)
@@ -91,8 +114,12 @@ def main(argv: list[str] | None = None) -> int:
     if args.command == "warmup":
         from .runtime import MathCraftRuntime
 
-        runtime = MathCraftRuntime(provider_preference=args.provider)
-        plan = runtime.warmup(profile=args.profile)
+        runtime = MathCraftRuntime(
+            provider_preference=args.provider,
+            session_options=_session_options(args),
+            precision=args.precision,
+        )
+        plan = runtime.warmup(profile=args.profile, deep=args.deep or None)
         data = warmup_plan_to_json(plan)
         print(json.dumps(data, ensure_ascii=False, indent=2))
         return 0
@@ -100,7 +127,11 @@ def main(argv: list[str] | None = None) -> int:
     if args.command == "ocr":
         from .runtime import MathCraftRuntime
 
-        runtime = MathCraftRuntime(provider_preference=args.provider)
+        runtime = MathCraftRuntime(
+            provider_preference=args.provider,
+            session_options=_session_options(args),
+            precision=args.precision,
+        )
         profile = str(args.profile).strip().lower()
         if profile == "formula":
             result = runtime.recognize_formula(args.image)
@@ -125,7 +156,12 @@ def main(argv: list[str] | None = None) -> int:
     if args.command == "worker":
         from .worker import serve_jsonl
 
-        return serve_jsonl(provider_preference=args.provider)
+        return serve_jsonl(
+            provider_preference=args.provider,
+            session_options=_session_options(args),
+            precision=args.precision,
+            concurrency=args.concurrency,
+        )
 
     parser.error("unsupported command")
     return 2
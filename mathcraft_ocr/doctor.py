@@ -2,13 +2,19 @@
 
 from __future__ import annotations
 
-import sys
 from dataclasses import dataclass
+import json
+import os
 from pathlib import Path
+import sys
 
 from .cache import inspect_manifest_roots, resolve_model_roots, resolve_user_models_dir
 from .manifest import Manifest, load_manifest
 from .providers import ProviderInfo, detect_providers
+from .serialization import doctor_report_to_json
+
+
+DOCTOR_SNAPSHOT_FILENAME = ".doctor-report.v1.json"
 
 
 @dataclass(frozen=True)
@@ -29,14 +35,19 @@ def run_doctor(
     manifest: Manifest | None = None,
     provider_preference: str = "auto",
     include_optional: bool = True,
+    provider_info: ProviderInfo | None = None,
+    cache_states: dict[str, object] | None = None,
 ) -> DoctorReport:
     manifest_obj = manifest or load_manifest()
     cache_root = resolve_user_models_dir(cache_dir)
     model_roots = resolve_model_roots(cache_dir, bundled_models_dir)
-    states = inspect_manifest_roots(
-        model_roots, manifest_obj, include_optional=include_optional
-    )
-    provider_info = detect_providers(prefer=provider_preference)
+    states = cache_states
+    if states is None:
+        states = inspect_manifest_roots(
+            model_roots, manifest_obj, include_optional=include_optional
+        )
+    if provider_info is None:
+        provider_info = detect_providers(prefer=provider_preference)
     return DoctorReport(
         python_executable=sys.executable,
         cache_dir=cache_root,
@@ -48,3 +59,29 @@ def run_doctor(
             model_id: spec.runtime for model_id, spec in manifest_obj.models.items()
         },
     )
+
+
+def doctor_snapshot_path(cache_dir: str | Path | None = None) -> Path:
+    return resolve_user_models_dir(cache_dir) / DOCTOR_SNAPSHOT_FILENAME
+
+
+def write_doctor_snapshot(report: DoctorReport) -> Path | None:
+    if not report.cache_dir.is_dir():
+        return None
+    target = report.cache_dir / DOCTOR_SNAPSHOT_FILENAME
+    tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    try:
+        tmp.write_text(json.dumps(doctor_report_to_json(report), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, target)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+        return None
+    return target
+
+
+def read_doctor_snapshot(cache_dir: str | Path | None = None) -> dict | None:
+    try:
+        data = json.loads(doctor_snapshot_path(cache_dir).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
@@ -20,6 +20,16 @@ def _is_placeholder_source(source: str) -> bool:
     return source.startswith("placeholder://") or source.endswith(".invalid")
 
 
+def usable_sources(
+    spec: ModelSpec,
+    source_overrides: dict[str, list[str] | tuple[str, ...]] | None = None,
+) -> list[str]:
+    sources = list(source_overrides.get(spec.dir_name, ())) if source_overrides else []
+    if not sources:
+        sources = list(spec.sources)
+    return [src for src in sources if src and not _is_placeholder_source(src)]
+
+
 def _sha256_of_file(path: Path) -> str:
     digest = hashlib.sha256()
     with path.open("rb") as stream:
@@ -42,6 +52,14 @@ def _verify_model_dir(target: Path, spec: ModelSpec) -> None:
                 raise ModelCacheError(
                     f"sha256 mismatch for {spec.model_id}: {file_spec.path}"
                 )
+    for file_spec in spec.optional_files:
+        fp = target / file_spec.path
+        if not fp.is_file() or not file_spec.sha256:
+            continue
+        if _sha256_of_file(fp).lower() != file_spec.sha256.lower():
+            raise ModelCacheError(
+                f"sha256 mismatch for {spec.model_id}: {file_spec.path}"
+            )
 
 
 def _content_length(headers) -> int:
@@ -143,10 +161,7 @@ def download_model_archive(
     source_overrides: dict[str, list[str] | tuple[str, ...]] | None = None,
     progress_callback: Callable[[str], None] | None = None,
 ) -> Path:
-    sources = list(source_overrides.get(spec.model_id, ())) if source_overrides else []
-    if not sources:
-        sources = list(spec.sources)
-    sources = [src for src in sources if src and not _is_placeholder_source(src)]
+    sources = usable_sources(spec, source_overrides)
     if not sources:
         raise DownloadUnavailableError(
             f"no usable download source configured for model '{spec.model_id}'"
@@ -154,13 +169,13 @@ def download_model_archive(
 
     target_root = Path(target_root)
     target_root.mkdir(parents=True, exist_ok=True)
-    final_dir = model_dir(target_root, spec.model_id)
+    final_dir = model_dir(target_root, spec.dir_name)
     downloads_dir = target_root / ".downloads"
-    archive_path = downloads_dir / f"{spec.model_id}.zip.part"
+    archive_path = downloads_dir / f"{spec.dir_name}.zip.part"
     last_error: Exception | None = None
 
     for source in sources:
-        temp_dir = Path(tempfile.mkdtemp(prefix=f"mathcraft-{spec.model_id}-"))
+        temp_dir = Path(tempfile.mkdtemp(prefix=f"mathcraft-{spec.dir_name}-"))
         extract_dir = temp_dir / "extract"
         try:
             _download_archive_file(
@@ -181,7 +196,9 @@ def download_model_archive(
                 raise ModelCacheError(
                     f"downloaded archive for {spec.model_id} is corrupt; partial removed"
                 ) from exc
-            extracted_root = extract_dir / spec.model_id
+            extracted_root = extract_dir / spec.dir_name
+            if not extracted_root.is_dir():
+                extracted_root = extract_dir / spec.model_id
             if not extracted_root.is_dir():
                 extracted_root = extract_dir
             try:
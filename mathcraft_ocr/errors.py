@@ -19,3 +19,7 @@ class DownloadUnavailableError(MathCraftError):
 
 class ProviderError(MathCraftError):
     """Raised when ONNX runtime/provider detection fails."""
+
+
+class RecognitionCancelled(MathCraftError):
+    """Raised when a caller cancels recognition that is still running."""
@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import cached_property
 import re
 
 import numpy as np
@@ -31,20 +32,21 @@ _WIDE_LINE_ASPECT_RATIO = 7.0
 
 def split_formula_line_crops(image_rgb: np.ndarray) -> tuple[FormulaLineCrop, ...]:
     rgb = _as_rgb_array(image_rgb)
-    return _split_formula_rows(rgb)
+    return tuple(crop for crop, _ink in _split_formula_rows(rgb, _InkMap(rgb)))
 
 
 def split_formula_line_groups(image_rgb: np.ndarray) -> tuple[FormulaLineGroup, ...]:
     rgb = _as_rgb_array(image_rgb)
-    rows = _split_formula_rows(rgb)
+    ink = _InkMap(rgb)
+    rows = _split_formula_rows(rgb, ink)
     if not rows:
         full_crop = FormulaLineCrop(
-            image=rgb.copy(),
+            image=rgb,
             box=(0, 0, int(rgb.shape[1]), int(rgb.shape[0])),
         )
-        segments = _split_wide_line_segments(full_crop)
+        segments = _split_wide_line_segments(full_crop, ink)
         return (FormulaLineGroup(crops=segments),) if len(segments) > 1 else ()
-    return tuple(FormulaLineGroup(crops=_split_wide_line_segments(row)) for row in rows)
+    return tuple(FormulaLineGroup(crops=_split_wide_line_segments(row, row_ink)) for row, row_ink in rows)
 
 
 def compose_aligned_formula(lines: list[str] | tuple[str, ...]) -> str:
@@ -66,32 +68,30 @@ def compose_formula_line(segments: list[str] | tuple[str, ...]) -> str:
     )
 
 
-def _split_formula_rows(rgb: np.ndarray) -> tuple[FormulaLineCrop, ...]:
+def _split_formula_rows(rgb: np.ndarray, ink: _InkMap) -> tuple[tuple[FormulaLineCrop, _InkMap], ...]:
     height, width = rgb.shape[:2]
     if height < 72 or width < 24:
         return ()
 
-    mask = _ink_mask(rgb)
-    row_counts = mask.sum(axis=1)
     row_threshold = max(3, int(round(width * 0.006)))
-    row_has_ink = row_counts >= row_threshold
+    row_has_ink = ink.row_counts >= row_threshold
     bands = _row_bands(row_has_ink)
     bands = _merge_close_bands(bands, max_gap=max(3, min(14, int(round(height * 0.018)))))
     bands = [
         (top, bottom)
         for top, bottom in bands
-        if _band_looks_like_formula_row(mask, top, bottom, image_width=width)
+        if _band_looks_like_formula_row(ink, top, bottom, image_width=width)
     ]
-    bands = _filter_annotation_bands(mask, bands, image_width=width)
-    if _looks_like_compact_fraction_split(mask, bands, image_width=width, image_height=height):
+    bands = _filter_annotation_bands(ink, bands, image_width=width)
+    if _looks_like_compact_fraction_split(ink, bands, image_width=width, image_height=height):
         return ()
     if len(bands) < 2:
         return ()
 
     return tuple(
-        crop
-        for crop in (_crop_line(rgb, mask, top, bottom) for top, bottom in bands)
-        if crop is not None
+        line
+        for line in (_crop_line(rgb, ink, top, bottom) for top, bottom in bands)
+        if line is not None
     )
 
 
@@ -104,12 +104,15 @@ def _as_rgb_array(image_rgb: np.ndarray) -> np.ndarray:
     raise ValueError(f"unsupported formula image shape: {array.shape}")
 
 
-def _ink_mask(rgb: np.ndarray) -> np.ndarray:
-    gray = (
+def _luminance(rgb: np.ndarray) -> np.ndarray:
+    return (
         0.299 * rgb[:, :, 0].astype(np.float32)
         + 0.587 * rgb[:, :, 1].astype(np.float32)
         + 0.114 * rgb[:, :, 2].astype(np.float32)
     )
+
+
+def _ink_mask(gray: np.ndarray) -> np.ndarray:
     background = float(np.percentile(gray, 95))
     threshold = min(245.0, max(80.0, background - 28.0))
     mask = gray < threshold
@@ -124,18 +127,67 @@ def _ink_mask(rgb: np.ndarray) -> np.ndarray:
     return mask
 
 
+class _InkMap:
+    """Ink mask and projections of one crop, computed at most once per split stage.
+
+    Sub-crops slice the luminance of the full formula image but threshold it
+    against their own background, exactly as a fresh mask of the crop would.
+    """
+
+    def __init__(self, rgb: np.ndarray, gray: np.ndarray | None = None) -> None:
+        self.rgb = rgb
+        self._gray = gray
+        self._bands: dict[tuple[int, int], tuple[int, tuple[int, int, int, int] | None]] = {}
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.rgb.shape[:2]
+
+    @cached_property
+    def gray(self) -> np.ndarray:
+        return self._gray if self._gray is not None else _luminance(self.rgb)
+
+    @cached_property
+    def mask(self) -> np.ndarray:
+        return _ink_mask(self.gray)
+
+    @cached_property
+    def row_counts(self) -> np.ndarray:
+        return self.mask.sum(axis=1)
+
+    @cached_property
+    def column_counts(self) -> np.ndarray:
+        return self.mask.sum(axis=0)
+
+    def crop(self, left: int, top: int, right: int, bottom: int) -> _InkMap:
+        height, width = self.shape
+        if (left, top, right, bottom) == (0, 0, width, height):
+            return self
+        return _InkMap(self.rgb[top:bottom, left:right], self.gray[top:bottom, left:right])
+
+    def band(self, top: int, bottom: int) -> tuple[int, tuple[int, int, int, int] | None]:
+        """Active column count and ink bounds (x1, y1, x2, y2) of rows top..bottom."""
+        cached = self._bands.get((top, bottom))
+        if cached is None:
+            band = self.mask[top : bottom + 1, :]
+            columns = np.flatnonzero(band.any(axis=0))
+            rows = np.flatnonzero(band.any(axis=1))
+            bounds = None
+            if columns.size:
+                bounds = (int(columns[0]), int(rows[0]) + top, int(columns[-1]), int(rows[-1]) + top)
+            cached = (int(columns.size), bounds)
+            self._bands[(top, bottom)] = cached
+        return cached
+
+    def bounds(self) -> tuple[int, int, int, int] | None:
+        return self.band(0, self.mask.shape[0] - 1)[1]
+
+
 def _row_bands(row_has_ink: np.ndarray) -> list[tuple[int, int]]:
-    bands: list[tuple[int, int]] = []
-    start: int | None = None
-    for index, has_ink in enumerate(row_has_ink.tolist()):
-        if has_ink and start is None:
-            start = index
-        elif not has_ink and start is not None:
-            bands.append((start, index - 1))
-            start = None
-    if start is not None:
-        bands.append((start, len(row_has_ink) - 1))
-    return bands
+    edges = np.diff(np.concatenate(([0], np.asarray(row_has_ink, dtype=np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    return list(zip(starts.tolist(), ends.tolist()))
 
 
 def _merge_close_bands(
@@ -156,47 +208,45 @@ def _merge_close_bands(
 
 
 def _band_looks_like_formula_row(
-    mask: np.ndarray,
+    ink: _InkMap,
     top: int,
     bottom: int,
     *,
     image_width: int,
 ) -> bool:
-    band = mask[top : bottom + 1, :]
-    ink = int(band.sum())
+    ink_count = int(ink.row_counts[top : bottom + 1].sum())
     height = bottom - top + 1
-    if height < 5 or ink < max(12, int(round(image_width * 0.02))):
+    if height < 5 or ink_count < max(12, int(round(image_width * 0.02))):
         return False
 
-    active_columns = int(np.count_nonzero(band.any(axis=0)))
+    active_columns, bounds = ink.band(top, bottom)
     if active_columns < max(28, int(round(image_width * 0.13))):
         return False
 
-    points = np.argwhere(band)
-    if points.size == 0:
+    if bounds is None:
         return False
-    x_span = int(points[:, 1].max() - points[:, 1].min() + 1)
+    x_span = bounds[2] - bounds[0] + 1
     if x_span >= int(round(image_width * 0.55)):
         return active_columns >= max(28, int(round(image_width * 0.08)))
     return x_span >= int(round(image_width * 0.22))
 
 
 def _filter_annotation_bands(
-    mask: np.ndarray,
+    ink: _InkMap,
     bands: list[tuple[int, int]],
     *,
     image_width: int,
 ) -> list[tuple[int, int]]:
     if len(bands) < 2:
         return bands
-    stats = [(_band_active_columns(mask, top, bottom), top, bottom) for top, bottom in bands]
+    stats = [(ink.band(top, bottom)[0], top, bottom) for top, bottom in bands]
     max_active = max(active for active, _top, _bottom in stats)
     min_active = max(int(round(image_width * 0.13)), int(round(max_active * 0.35)))
     return [(top, bottom) for active, top, bottom in stats if active >= min_active]
 
 
 def _looks_like_compact_fraction_split(
-    mask: np.ndarray,
+    ink: _InkMap,
     bands: list[tuple[int, int]],
     *,
     image_width: int,
@@ -207,8 +257,8 @@ def _looks_like_compact_fraction_split(
     if image_height < 70 or image_width / max(1, image_height) > 2.65:
         return False
 
-    first = _band_bounds(mask, *bands[0])
-    second = _band_bounds(mask, *bands[1])
+    first = ink.band(*bands[0])[1]
+    second = ink.band(*bands[1])[1]
     if first is None or second is None:
         return False
 
@@ -229,35 +279,18 @@ def _looks_like_compact_fraction_split(
     return first_is_centered_fragment and second_is_wider
 
 
-def _band_bounds(mask: np.ndarray, top: int, bottom: int) -> tuple[int, int, int, int] | None:
-    points = np.argwhere(mask[top : bottom + 1, :])
-    if points.size == 0:
-        return None
-    y1 = int(points[:, 0].min()) + top
-    y2 = int(points[:, 0].max()) + top
-    x1 = int(points[:, 1].min())
-    x2 = int(points[:, 1].max())
-    return x1, y1, x2, y2
-
-
-def _band_active_columns(mask: np.ndarray, top: int, bottom: int) -> int:
-    return int(np.count_nonzero(mask[top : bottom + 1, :].any(axis=0)))
-
-
 def _crop_line(
     rgb: np.ndarray,
-    mask: np.ndarray,
+    ink: _InkMap,
     top: int,
     bottom: int,
-) -> FormulaLineCrop | None:
+) -> tuple[FormulaLineCrop, _InkMap] | None:
     height, width = rgb.shape[:2]
-    band_mask = mask[top : bottom + 1, :]
-    points = np.argwhere(band_mask)
-    if points.size == 0:
+    bounds = ink.band(top, bottom)[1]
+    if bounds is None:
         return None
 
-    x1 = int(points[:, 1].min())
-    x2 = int(points[:, 1].max())
+    x1, _y1, x2, _y2 = bounds
     y_pad = max(5, int(round((bottom - top + 1) * 0.22)))
     x_pad = max(8, int(round(width * 0.015)))
     crop_top = max(0, top - y_pad)
@@ -266,24 +299,23 @@ def _crop_line(
     crop_right = min(width, x2 + x_pad + 1)
     if crop_bottom - crop_top < 8 or crop_right - crop_left < 12:
         return None
-    return FormulaLineCrop(
-        image=rgb[crop_top:crop_bottom, crop_left:crop_right].copy(),
+    line = FormulaLineCrop(
+        image=rgb[crop_top:crop_bottom, crop_left:crop_right],
         box=(crop_left, crop_top, crop_right, crop_bottom),
     )
+    return line, ink.crop(crop_left, crop_top, crop_right, crop_bottom)
 
 
-def _split_wide_line_segments(line: FormulaLineCrop) -> tuple[FormulaLineCrop, ...]:
+def _split_wide_line_segments(line: FormulaLineCrop, ink: _InkMap) -> tuple[FormulaLineCrop, ...]:
     height, width = line.image.shape[:2]
     if width < 220 or width / max(1, height) < _WIDE_LINE_ASPECT_RATIO:
         return (line,)
 
-    mask = _ink_mask(line.image)
-    if _has_large_vertical_delimiter(mask):
+    if _has_large_vertical_delimiter(ink):
         return (line,)
 
-    column_counts = mask.sum(axis=0)
     column_threshold = max(2, int(round(height * 0.035)))
-    column_has_ink = column_counts >= column_threshold
+    column_has_ink = ink.column_counts >= column_threshold
     ink_bands = _row_bands(column_has_ink)
     if len(ink_bands) < 2:
         return (line,)
@@ -309,25 +341,31 @@ def _split_wide_line_segments(line: FormulaLineCrop) -> tuple[FormulaLineCrop, .
     left = 0
     base_left, base_top, _base_right, _base_bottom = line.box
     for right in [*split_points, width]:
-        segment = _crop_segment(line.image[:, left:right], left, base_left, base_top)
+        segment = _crop_segment(
+            line.image[:, left:right],
+            ink.crop(left, 0, right, height),
+            left,
+            base_left,
+            base_top,
+        )
         if segment is not None:
             segments.append(segment)
         left = right
     return tuple(segments) if len(segments) > 1 else (line,)
 
 
-def _has_large_vertical_delimiter(mask: np.ndarray) -> bool:
-    height, width = mask.shape
+def _has_large_vertical_delimiter(ink: _InkMap) -> bool:
+    height, width = ink.shape
     if height < 48 or width < 80:
         return False
-    content = np.argwhere(mask)
-    if content.size == 0:
+    bounds = ink.bounds()
+    if bounds is None:
         return False
-    content_height = int(content[:, 0].max() - content[:, 0].min() + 1)
+    content_height = bounds[3] - bounds[1] + 1
     if content_height < height * 0.42:
         return False
     window = max(6, int(round(width * 0.035)))
-    column_counts = mask.sum(axis=0)
+    column_counts = ink.column_counts
     tall_threshold = max(12, int(round(content_height * 0.42)))
     left_has_tall = bool(np.any(column_counts[:window] >= tall_threshold))
     right_has_tall = bool(np.any(column_counts[-window:] >= tall_threshold))
@@ -338,23 +376,23 @@ def _has_large_vertical_delimiter(mask: np.ndarray) -> bool:
 
 def _crop_segment(
     segment_rgb: np.ndarray,
+    ink: _InkMap,
     offset_x: int,
     base_left: int,
     base_top: int,
 ) -> FormulaLineCrop | None:
-    mask = _ink_mask(segment_rgb)
-    points = np.argwhere(mask)
-    if points.size == 0:
+    bounds = ink.bounds()
+    if bounds is None:
         return None
     height, width = segment_rgb.shape[:2]
-    y1 = max(0, int(points[:, 0].min()) - 4)
-    y2 = min(height, int(points[:, 0].max()) + 5)
-    x1 = max(0, int(points[:, 1].min()) - 6)
-    x2 = min(width, int(points[:, 1].max()) + 7)
+    y1 = max(0, bounds[1] - 4)
+    y2 = min(height, bounds[3] + 5)
+    x1 = max(0, bounds[0] - 6)
+    x2 = min(width, bounds[2] + 7)
     if y2 - y1 < 8 or x2 - x1 < 16:
         return None
     return FormulaLineCrop(
-        image=segment_rgb[y1:y2, x1:x2].copy(),
+        image=segment_rgb[y1:y2, x1:x2],
         box=(base_left + offset_x + x1, base_top + y1, base_left + offset_x + x2, base_top + y2),
     )
 
@@ -15,9 +15,9 @@ ImageInput: TypeAlias = str | Path | Image.Image | np.ndarray
 def load_image_rgb(image: ImageInput) -> np.ndarray:
     if isinstance(image, (str, Path)):
         with Image.open(image) as handle:
-            return np.array(handle.convert("RGB"))
+            return _pil_to_rgb(handle)
     if isinstance(image, Image.Image):
-        return np.array(image.convert("RGB"))
+        return _pil_to_rgb(image)
     if not isinstance(image, np.ndarray):
         raise TypeError(f"unsupported image input: {type(image)!r}")
     if image.ndim == 2:
@@ -30,4 +30,10 @@ def load_image_rgb(image: ImageInput) -> np.ndarray:
 
 
 def rgb_to_bgr(image: np.ndarray) -> np.ndarray:
-    return image[:, :, ::-1].copy()
+    # A channel-reversed view; callers that paint on the result must copy it first.
+    return image[:, :, ::-1]
+
+
+def _pil_to_rgb(image: Image.Image) -> np.ndarray:
+    # The array wraps the decoded pixel bytes without another copy, so it is read-only.
+    return np.asarray(image if image.mode == "RGB" else image.convert("RGB"))
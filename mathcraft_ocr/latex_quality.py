@@ -45,6 +45,11 @@ def has_severe_latex_quality_issue(text: str) -> bool:
     return bool(set(latex_quality_flags(text)) & SEVERE_LATEX_QUALITY_FLAGS)
 
 
+def has_degenerate_repetition(text: str) -> bool:
+    value = str(text or "")
+    return _has_repeated_token_run(value) or _has_excessive_repeated_token(value)
+
+
 def _has_repeated_token_run(text: str) -> bool:
     previous = ""
     run = 0
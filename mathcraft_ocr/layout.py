@@ -4,11 +4,13 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from dataclasses import replace
+import math
 import re
 
 import numpy as np
 
 from .results import Box4P, MathCraftBlock
+from .spatial import BoxGrid
 
 
 @dataclass(frozen=True)
@@ -131,6 +133,80 @@ def mask_boxes(
     return masked
 
 
+class ImageBoxStats:
+    """Mean and standard deviation of image boxes over all channels.
+
+    Boxes are reduced directly until that work adds up to about the cost of
+    building summed-area tables; then tables of intensity and squared intensity are
+    built and every later box is answered in constant time.
+    """
+
+    def __init__(self, image: np.ndarray) -> None:
+        self.image = image
+        self._channels = 1 if image.ndim == 2 else int(image.shape[2])
+        self._budget = int(image.shape[0]) * int(image.shape[1]) * _TABLE_BUILD_PIXEL_COST
+        self._sums: np.ndarray | None = None
+        self._squares: np.ndarray | None = None
+
+    def mean(self, left: int, top: int, right: int, bottom: int) -> float:
+        if not self._use_tables(left, top, right, bottom):
+            return float(np.mean(self.image[top:bottom, left:right]))
+        count = (right - left) * (bottom - top) * self._channels
+        return _table_sum(self._sums, left, top, right, bottom) / count
+
+    def std(self, left: int, top: int, right: int, bottom: int) -> float:
+        if not self._use_tables(left, top, right, bottom):
+            return float(np.std(self.image[top:bottom, left:right]))
+        count = (right - left) * (bottom - top) * self._channels
+        total = _table_sum(self._sums, left, top, right, bottom)
+        squares = _table_sum(self._squares, left, top, right, bottom)
+        return math.sqrt(max(0, count * squares - total * total)) / count
+
+    def _use_tables(self, left: int, top: int, right: int, bottom: int) -> bool:
+        if self._sums is None:
+            self._budget -= (right - left) * (bottom - top) + _DIRECT_BOX_OVERHEAD
+            if self._budget > 0:
+                return False
+            self._sums, self._squares = _summed_area_tables(self.image)
+        return True
+
+
+# Building the tables costs about this many direct crop reductions per pixel,
+# and each direct reduction has a fixed cost of about this many pixels.
+_TABLE_BUILD_PIXEL_COST = 4
+_DIRECT_BOX_OVERHEAD = 1024
+
+
+def _summed_area_tables(image: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    planes = [image] if image.ndim == 2 else [image[:, :, channel] for channel in range(image.shape[2])]
+    values = planes[0].astype(np.uint32)
+    squares = np.square(planes[0], dtype=np.uint32)
+    for plane in planes[1:]:
+        values += plane
+        squares += np.square(plane, dtype=np.uint32)
+    return _summed_area_table(values), _summed_area_table(squares)
+
+
+def _summed_area_table(values: np.ndarray) -> np.ndarray:
+    height, width = values.shape
+    table = np.zeros((height + 1, width + 1), dtype=np.int64)
+    table[1:, 1:] = values
+    # Adding rows in place is several times faster than np.cumsum along axis 0.
+    for row in range(2, height + 1):
+        np.add(table[row], table[row - 1], out=table[row])
+    np.cumsum(table, axis=1, out=table)
+    return table
+
+
+def _table_sum(table: np.ndarray, left: int, top: int, right: int, bottom: int) -> int:
+    return (
+        int(table[bottom, right])
+        - int(table[top, right])
+        - int(table[bottom, left])
+        + int(table[top, left])
+    )
+
+
 def is_informative_ocr_box(
     image: np.ndarray,
     box: Box4P,
@@ -140,6 +216,7 @@ def is_informative_ocr_box(
     min_area: float = 48.0,
     blank_mean_threshold: float = 249.0,
     blank_std_threshold: float = 4.0,
+    stats: ImageBoxStats | None = None,
 ) -> bool:
     x1, y1, x2, y2 = box_to_xyxy(box)
     width = x2 - x1
@@ -153,6 +230,13 @@ def is_informative_ocr_box(
     bottom = min(img_h, int(np.ceil(y2)))
     if right <= left or bottom <= top:
         return False
+    if stats is not None:
+        if (
+            stats.mean(left, top, right, bottom) >= blank_mean_threshold
+            and stats.std(left, top, right, bottom) <= blank_std_threshold
+        ):
+            return False
+        return True
     crop = image[top:bottom, left:right]
     if crop.size == 0:
         return False
@@ -167,9 +251,13 @@ def split_text_box_around_formulas(
     *,
     overlap_threshold: float = 0.1,
     min_width: float = 8.0,
+    formula_grid: BoxGrid | None = None,
 ) -> tuple[TextSegment, ...]:
     text_x1, text_y1, text_x2, text_y2 = box_to_xyxy(text_box)
     intervals = [(text_x1, text_x2)]
+    if formula_grid is not None:
+        # Formulas that do not touch the text box cannot cut any interval.
+        formula_boxes = [formula_boxes[index] for index in formula_grid.query(text_x1, text_y1, text_x2, text_y2)]
     relevant_formulas = sorted(
         (
             formula_box
@@ -208,30 +296,35 @@ def resolve_formula_text_conflicts(
     image_size: tuple[int, int] | None = None,
 ) -> tuple[MathCraftBlock, ...]:
     """Drop text fully swallowed by formulas and tag short formula-adjacent text."""
-    formula_blocks = tuple(
-        block
-        for block in blocks
+    blocks = tuple(blocks)
+    formula_indices = {
+        index
+        for index, block in enumerate(blocks)
         if block.kind in {"formula", "embedding", "inline_formula", "isolated", "display_formula"}
         or block.source == "formula_rec"
-    )
-    if not formula_blocks:
-        return tuple(blocks)
+    }
+    if not formula_indices:
+        return blocks
+    formula_blocks = tuple(blocks[index] for index in sorted(formula_indices))
+    formula_grid = BoxGrid([block.box for block in formula_blocks])
+    page_width = float(image_size[0]) if image_size and image_size[0] > 0 else 0.0
 
     resolved: list[MathCraftBlock] = []
-    for block in blocks:
-        if block in formula_blocks or block.kind != "text":
+    for index, block in enumerate(blocks):
+        if index in formula_indices or block.kind != "text":
             resolved.append(block)
             continue
 
         text = block.text.strip()
-        adjacent = _is_formula_adjacent(block, formula_blocks, image_size=image_size)
+        nearby = _nearby_formula_blocks(block, formula_blocks, formula_grid, page_width=page_width)
+        adjacent = _is_formula_adjacent(block, nearby, image_size=image_size)
         if _is_formula_label_text(text) and adjacent:
             resolved.append(replace(block, role=block.role or "formula_label"))
             continue
         if _is_formula_anchor_text(text) and adjacent:
             resolved.append(replace(block, role=block.role or "formula_anchor"))
             continue
-        if _is_text_swallowed_by_formula(block, formula_blocks):
+        if _is_text_swallowed_by_formula(block, nearby):
             continue
         resolved.append(block)
     return tuple(resolved)
@@ -246,26 +339,109 @@ def group_blocks_into_lines(
 ) -> tuple[tuple[MathCraftBlock, ...], ...]:
     if two_column_layout is None:
         two_column_layout = _is_two_column_layout(blocks, image_size=image_size)
+    return tuple(
+        line
+        for line, _line_box in _group_lines(
+            blocks,
+            y_overlap_threshold=y_overlap_threshold,
+            two_column_layout=two_column_layout,
+        )
+    )
+
+
+class _LineIndex:
+    """Open lines with their running boxes, bucketed by page and y band."""
+
+    def __init__(self, band_height: float) -> None:
+        self.band_height = max(1.0, band_height)
+        self.lines: list[list[MathCraftBlock]] = []
+        self.boxes: list[tuple[float, float, float, float]] = []
+        self._bands: dict[tuple[int, int], list[int]] = {}
+
+    def candidates(self, page: int, y1: float, y2: float) -> list[int]:
+        found: set[int] = set()
+        first, last = self._band_range(y1, y2)
+        for band in range(first, last + 1):
+            found.update(self._bands.get((page, band), ()))
+        return sorted(found)
+
+    def add(self, page: int, block: MathCraftBlock, xyxy: tuple[float, float, float, float]) -> None:
+        index = len(self.lines)
+        self.lines.append([block])
+        self.boxes.append(xyxy)
+        first, last = self._band_range(xyxy[1], xyxy[3])
+        for band in range(first, last + 1):
+            self._bands.setdefault((page, band), []).append(index)
+
+    def extend(
+        self,
+        page: int,
+        index: int,
+        block: MathCraftBlock,
+        xyxy: tuple[float, float, float, float],
+    ) -> None:
+        old = self.boxes[index]
+        new = (min(old[0], xyxy[0]), min(old[1], xyxy[1]), max(old[2], xyxy[2]), max(old[3], xyxy[3]))
+        self.lines[index].append(block)
+        self.boxes[index] = new
+        old_first, old_last = self._band_range(old[1], old[3])
+        first, last = self._band_range(new[1], new[3])
+        for band in range(first, last + 1):
+            if not old_first <= band <= old_last:
+                self._bands.setdefault((page, band), []).append(index)
+
+    def _band_range(self, y1: float, y2: float) -> tuple[int, int]:
+        return math.floor(y1 / self.band_height), math.floor(y2 / self.band_height)
+
+
+def _group_lines(
+    blocks: tuple[MathCraftBlock, ...] | list[MathCraftBlock],
+    *,
+    y_overlap_threshold: float,
+    two_column_layout: bool,
+) -> tuple[tuple[tuple[MathCraftBlock, ...], Box4P], ...]:
+    # A block can only join a line whose y range strictly overlaps its own, so
+    # lines in other y bands are never scored and every line box is kept up to
+    # date as blocks join instead of being re-unioned per candidate.
     sorted_blocks = sorted(blocks, key=lambda block: _block_sort_key(block, two_column_layout))
-    lines: list[list[MathCraftBlock]] = []
-    for block in sorted_blocks:
-        best_line: list[MathCraftBlock] | None = None
+    xyxys = [box_to_xyxy(block.box) for block in sorted_blocks]
+    heights = [y2 - y1 for _x1, y1, _x2, y2 in xyxys if y2 > y1]
+    index = _LineIndex(float(np.median(heights)) if heights else 1.0)
+    for block, xyxy in zip(sorted_blocks, xyxys):
+        page = block.page_index or 0
+        best_line: int | None = None
         best_overlap = 0.0
-        for line in lines:
-            line_box = _union_box([item.box for item in line])
-            if not _same_layout_region(line[0], block, line_box, two_column_layout=two_column_layout):
+        for line_index in index.candidates(page, xyxy[1], xyxy[3]):
+            line_box = xyxy_to_box(*index.boxes[line_index])
+            if not _same_layout_region(
+                index.lines[line_index][0],
+                block,
+                line_box,
+                two_column_layout=two_column_layout,
+            ):
                 continue
             overlap = y_overlap_ratio(line_box, block.box)
             if overlap > best_overlap:
                 best_overlap = overlap
-                best_line = line
+                best_line = line_index
         if best_line is None or best_overlap < y_overlap_threshold:
-            lines.append([block])
+            index.add(page, block, xyxy)
         else:
-            best_line.append(block)
+            index.extend(page, best_line, block, xyxy)
+    order = sorted(
+        range(len(index.lines)),
+        key=lambda line_index: _line_sort_key(
+            index.lines[line_index],
+            index.boxes[line_index],
+            two_column_layout,
+        ),
+    )
     return tuple(
-        tuple(sorted(line, key=lambda item: box_to_xyxy(item.box)[0]))
-        for line in sorted(lines, key=lambda line: _line_sort_key(line, two_column_layout))
+        (
+            tuple(sorted(index.lines[line_index], key=lambda item: box_to_xyxy(item.box)[0])),
+            xyxy_to_box(*index.boxes[line_index]),
+        )
+        for line_index in order
     )
 
 
@@ -284,9 +460,9 @@ def annotate_blocks(
         for block in blocks
     )
     two_column_layout = _is_two_column_layout(seeded, image_size=image_size)
-    lines = group_blocks_into_lines(
+    lines = _group_lines(
         seeded,
-        image_size=image_size,
+        y_overlap_threshold=0.45,
         two_column_layout=two_column_layout,
     )
     line_infos = _annotate_lines(lines, image_size=image_size, two_column_layout=two_column_layout)
@@ -338,6 +514,7 @@ def merge_blocks_text(
     embed_sep: tuple[str, str] = (" $", "$ "),
     isolated_sep: tuple[str, str] = ("$$\n", "\n$$"),
 ) -> str:
+    # Regroup instead of trusting line_id: without noise roles the two-column decision can differ.
     lines = group_blocks_into_lines(blocks)
     line_texts: list[str] = []
     for line in lines:
@@ -367,14 +544,13 @@ def merge_blocks_text(
 
 
 def _annotate_lines(
-    lines: tuple[tuple[MathCraftBlock, ...], ...],
+    lines: tuple[tuple[tuple[MathCraftBlock, ...], Box4P], ...],
     *,
     image_size: tuple[int, int] | None,
     two_column_layout: bool,
 ) -> tuple[_LineInfo, ...]:
     base_infos: list[_LineInfo] = []
-    for line in lines:
-        line_box = _union_box([block.box for block in line])
+    for line, line_box in lines:
         column = _line_column(line, line_box, two_column_layout=two_column_layout)
         is_display = _is_display_formula_line(line, image_size=image_size)
         role = _line_role(line, line_box, image_size=image_size)
@@ -534,10 +710,11 @@ def _block_sort_key(
 
 def _line_sort_key(
     line: list[MathCraftBlock],
+    line_xyxy: tuple[float, float, float, float],
     two_column_layout: bool,
 ) -> tuple[float, float, float, float]:
     first = line[0]
-    x1, y1, _x2, _y2 = box_to_xyxy(_union_box([item.box for item in line]))
+    x1, y1, _x2, _y2 = line_xyxy
     page = first.page_index if first.page_index is not None else 0
     column = _block_column(first) if two_column_layout else 0
     return float(page), float(column), y1, x1
@@ -833,6 +1010,25 @@ def _is_formula_label_text(text: str) -> bool:
     return bool(_FORMULA_LABEL_RE.match(text.strip()))
 
 
+def _nearby_formula_blocks(
+    block: MathCraftBlock,
+    formula_blocks: tuple[MathCraftBlock, ...],
+    formula_grid: BoxGrid,
+    *,
+    page_width: float,
+) -> tuple[MathCraftBlock, ...]:
+    # Covers every formula _is_formula_adjacent or _is_text_swallowed_by_formula
+    # can accept: within 2.2 block heights vertically and 0.16 page widths of
+    # the block horizontally.
+    bx1, by1, bx2, by2 = box_to_xyxy(block.box)
+    reach_y = max(1.0, by2 - by1) * 2.2
+    reach_x = page_width * 0.16
+    return tuple(
+        formula_blocks[index]
+        for index in formula_grid.query(bx1 - reach_x, by1 - reach_y, bx2 + reach_x, by2 + reach_y)
+    )
+
+
 def _is_formula_adjacent(
     block: MathCraftBlock,
     formula_blocks: tuple[MathCraftBlock, ...],
@@ -3,11 +3,17 @@
 from __future__ import annotations
 
 import json
+import os
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
-from .errors import ManifestError
+from .errors import ManifestError, MathCraftError
+
+
+DEFAULT_PRECISION = "fp32"
+MODEL_PRECISIONS = (DEFAULT_PRECISION, "int8")
+PRECISION_ENV = "MATHCRAFT_PRECISION"
 
 
 @dataclass(frozen=True)
@@ -24,6 +30,22 @@ class ModelSpec:
     sources: tuple[str, ...]
     runtime: str = "onnx"
     optional: bool = False
+    optional_files: tuple[ModelFileSpec, ...] = ()
+    precision: str = DEFAULT_PRECISION
+    cache_name: str = ""
+    variants: tuple[ModelSpec, ...] = ()
+
+    @property
+    def dir_name(self) -> str:
+        return self.cache_name or self.model_id
+
+    def variant(self, precision: str) -> ModelSpec | None:
+        if precision == self.precision:
+            return self
+        for item in self.variants:
+            if item.precision == precision:
+                return item
+        return None
 
 
 @dataclass(frozen=True)
@@ -32,6 +54,28 @@ class Manifest:
     models: dict[str, ModelSpec]
 
 
+def normalize_precision(precision: str | None) -> str:
+    value = (precision or DEFAULT_PRECISION).strip().lower()
+    if value not in MODEL_PRECISIONS:
+        raise MathCraftError(f"unsupported model precision: {precision}")
+    return value
+
+
+def precision_from_env() -> str:
+    return normalize_precision(os.environ.get(PRECISION_ENV, ""))
+
+
+def manifest_for_precision(manifest: Manifest, precision: str) -> Manifest:
+    precision = normalize_precision(precision)
+    return Manifest(
+        version=manifest.version,
+        models={
+            model_id: spec.variant(precision) or spec
+            for model_id, spec in manifest.models.items()
+        },
+    )
+
+
 def _manifest_path() -> Path:
     return Path(__file__).with_name("manifests") / "models.v1.json"
 
@@ -56,18 +100,11 @@ def load_manifest(path: str | Path | None = None) -> Manifest:
         files = payload.get("files")
         if not isinstance(files, list) or not files:
             raise ManifestError(f"model '{model_id}' must define non-empty files")
-        parsed_files: list[ModelFileSpec] = []
-        for item in files:
-            item = _require_dict(item, f"{model_id}.files")
-            model_path = item.get("path")
-            if not isinstance(model_path, str) or not model_path.strip():
-                raise ManifestError(f"model '{model_id}' file path must be a string")
-            sha256 = item.get("sha256", "")
-            if sha256 is None:
-                sha256 = ""
-            if not isinstance(sha256, str):
-                raise ManifestError(f"model '{model_id}' file sha256 must be a string")
-            parsed_files.append(ModelFileSpec(path=model_path, sha256=sha256))
+        parsed_files = _parse_file_specs(model_id, files, "files")
+        optional_files = payload.get("optional_files", [])
+        if not isinstance(optional_files, list):
+            raise ManifestError(f"model '{model_id}' optional_files must be a list")
+        parsed_optional_files = _parse_file_specs(model_id, optional_files, "optional_files")
         sources = payload.get("sources", [])
         if not isinstance(sources, list) or not all(isinstance(s, str) for s in sources):
             raise ManifestError(f"model '{model_id}' sources must be a list[str]")
@@ -81,9 +118,64 @@ def load_manifest(path: str | Path | None = None) -> Manifest:
         models[model_id] = ModelSpec(
             model_id=model_id,
             version=version_text,
-            files=tuple(parsed_files),
+            files=parsed_files,
             sources=tuple(sources),
             runtime=runtime,
             optional=optional,
+            optional_files=parsed_optional_files,
+            variants=_parse_variants(model_id, payload.get("variants", {}), runtime, optional),
         )
     return Manifest(version=version, models=models)
+
+
+def _parse_variants(model_id: str, raw: Any, runtime: str, optional: bool) -> tuple[ModelSpec, ...]:
+    raw = _require_dict(raw, f"{model_id}.variants")
+    variants: list[ModelSpec] = []
+    for precision, payload in raw.items():
+        if precision not in MODEL_PRECISIONS or precision == DEFAULT_PRECISION:
+            raise ManifestError(f"model '{model_id}' has unsupported variant precision '{precision}'")
+        payload = _require_dict(payload, f"{model_id}.variants.{precision}")
+        files = payload.get("files")
+        if not isinstance(files, list) or not files:
+            raise ManifestError(f"model '{model_id}' variant '{precision}' must define non-empty files")
+        optional_files = payload.get("optional_files", [])
+        if not isinstance(optional_files, list):
+            raise ManifestError(f"model '{model_id}' variant '{precision}' optional_files must be a list")
+        sources = payload.get("sources", [])
+        if not isinstance(sources, list) or not all(isinstance(s, str) for s in sources):
+            raise ManifestError(f"model '{model_id}' variant '{precision}' sources must be a list[str]")
+        version_text = payload.get("version", "1")
+        if not isinstance(version_text, str):
+            raise ManifestError(f"model '{model_id}' variant '{precision}' version must be a string")
+        variants.append(
+            ModelSpec(
+                model_id=model_id,
+                version=version_text,
+                files=_parse_file_specs(model_id, files, f"variants.{precision}.files"),
+                sources=tuple(sources),
+                runtime=runtime,
+                optional=optional,
+                optional_files=_parse_file_specs(
+                    model_id, optional_files, f"variants.{precision}.optional_files"
+                ),
+                precision=precision,
+                cache_name=f"{model_id}.{precision}",
+            )
+        )
+    return tuple(variants)
+
+
+def _parse_file_specs(model_id: str, items: list[Any], field_name: str) -> tuple[ModelFileSpec, ...]:
+    parsed: list[ModelFileSpec] = []
+    for item in items:
+        item = _require_dict(item, f"{model_id}.{field_name}")
+        model_path = item.get("path")
+        if not isinstance(model_path, str) or not model_path.strip():
+            raise ManifestError(f"model '{model_id}' file path must be a string")
+        sha256 = item.get("sha256", "")
+        if sha256 is None:
+            sha256 = ""
+        if not isinstance(sha256, str):
+            raise ManifestError(f"model '{model_id}' file sha256 must be a string")
+        parsed.append(ModelFileSpec(path=model_path, sha256=sha256))
+    return tuple(parsed)
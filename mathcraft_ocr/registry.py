@@ -0,0 +1,101 @@
+# coding: utf-8
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import os
+from pathlib import Path
+
+from .manifest import ModelSpec
+
+
+FileSignature = tuple[str, int, int]
+
+
+@dataclass(frozen=True)
+class ResolvedModel:
+    model_id: str
+    model_dir: Path
+    signature: tuple[FileSignature, ...]
+
+    def is_stale(self) -> bool:
+        return _signature([Path(path) for path, _mtime, _size in self.signature]) != self.signature
+
+
+class ModelRegistry:
+    def __init__(self) -> None:
+        self._models: dict[str, ResolvedModel] = {}
+
+    def get(self, model_id: str) -> ResolvedModel | None:
+        return self._models.get(model_id)
+
+    def register(self, spec: ModelSpec, model_dir: Path) -> ResolvedModel:
+        resolved = ResolvedModel(
+            model_id=spec.model_id,
+            model_dir=model_dir,
+            signature=_signature(tracked_model_files(spec, model_dir)),
+        )
+        self._models[spec.model_id] = resolved
+        return resolved
+
+    def stale_models(self, model_ids: tuple[str, ...]) -> tuple[str, ...]:
+        return tuple(
+            model_id
+            for model_id in model_ids
+            if model_id not in self._models or self._models[model_id].is_stale()
+        )
+
+    def invalidate(
+        self,
+        model_ids: tuple[str, ...] | None = None,
+        *,
+        model_dirs: tuple[Path, ...] = (),
+    ) -> None:
+        # Only the sessions and adapters loaded from the invalidated models' dirs are dropped;
+        # ``model_dirs`` adds dirs a model is about to be resolved from.
+        if model_ids is None:
+            self._models.clear()
+            clear_adapter_caches()
+            return
+        dirs = list(model_dirs)
+        for model_id in model_ids:
+            resolved = self._models.pop(model_id, None)
+            if resolved is not None:
+                dirs.append(resolved.model_dir)
+        if dirs:
+            clear_adapter_caches(dirs)
+
+    def snapshot(self) -> dict[str, ResolvedModel]:
+        return dict(self._models)
+
+
+def tracked_model_files(spec: ModelSpec, model_dir: Path) -> list[Path]:
+    files = [model_dir / item.path for item in spec.files]
+    files.extend(model_dir / item.path for item in spec.optional_files if (model_dir / item.path).is_file())
+    return files
+
+
+def clear_adapter_caches(model_dirs: list[Path] | None = None) -> None:
+    from .adapters.common import clear_session_cache
+    from .adapters.formula_detector import clear_formula_detector_cache
+    from .adapters.formula_recognizer import clear_formula_recognizer_cache
+    from .adapters.text_detector import clear_text_detector_cache
+    from .adapters.text_recognizer import clear_text_recognizer_cache
+
+    clear_session_cache(model_dirs)
+    clear_formula_detector_cache(model_dirs)
+    clear_formula_recognizer_cache(model_dirs)
+    clear_text_detector_cache(model_dirs)
+    clear_text_recognizer_cache(model_dirs)
+
+
+def _signature(paths: list[Path]) -> tuple[FileSignature, ...]:
+    items: list[FileSignature] = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            items.append((str(path), -1, -1))
+            continue
+        items.append((str(path), int(stat.st_mtime_ns), int(stat.st_size)))
+    return tuple(items)
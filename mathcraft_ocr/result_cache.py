@@ -0,0 +1,166 @@
+# coding: utf-8
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+
+import numpy as np
+
+
+FORMULA_RESULT_CACHE_DIRNAME = ".formula-results"
+_PERSIST_FILENAME = "formula-results.v1.jsonl"
+
+
+@dataclass(frozen=True)
+class FormulaResultCachePolicy:
+    """Bounded LRU of recognized formula crops; max_entries=0 disables caching."""
+
+    max_entries: int = 2048
+    persist: bool = False
+    persist_dir: str = ""
+
+
+@dataclass(frozen=True)
+class FormulaResultCacheStats:
+    hits: int
+    misses: int
+    entries: int
+    max_entries: int
+    persist_path: str
+
+
+DEFAULT_FORMULA_RESULT_CACHE_POLICY = FormulaResultCachePolicy()
+
+
+def formula_result_cache_policy_from_env() -> FormulaResultCachePolicy:
+    policy = DEFAULT_FORMULA_RESULT_CACHE_POLICY
+    size = os.environ.get("MATHCRAFT_FORMULA_CACHE_SIZE", "").strip()
+    if size:
+        policy = replace(policy, max_entries=max(0, int(size)))
+    persist = os.environ.get("MATHCRAFT_FORMULA_CACHE_PERSIST", "").strip().lower()
+    if persist:
+        policy = replace(policy, persist=persist in {"1", "on", "true"})
+    return policy
+
+
+def crop_cache_key(image, *, model_key: str, max_new_tokens: int) -> str:
+    pixels = np.ascontiguousarray(np.asarray(image))
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{model_key}|{max_new_tokens}|{pixels.dtype.str}|{pixels.shape}|".encode("utf-8"))
+    digest.update(pixels.data)
+    return digest.hexdigest()
+
+
+class FormulaResultCache:
+    def __init__(self, policy: FormulaResultCachePolicy = DEFAULT_FORMULA_RESULT_CACHE_POLICY) -> None:
+        self.max_entries = max(0, int(policy.max_entries))
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._persist_path: Path | None = None
+        if self.max_entries and policy.persist and policy.persist_dir:
+            self._persist_path = Path(policy.persist_dir) / _PERSIST_FILENAME
+            self._load()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> tuple[str, float] | None:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key: str, value: tuple[str, float]) -> None:
+        if not self.enabled:
+            return
+        text, score = str(value[0]), float(value[1])
+        with self._lock:
+            self._entries[key] = (text, score)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self._persist_path is not None:
+                self._append(self._persist_path, key, text, score)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._persist_path is not None:
+                self._persist_path.unlink(missing_ok=True)
+
+    def stats(self) -> FormulaResultCacheStats:
+        with self._lock:
+            return FormulaResultCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                entries=len(self._entries),
+                max_entries=self.max_entries,
+                persist_path=str(self._persist_path or ""),
+            )
+
+    def _load(self) -> None:
+        path = self._persist_path
+        if path is None or not path.is_file():
+            return
+        signature = _file_signature(path)
+        lines = 0
+        try:
+            with path.open("r", encoding="utf-8") as fh:
+                for line in fh:
+                    lines += 1
+                    try:
+                        item = json.loads(line)
+                        key, text, score = str(item["k"]), str(item["t"]), float(item["s"])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    self._entries[key] = (text, score)
+                    self._entries.move_to_end(key)
+                    if len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        except OSError:
+            return
+        if lines > 2 * self.max_entries:
+            self._compact(path, signature)
+
+    def _append(self, path: Path, key: str, text: str, score: float) -> None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open("a", encoding="utf-8") as fh:
+                fh.write(json.dumps({"k": key, "t": text, "s": score}, ensure_ascii=False) + "\n")
+        except OSError:
+            self._persist_path = None
+
+    def _compact(self, path: Path, signature: tuple[int, int] | None) -> None:
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            with temp_path.open("w", encoding="utf-8") as fh:
+                for key, (text, score) in self._entries.items():
+                    fh.write(json.dumps({"k": key, "t": text, "s": score}, ensure_ascii=False) + "\n")
+            # Another process appended since the file was read; keep its lines and compact next start.
+            if signature is None or _file_signature(path) != signature:
+                temp_path.unlink(missing_ok=True)
+                return
+            os.replace(temp_path, path)
+        except OSError:
+            temp_path.unlink(missing_ok=True)
+
+
+def _file_signature(path: Path) -> tuple[int, int] | None:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
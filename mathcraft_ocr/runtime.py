@@ -2,14 +2,28 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, wait
+import contextvars
+from dataclasses import dataclass, replace
+import os
 from pathlib import Path
 import sys
+import threading
+import time
 
-from rapidocr.utils.process_img import get_rotate_crop_image
+import numpy as np
 
-from .adapters.formula_detector import detect_formula_boxes, warmup_formula_detector
+from .adapters.common import drain_session_build_stats
+from .adapters.formula_detector import (
+    FormulaBox,
+    detect_formula_boxes,
+    detect_formula_boxes_batch,
+    warmup_formula_detector,
+)
 from .adapters.formula_recognizer import (
+    DECODE_MODES,
+    FormulaDecodeStats,
     recognize_formula_image,
     recognize_formula_images,
     warmup_formula_recognizer,
@@ -19,11 +33,19 @@ from .adapters.text_recognizer import (
     recognize_pp_text_lines,
     warmup_pp_text_recognizer,
 )
-from .cache import ModelCacheState, inspect_manifest_roots, resolve_model_roots, resolve_user_models_dir
-from .doctor import DoctorReport, run_doctor
-from .downloader import download_model_archive
+from .batching import FormulaBatchPolicy, formula_batch_policy_from_env, image_size, plan_formula_batches, run_in_batches
+from .cache import (
+    ModelCacheState,
+    inspect_manifest_roots,
+    manifest_roots_fingerprint,
+    resolve_model_roots,
+    resolve_user_models_dir,
+)
+from .cancellation import raise_if_cancelled
+from .doctor import DoctorReport, run_doctor, write_doctor_snapshot
+from .downloader import download_model_archive, usable_sources
 from .error_patterns import looks_like_cuda_runtime_error
-from .errors import ModelCacheError
+from .errors import MathCraftError, ModelCacheError
 from .formula_lines import compose_aligned_formula, compose_formula_line, split_formula_line_groups
 from .hardware import choose_rec_batch_num, detect_hardware_info
 from .image import load_image_rgb, rgb_to_bgr
@@ -33,6 +55,7 @@ from .latex_quality import (
     latex_quality_flags,
 )
 from .layout import (
+    ImageBoxStats,
     annotate_blocks,
     box_to_points,
     is_informative_ocr_box,
@@ -42,7 +65,14 @@ from .layout import (
     resolve_formula_text_conflicts,
     split_text_box_around_formulas,
 )
-from .manifest import Manifest, load_manifest
+from .manifest import (
+    DEFAULT_PRECISION,
+    Manifest,
+    load_manifest,
+    manifest_for_precision,
+    normalize_precision,
+    precision_from_env,
+)
 from .profiles import (
     FORMULA_DETECTOR_ID,
     FORMULA_RECOGNIZER_ID,
@@ -50,8 +80,19 @@ from .profiles import (
     TEXT_DETECTOR_ID,
     TEXT_RECOGNIZER_ID,
 )
-from .providers import ProviderInfo
+from .providers import ProviderInfo, detect_providers
+from .registry import ModelRegistry
+from .result_cache import (
+    FORMULA_RESULT_CACHE_DIRNAME,
+    FormulaResultCache,
+    FormulaResultCachePolicy,
+    FormulaResultCacheStats,
+    crop_cache_key,
+    formula_result_cache_policy_from_env,
+)
 from .results import Box4P, FormulaRecognitionResult, MathCraftBlock, MixedRecognitionResult, OCRRegion
+from .session_options import OPTIMIZED_CACHE_DIRNAME, SessionOptionsProfile, session_options_from_env
+from .spatial import BoxGrid
 
 
 @dataclass(frozen=True)
@@ -71,6 +112,74 @@ class WarmupPlan:
     provider_info: ProviderInfo
     ready: bool
     cache_events: tuple[str, ...] = ()
+    session_build_seconds: float = 0.0
+    optimized_cache_hits: int = 0
+    optimized_cache_saved_seconds: float = 0.0
+    deep_warmup_seconds: float = 0.0
+
+
+@dataclass(frozen=True)
+class _MixedPage:
+    rgb: object
+    formula_boxes: tuple[FormulaBox, ...]
+    text_segments: tuple
+    text_crops: tuple
+    formula_jobs: tuple[tuple[int, int, object], ...]
+    formula_line_counts: tuple[int, ...]
+
+
+class _PartialBlocks:
+    # Turns finished recognition batches of one page into blocks for streaming callers.
+    def __init__(
+        self,
+        page: _MixedPage,
+        on_partial: Callable[[MathCraftBlock], None],
+        *,
+        min_text_score: float,
+    ) -> None:
+        self._page = page
+        self._on_partial = on_partial
+        self._min_text_score = min_text_score
+        self._lock = threading.Lock()
+        self._formula_results: list[list[list[tuple[str, float]]]] = [
+            [[] for _line in range(line_count)] for line_count in page.formula_line_counts
+        ]
+        self._formula_remaining = [0] * len(page.formula_boxes)
+        for index, _line_index, _image in page.formula_jobs:
+            self._formula_remaining[index] += 1
+
+    def text_results(self, offset: int, results: list[tuple[str, float]]) -> None:
+        segments = self._page.text_segments[offset : offset + len(results)]
+        for segment, (text, score) in zip(segments, results):
+            cleaned_text = text.strip()
+            if not cleaned_text or score < self._min_text_score:
+                continue
+            self._on_partial(
+                MathCraftBlock(kind="text", box=segment.box, text=cleaned_text, score=score, source="text_rec")
+            )
+
+    def formula_results(self, job_indices: list[int], results: list[tuple[str, float]]) -> None:
+        finished: list[int] = []
+        with self._lock:
+            for job_index, result in zip(job_indices, results):
+                index, line_index, _image = self._page.formula_jobs[job_index]
+                self._formula_results[index][line_index].append(result)
+                self._formula_remaining[index] -= 1
+                if self._formula_remaining[index] == 0:
+                    finished.append(index)
+        for index in finished:
+            formula_box = self._page.formula_boxes[index]
+            formula_text, formula_score = _merge_formula_group_results(self._formula_results[index])
+            self._on_partial(
+                MathCraftBlock(
+                    kind=formula_box.label,
+                    box=formula_box.box,
+                    text=formula_text,
+                    score=min(formula_box.score, formula_score),
+                    source="formula_rec",
+                    confidence_flags=latex_quality_flags(formula_text),
+                )
+            )
 
 
 ONNX_WARMUP_HANDLERS = {
@@ -81,6 +190,14 @@ ONNX_WARMUP_HANDLERS = {
 }
 
 FORMULA_MAX_NEW_TOKENS = 512
+FORMULA_DETECT_BATCH_SIZE = 4
+MIXED_PIPELINE_MODES = ("auto", "sequential", "concurrent")
+MIXED_PIPELINE_ENV = "MATHCRAFT_MIXED_PIPELINE"
+DEEP_WARMUP_ENV = "MATHCRAFT_DEEP_WARMUP"
+# Representative inputs for deep warmup: short, medium and wide formula crops, one text line, one page.
+DEEP_WARMUP_FORMULA_WIDTHS = (96, 320, 768)
+DEEP_WARMUP_MAX_NEW_TOKENS = 8
+DEEP_WARMUP_PAGE_SIZE = (1240, 1754)
 
 
 class MathCraftRuntime:
@@ -92,40 +209,269 @@ class MathCraftRuntime:
         manifest: Manifest | None = None,
         bundled_models_dir: str | Path | None = None,
         auto_download: bool = True,
+        formula_decode_mode: str = "auto",
+        formula_batch_policy: FormulaBatchPolicy | None = None,
+        session_options: SessionOptionsProfile | None = None,
+        precision: str | None = None,
+        formula_result_cache: FormulaResultCachePolicy | None = None,
+        mixed_pipeline_mode: str | None = None,
+        deep_warmup: bool | None = None,
     ) -> None:
+        decode_mode = (formula_decode_mode or "auto").strip().lower()
+        if decode_mode not in DECODE_MODES:
+            raise MathCraftError(f"unsupported formula decode mode: {formula_decode_mode}")
+        pipeline_mode = (mixed_pipeline_mode or os.environ.get(MIXED_PIPELINE_ENV, "") or "auto").strip().lower()
+        if pipeline_mode not in MIXED_PIPELINE_MODES:
+            raise MathCraftError(f"unsupported mixed pipeline mode: {pipeline_mode}")
         self.cache_dir = resolve_user_models_dir(cache_dir)
         self.bundled_models_dir = Path(bundled_models_dir) if bundled_models_dir else None
         self.model_roots = resolve_model_roots(cache_dir, bundled_models_dir)
         self.provider_preference = provider_preference
         self.manifest = manifest or load_manifest()
+        self.precision = normalize_precision(precision) if precision else precision_from_env()
+        self.model_manifest = manifest_for_precision(self.manifest, self.precision)
         self.auto_download = auto_download
+        self.formula_decode_mode = decode_mode
+        self.mixed_pipeline_mode = pipeline_mode
+        if deep_warmup is None:
+            deep_warmup = os.environ.get(DEEP_WARMUP_ENV, "").strip().lower() in {"1", "on", "true"}
+        self.deep_warmup = deep_warmup
+        self.formula_batch_policy = formula_batch_policy or formula_batch_policy_from_env()
+        self.session_options = session_options or session_options_from_env()
+        if self.session_options.optimized_cache and not self.session_options.optimized_cache_dir:
+            self.session_options = replace(
+                self.session_options,
+                optimized_cache_dir=str(self.cache_dir / OPTIMIZED_CACHE_DIRNAME),
+            )
+        result_cache_policy = formula_result_cache or formula_result_cache_policy_from_env()
+        if result_cache_policy.persist and not result_cache_policy.persist_dir:
+            result_cache_policy = replace(
+                result_cache_policy,
+                persist_dir=str(self.cache_dir / FORMULA_RESULT_CACHE_DIRNAME),
+            )
+        self._formula_result_cache = FormulaResultCache(result_cache_policy)
+        self._formula_decode_totals: dict[str, tuple[int, float, int]] = {}
         self._warmup_cache: dict[str, WarmupPlan] = {}
+        self._warmup_lock = threading.RLock()
+        self._deep_warmed: set[str] = set()
+        self._deep_warmup_lock = threading.Lock()
+        self._prewarm_thread: threading.Thread | None = None
+        self._runtime_info_lock = threading.Lock()
+        self._provider_info: ProviderInfo | None = None
+        self._cache_states: dict[str, ModelCacheState] | None = None
+        self._cache_states_fingerprint: tuple | None = None
+        self._runtime_info: DoctorReport | None = None
+        self._model_registry = ModelRegistry()
         self._rec_batch_cache: dict[str, int] = {}
         self._cache_events: list[str] = []
+        self._mixed_executor: ThreadPoolExecutor | None = None
+        self._last_mixed_stage_seconds: dict[str, float] = {}
 
     def _record_cache_event(self, message: str) -> None:
         self._cache_events.append(message)
         print(f"[MATHCRAFT_CACHE] {message}", file=sys.stderr, flush=True)
 
-    def check_models(self, include_optional: bool = True):
-        return inspect_manifest_roots(
-            self.model_roots, self.manifest, include_optional=include_optional
+    def _record_formula_decode_stats(self, stats: FormulaDecodeStats) -> None:
+        tokens, seconds, degenerate = self._formula_decode_totals.get(stats.mode, (0, 0.0, 0))
+        self._formula_decode_totals[stats.mode] = (
+            tokens + stats.generated_tokens,
+            seconds + stats.seconds,
+            degenerate + stats.degenerate_rows,
+        )
+
+    def formula_decode_summary(self) -> dict[str, dict[str, float]]:
+        summary: dict[str, dict[str, float]] = {}
+        for mode, (tokens, seconds, degenerate) in self._formula_decode_totals.items():
+            summary[mode] = {
+                "tokens": float(tokens),
+                "seconds": float(seconds),
+                "tokens_per_second": float(tokens / seconds) if seconds > 0 else 0.0,
+                "degenerate_rows": float(degenerate),
+            }
+        return summary
+
+    def formula_result_cache_stats(self) -> FormulaResultCacheStats:
+        return self._formula_result_cache.stats()
+
+    def clear_formula_result_cache(self) -> None:
+        self._formula_result_cache.clear()
+
+    def _formula_model_key(self) -> str:
+        spec = self.model_manifest.models[FORMULA_RECOGNIZER_ID]
+        resolved = self._model_registry.get(FORMULA_RECOGNIZER_ID)
+        files = tuple((Path(path).name, mtime, size) for path, mtime, size in resolved.signature) if resolved else ()
+        return repr((spec.model_id, spec.version, spec.precision, self.formula_decode_mode, files))
+
+    def _recognize_formula_batch(
+        self,
+        images: list,
+        model_dir: Path,
+        provider_info: ProviderInfo,
+        *,
+        max_new_tokens: int,
+        on_results: Callable[[list[int], list[tuple[str, float]]], None] | None = None,
+    ) -> list[tuple[str, float]]:
+        if not images:
+            return []
+        cache = self._formula_result_cache
+        if not cache.enabled:
+            return self._run_formula_batches(
+                images,
+                model_dir,
+                provider_info,
+                max_new_tokens=max_new_tokens,
+                on_batch=on_results,
+            )
+        model_key = self._formula_model_key()
+        keys = [crop_cache_key(image, model_key=model_key, max_new_tokens=max_new_tokens) for image in images]
+        results: list[tuple[str, float] | None] = [cache.get(key) for key in keys]
+        pending: dict[str, list[int]] = {}
+        for index, (key, result) in enumerate(zip(keys, results)):
+            if result is None:
+                pending.setdefault(key, []).append(index)
+        if on_results is not None:
+            hits = [index for index, result in enumerate(results) if result is not None]
+            if hits:
+                on_results(hits, [results[index] for index in hits])
+        if pending:
+            pending_keys = list(pending)
+
+            def _on_pending_batch(batch_indices: list[int], batch_results: list[tuple[str, float]]) -> None:
+                indices = [index for key_index in batch_indices for index in pending[pending_keys[key_index]]]
+                expanded = [
+                    result
+                    for key_index, result in zip(batch_indices, batch_results)
+                    for _index in pending[pending_keys[key_index]]
+                ]
+                on_results(indices, expanded)
+
+            recognized = self._run_formula_batches(
+                [images[pending[key][0]] for key in pending_keys],
+                model_dir,
+                provider_info,
+                max_new_tokens=max_new_tokens,
+                on_batch=_on_pending_batch if on_results is not None else None,
+            )
+            for key, result in zip(pending_keys, recognized):
+                cache.put(key, result)
+                for index in pending[key]:
+                    results[index] = result
+        return [result for result in results if result is not None]
+
+    def _run_formula_batches(
+        self,
+        images: list,
+        model_dir: Path,
+        provider_info: ProviderInfo,
+        *,
+        max_new_tokens: int,
+        on_batch: Callable[[list[int], list[tuple[str, float]]], None] | None = None,
+    ) -> list[tuple[str, float]]:
+        batches = plan_formula_batches(
+            [image_size(image) for image in images],
+            self.formula_batch_policy,
+            max_batch_size=self._rec_batch_num(provider_info),
+        )
+        return run_in_batches(
+            images,
+            batches,
+            lambda batch: recognize_formula_images(
+                batch,
+                model_dir,
+                provider_info,
+                max_new_tokens=max_new_tokens,
+                decode_mode=self.formula_decode_mode,
+                stats_callback=self._record_formula_decode_stats,
+                session_options=self.session_options,
+            ),
+            on_batch,
         )
 
+    def _recognize_formula_single(
+        self,
+        image,
+        model_dir: Path,
+        provider_info: ProviderInfo,
+        *,
+        max_new_tokens: int,
+    ) -> tuple[str, float]:
+        cache = self._formula_result_cache
+        key = ""
+        if cache.enabled:
+            key = crop_cache_key(image, model_key=self._formula_model_key(), max_new_tokens=max_new_tokens)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        result = recognize_formula_image(
+            image,
+            model_dir,
+            provider_info,
+            max_new_tokens=max_new_tokens,
+            decode_mode=self.formula_decode_mode,
+            stats_callback=self._record_formula_decode_stats,
+            session_options=self.session_options,
+        )
+        if key:
+            cache.put(key, result)
+        return result
+
+    def check_models(self, include_optional: bool = True):
+        fingerprint = manifest_roots_fingerprint(self.model_roots, self.model_manifest)
+        with self._runtime_info_lock:
+            states = self._cache_states
+            if states is None or fingerprint != self._cache_states_fingerprint:
+                states = inspect_manifest_roots(self.model_roots, self.model_manifest)
+                self._cache_states = states
+                self._cache_states_fingerprint = fingerprint
+        return {
+            model_id: state
+            for model_id, state in states.items()
+            if include_optional or not self.model_manifest.models[model_id].optional
+        }
+
+    def model_precisions(self) -> dict[str, str]:
+        return {model_id: spec.precision for model_id, spec in self.model_manifest.models.items()}
+
     def _resolve_model_dir(self, model_id: str) -> Path:
+        resolved = self._model_registry.get(model_id)
+        if resolved is not None:
+            return resolved.model_dir
         states = self.check_models()
         return states[model_id].model_dir
 
-    def get_runtime_info(self) -> DoctorReport:
-        return run_doctor(
+    def get_runtime_info(self, *, refresh: bool = False) -> DoctorReport:
+        if refresh:
+            self.refresh_runtime_info()
+        states = self.check_models()
+        report = self._runtime_info
+        if report is not None and report.cache_states == states:
+            return report
+        provider_info = self._provider_info
+        if provider_info is None:
+            provider_info = detect_providers(prefer=self.provider_preference)
+            self._provider_info = provider_info
+        report = run_doctor(
             cache_dir=self.cache_dir,
             bundled_models_dir=self.bundled_models_dir,
-            manifest=self.manifest,
+            manifest=self.model_manifest,
             provider_preference=self.provider_preference,
+            provider_info=provider_info,
+            cache_states=states,
         )
+        self._runtime_info = report
+        write_doctor_snapshot(report)
+        return report
+
+    def refresh_runtime_info(self) -> None:
+        with self._runtime_info_lock:
+            self._provider_info = None
+            self._cache_states = None
+            self._runtime_info = None
 
-    def doctor(self) -> DoctorReport:
-        return self.get_runtime_info()
+    def doctor(self, *, cached: bool = False, refresh: bool = False) -> DoctorReport:
+        if cached and not refresh and self._runtime_info is not None:
+            return self._runtime_info
+        return self.get_runtime_info(refresh=refresh)
 
     def download_models(
         self,
@@ -134,10 +480,10 @@ class MathCraftRuntime:
         source_overrides: dict[str, list[str] | tuple[str, ...]] | None = None,
         timeout: float | None = None,
     ) -> list[Path]:
-        selected = tuple(model_ids) if model_ids else tuple(self.manifest.models.keys())
+        selected = tuple(model_ids) if model_ids else tuple(self.model_manifest.models.keys())
         downloaded: list[Path] = []
         for model_id in selected:
-            spec = self.manifest.models[model_id]
+            spec = self.model_manifest.models[model_id]
             downloaded.append(
                 download_model_archive(
                     spec,
@@ -147,7 +493,7 @@ class MathCraftRuntime:
                     progress_callback=self._record_cache_event,
                 )
             )
-        self.clear_warmup_cache()
+        self._invalidate_models(selected)
         return downloaded
 
     def _ensure_selected_models(
@@ -158,13 +504,21 @@ class MathCraftRuntime:
         broken_or_missing = [
             model_id
             for model_id in model_ids
-            if model_id in self.manifest.models and not states[model_id].complete
+            if model_id in self.model_manifest.models and not states[model_id].complete
+        ]
+        fallbacks = [
+            model_id
+            for model_id in broken_or_missing
+            if self._fall_back_to_default_precision(model_id)
         ]
+        if fallbacks:
+            states = self.check_models()
+            broken_or_missing = [model_id for model_id in broken_or_missing if not states[model_id].complete]
         if not broken_or_missing or not self.auto_download:
             return states
 
         for model_id in broken_or_missing:
-            spec = self.manifest.models[model_id]
+            spec = self.model_manifest.models[model_id]
             state = states[model_id]
             missing_files = ", ".join(state.missing_files) if state.missing_files else "unknown files"
             self._record_cache_event(
@@ -176,14 +530,27 @@ class MathCraftRuntime:
                 timeout=None,
                 progress_callback=self._record_cache_event,
             )
-            self._record_cache_event(f"model {model_id} downloaded to {self.cache_dir / model_id}")
-        self.clear_warmup_cache()
+            self._record_cache_event(f"model {model_id} downloaded to {self.cache_dir / spec.dir_name}")
+        self._invalidate_models(tuple(broken_or_missing))
         return self.check_models()
 
+    def _fall_back_to_default_precision(self, model_id: str) -> bool:
+        spec = self.model_manifest.models[model_id]
+        if spec.precision == DEFAULT_PRECISION:
+            return False
+        if self.auto_download and usable_sources(spec):
+            return False
+        self.model_manifest.models[model_id] = self.manifest.models[model_id]
+        self._cache_states = None
+        self._record_cache_event(
+            f"model {model_id} has no {spec.precision} variant available; using {DEFAULT_PRECISION}"
+        )
+        return True
+
     def _repair_model_cache(self, model_id: str):
         if not self.auto_download:
             return self.check_models()[model_id]
-        spec = self.manifest.models[model_id]
+        spec = self.model_manifest.models[model_id]
         self._record_cache_event(f"model {model_id} failed warmup, redownloading")
         download_model_archive(
             spec,
@@ -191,8 +558,8 @@ class MathCraftRuntime:
             timeout=None,
             progress_callback=self._record_cache_event,
         )
-        self._record_cache_event(f"model {model_id} repaired to {self.cache_dir / model_id}")
-        self.clear_warmup_cache()
+        self._record_cache_event(f"model {model_id} repaired to {self.cache_dir / spec.dir_name}")
+        self._invalidate_models((model_id,))
         return self.check_models()[model_id]
 
     @staticmethod
@@ -213,8 +580,24 @@ class MathCraftRuntime:
 
     def clear_warmup_cache(self) -> None:
         self._warmup_cache.clear()
+        self._cache_states = None
+        self._deep_warmed.clear()
+        self._model_registry.invalidate()
 
-    def warmup(self, profile: str = "formula") -> WarmupPlan:
+    def _invalidate_models(self, model_ids: tuple[str, ...]) -> None:
+        self._warmup_cache.clear()
+        self._cache_states = None
+        self._deep_warmed.difference_update(model_ids)
+        self._model_registry.invalidate(
+            model_ids,
+            model_dirs=tuple(
+                self.cache_dir / self.model_manifest.models[model_id].dir_name
+                for model_id in model_ids
+                if model_id in self.model_manifest.models
+            ),
+        )
+
+    def warmup(self, profile: str = "formula", *, deep: bool | None = None) -> WarmupPlan:
         profile_key = profile.strip().lower()
         if profile_key == "formula":
             model_ids = PROFILE_MODEL_IDS["formula"]
@@ -224,7 +607,90 @@ class MathCraftRuntime:
             model_ids = PROFILE_MODEL_IDS["mixed"]
         else:
             raise ModelCacheError(f"unsupported warmup profile: {profile}")
-        return self._warmup_selected_models(profile_key, model_ids)
+        plan = self._warmup_selected_models(profile_key, model_ids)
+        if plan.ready and (self.deep_warmup if deep is None else deep):
+            plan = self._deep_warmup(plan)
+        return plan
+
+    def prewarm_in_background(self, profile: str = "mixed", *, deep: bool | None = None) -> bool:
+        profile_key = profile.strip().lower()
+        model_ids = PROFILE_MODEL_IDS.get(profile_key)
+        if model_ids is None:
+            raise ModelCacheError(f"unsupported warmup profile: {profile}")
+        if profile_key in self._warmup_cache:
+            return False
+        states = self.check_models()
+        if not all(model_id in states and states[model_id].complete for model_id in model_ids):
+            # Never start a download that nobody asked for.
+            return False
+        thread = self._prewarm_thread
+        if thread is not None and thread.is_alive():
+            return False
+
+        def _prewarm() -> None:
+            try:
+                self.warmup(profile_key, deep=deep)
+            except Exception as exc:
+                self._record_cache_event(f"background warmup of {profile_key} failed: {exc}")
+
+        self._prewarm_thread = threading.Thread(target=_prewarm, name=f"mathcraft-prewarm-{profile_key}", daemon=True)
+        self._prewarm_thread.start()
+        return True
+
+    def _deep_warmup(self, plan: WarmupPlan) -> WarmupPlan:
+        if all(model_id in self._deep_warmed for model_id in plan.required_models):
+            return plan
+        started = time.perf_counter()
+        with self._deep_warmup_lock:
+            for model_id in plan.required_models:
+                if model_id in self._deep_warmed:
+                    continue
+                try:
+                    DEEP_WARMUP_HANDLERS[model_id](self, plan.provider_info)
+                except Exception as exc:
+                    self._record_cache_event(f"deep warmup of {model_id} failed: {exc}")
+                    continue
+                self._deep_warmed.add(model_id)
+        return replace(plan, deep_warmup_seconds=time.perf_counter() - started)
+
+    def _deep_warmup_formula_detector(self, provider_info: ProviderInfo) -> None:
+        detect_formula_boxes(
+            _deep_warmup_page(),
+            self._resolve_model_dir(FORMULA_DETECTOR_ID),
+            provider_info,
+            session_options=self.session_options,
+        )
+
+    def _deep_warmup_formula_recognizer(self, provider_info: ProviderInfo) -> None:
+        # Bypass the result cache and decode stats so warmup leaves no trace in either.
+        model_dir = self._resolve_model_dir(FORMULA_RECOGNIZER_ID)
+        crops = [_deep_warmup_strip(width) for width in DEEP_WARMUP_FORMULA_WIDTHS]
+        for batch in [[crop] for crop in crops] + [crops]:
+            recognize_formula_images(
+                batch,
+                model_dir,
+                provider_info,
+                max_new_tokens=DEEP_WARMUP_MAX_NEW_TOKENS,
+                decode_mode=self.formula_decode_mode,
+                session_options=self.session_options,
+            )
+
+    def _deep_warmup_text_detector(self, provider_info: ProviderInfo) -> None:
+        detect_text_boxes(
+            rgb_to_bgr(_deep_warmup_page()),
+            self._resolve_model_dir(TEXT_DETECTOR_ID),
+            provider_info,
+            session_options=self.session_options,
+        )
+
+    def _deep_warmup_text_recognizer(self, provider_info: ProviderInfo) -> None:
+        recognize_pp_text_lines(
+            [rgb_to_bgr(_deep_warmup_strip(320, height=48))],
+            self._resolve_model_dir(TEXT_RECOGNIZER_ID),
+            provider_info,
+            rec_batch_num=self._rec_batch_num(provider_info),
+            session_options=self.session_options,
+        )
 
     def recognize_formula(
         self,
@@ -238,6 +704,7 @@ class MathCraftRuntime:
                 f"formula runtime is not ready: missing={plan.missing_models}, unsupported={plan.unsupported_models}"
             )
         rgb = load_image_rgb(image)
+        raise_if_cancelled()
         text, score = self._recognize_formula_rgb(
             rgb,
             plan.provider_info,
@@ -266,15 +733,18 @@ class MathCraftRuntime:
             bgr,
             self._resolve_model_dir(TEXT_DETECTOR_ID),
             plan.provider_info,
+            session_options=self.session_options,
         )
         regions: list[OCRRegion] = []
         blocks: list[MathCraftBlock] = []
+        stats = ImageBoxStats(bgr)
         text_candidates = [
             (detected_box, points_to_box(detected_box))
             for detected_box in detected_text_boxes
-            if is_informative_ocr_box(bgr, points_to_box(detected_box))
+            if is_informative_ocr_box(bgr, points_to_box(detected_box), stats=stats)
         ]
         if text_candidates:
+            raise_if_cancelled()
             crops = [
                 get_rotate_crop_image(bgr, box_to_points(box))
                 for _detected_box, box in text_candidates
@@ -284,6 +754,7 @@ class MathCraftRuntime:
                 self._resolve_model_dir(TEXT_RECOGNIZER_ID),
                 plan.provider_info,
                 rec_batch_num=self._rec_batch_num(plan.provider_info),
+                session_options=self.session_options,
             )
             for (_detected_box, box), (text, score) in zip(text_candidates, rec_results):
                 cleaned_text = text.strip()
@@ -314,7 +785,145 @@ class MathCraftRuntime:
         *,
         min_text_score: float = 0.45,
         max_formula_new_tokens: int = FORMULA_MAX_NEW_TOKENS,
+        on_partial: Callable[[MathCraftBlock], None] | None = None,
     ) -> MixedRecognitionResult:
+        plan = self._warmup_mixed()
+        started = time.perf_counter()
+        stage_seconds: dict[str, float] = {}
+        concurrent = self._use_concurrent_mixed_pipeline(plan.provider_info)
+        rgb = load_image_rgb(image)
+        bgr = rgb_to_bgr(rgb)
+        stats = ImageBoxStats(rgb)
+
+        stage_started = time.perf_counter()
+        formula_boxes, detected_text_boxes = self._run_stage_pair(
+            (
+                "formula_detect",
+                lambda: _informative_formula_boxes(
+                    rgb,
+                    detect_formula_boxes(
+                        rgb,
+                        self._resolve_model_dir(FORMULA_DETECTOR_ID),
+                        plan.provider_info,
+                        session_options=self.session_options,
+                    ),
+                    stats,
+                ),
+            ),
+            (
+                "text_detect",
+                lambda: detect_text_boxes(
+                    bgr,
+                    self._resolve_model_dir(TEXT_DETECTOR_ID),
+                    plan.provider_info,
+                    session_options=self.session_options,
+                )[0],
+            ),
+            stage_seconds,
+            concurrent=concurrent,
+        )
+        stage_seconds["detect_wall"] = time.perf_counter() - stage_started
+
+        page = _prepare_mixed_page(rgb, bgr, formula_boxes, detected_text_boxes, stats)
+        # The summed-area tables are page-sized; recognition only needs the prepared page.
+        stats = None
+        [(rec_results, formula_job_results)] = self._recognize_mixed_pages(
+            [page],
+            plan.provider_info,
+            stage_seconds,
+            max_formula_new_tokens=max_formula_new_tokens,
+            concurrent=concurrent,
+            partial=(
+                _PartialBlocks(page, on_partial, min_text_score=min_text_score) if on_partial is not None else None
+            ),
+        )
+        result = self._assemble_mixed_page(
+            page,
+            rec_results,
+            formula_job_results,
+            plan.provider_info,
+            min_text_score=min_text_score,
+        )
+        stage_seconds["total"] = time.perf_counter() - started
+        self._last_mixed_stage_seconds = stage_seconds
+        return result
+
+    def recognize_mixed_batch(
+        self,
+        images,
+        *,
+        min_text_score: float = 0.45,
+        max_formula_new_tokens: int = FORMULA_MAX_NEW_TOKENS,
+    ) -> list[MixedRecognitionResult]:
+        images = list(images)
+        if not images:
+            return []
+        plan = self._warmup_mixed()
+        started = time.perf_counter()
+        stage_seconds: dict[str, float] = {}
+        concurrent = self._use_concurrent_mixed_pipeline(plan.provider_info)
+        rgbs = [load_image_rgb(image) for image in images]
+        bgrs = [rgb_to_bgr(rgb) for rgb in rgbs]
+        page_stats = [ImageBoxStats(rgb) for rgb in rgbs]
+
+        def _detect_formulas():
+            detected = detect_formula_boxes_batch(
+                rgbs,
+                self._resolve_model_dir(FORMULA_DETECTOR_ID),
+                plan.provider_info,
+                batch_size=FORMULA_DETECT_BATCH_SIZE,
+                session_options=self.session_options,
+            )
+            return [
+                _informative_formula_boxes(rgb, boxes, stats)
+                for rgb, boxes, stats in zip(rgbs, detected, page_stats)
+            ]
+
+        def _detect_text():
+            model_dir = self._resolve_model_dir(TEXT_DETECTOR_ID)
+            return [
+                detect_text_boxes(bgr, model_dir, plan.provider_info, session_options=self.session_options)[0]
+                for bgr in bgrs
+            ]
+
+        stage_started = time.perf_counter()
+        page_formula_boxes, page_text_boxes = self._run_stage_pair(
+            ("formula_detect", _detect_formulas),
+            ("text_detect", _detect_text),
+            stage_seconds,
+            concurrent=concurrent,
+        )
+        stage_seconds["detect_wall"] = time.perf_counter() - stage_started
+
+        pages = [
+            _prepare_mixed_page(rgb, bgr, formula_boxes, text_boxes, stats)
+            for rgb, bgr, formula_boxes, text_boxes, stats in zip(
+                rgbs, bgrs, page_formula_boxes, page_text_boxes, page_stats
+            )
+        ]
+        page_stats = None
+        page_results = self._recognize_mixed_pages(
+            pages,
+            plan.provider_info,
+            stage_seconds,
+            max_formula_new_tokens=max_formula_new_tokens,
+            concurrent=concurrent,
+        )
+        results = [
+            self._assemble_mixed_page(
+                page,
+                rec_results,
+                formula_job_results,
+                plan.provider_info,
+                min_text_score=min_text_score,
+            )
+            for page, (rec_results, formula_job_results) in zip(pages, page_results)
+        ]
+        stage_seconds["total"] = time.perf_counter() - started
+        self._last_mixed_stage_seconds = stage_seconds
+        return results
+
+    def _warmup_mixed(self) -> WarmupPlan:
         plan = self._warmup_selected_models(
             "mixed",
             PROFILE_MODEL_IDS["mixed"],
@@ -323,100 +932,118 @@ class MathCraftRuntime:
             raise ModelCacheError(
                 f"mixed runtime is not ready: missing={plan.missing_models}, unsupported={plan.unsupported_models}"
             )
-        rgb = load_image_rgb(image)
-        bgr = rgb_to_bgr(rgb)
-        formula_boxes = detect_formula_boxes(
-            rgb,
-            self._resolve_model_dir(FORMULA_DETECTOR_ID),
-            plan.provider_info,
+        return plan
+
+    def _recognize_mixed_pages(
+        self,
+        pages: list[_MixedPage],
+        provider_info: ProviderInfo,
+        stage_seconds: dict[str, float],
+        *,
+        max_formula_new_tokens: int,
+        concurrent: bool,
+        partial: _PartialBlocks | None = None,
+    ) -> list[tuple[list[tuple[str, float]], list[tuple[str, float]]]]:
+        # ``partial`` streams results of a single page; batches span pages otherwise.
+        text_crops = [crop for page in pages for crop in page.text_crops]
+        formula_images = [image for page in pages for _index, _line_index, image in page.formula_jobs]
+
+        def _recognize_text_crops():
+            if not text_crops:
+                return []
+            model_dir = self._resolve_model_dir(TEXT_RECOGNIZER_ID)
+            rec_batch_num = max(1, self._rec_batch_num(provider_info))
+            if partial is None:
+                return recognize_pp_text_lines(
+                    text_crops,
+                    model_dir,
+                    provider_info,
+                    rec_batch_num=rec_batch_num,
+                    session_options=self.session_options,
+                )
+            results: list[tuple[str, float]] = []
+            for start in range(0, len(text_crops), rec_batch_num):
+                raise_if_cancelled()
+                batch_results = recognize_pp_text_lines(
+                    text_crops[start : start + rec_batch_num],
+                    model_dir,
+                    provider_info,
+                    rec_batch_num=rec_batch_num,
+                    session_options=self.session_options,
+                )
+                partial.text_results(start, batch_results)
+                results.extend(batch_results)
+            return results
+
+        stage_started = time.perf_counter()
+        rec_results, formula_job_results = self._run_stage_pair(
+            ("text_recognize", _recognize_text_crops),
+            (
+                "formula_recognize",
+                lambda: self._recognize_formula_batch(
+                    formula_images,
+                    self._resolve_model_dir(FORMULA_RECOGNIZER_ID),
+                    provider_info,
+                    max_new_tokens=max_formula_new_tokens,
+                    on_results=partial.formula_results if partial is not None else None,
+                ),
+            ),
+            stage_seconds,
+            concurrent=concurrent and bool(text_crops) and bool(formula_images),
         )
-        formula_boxes = tuple(
-            formula_box
-            for formula_box in formula_boxes
-            if is_informative_ocr_box(
-                rgb,
-                formula_box.box,
-                min_width=4.0,
-                min_height=4.0,
-                min_area=24.0,
-                blank_mean_threshold=252.0,
-                blank_std_threshold=3.0,
+        stage_seconds["recognize_wall"] = time.perf_counter() - stage_started
+
+        page_results: list[tuple[list[tuple[str, float]], list[tuple[str, float]]]] = []
+        text_offset = 0
+        formula_offset = 0
+        for page in pages:
+            text_count = len(page.text_crops)
+            formula_count = len(page.formula_jobs)
+            page_results.append(
+                (
+                    list(rec_results[text_offset : text_offset + text_count]),
+                    list(formula_job_results[formula_offset : formula_offset + formula_count]),
+                )
             )
-        )
-        height, width = rgb.shape[:2]
-        formula_block_boxes = tuple(item.box for item in formula_boxes)
-        masked_bgr = rgb_to_bgr(
-            mask_boxes(rgb, formula_block_boxes, margin=_formula_mask_margin(width, height))
-        )
+            text_offset += text_count
+            formula_offset += formula_count
+        return page_results
 
-        detected_text_boxes, _scores = detect_text_boxes(
-            bgr,
-            self._resolve_model_dir(TEXT_DETECTOR_ID),
-            plan.provider_info,
-        )
+    def _assemble_mixed_page(
+        self,
+        page: _MixedPage,
+        rec_results: list[tuple[str, float]],
+        formula_job_results: list[tuple[str, float]],
+        provider_info: ProviderInfo,
+        *,
+        min_text_score: float,
+    ) -> MixedRecognitionResult:
+        rgb = page.rgb
+        height, width = rgb.shape[:2]
         text_regions: list[OCRRegion] = []
         blocks: list[MathCraftBlock] = []
-        text_segments = []
-        for detected_box in detected_text_boxes:
-            text_box = points_to_box(detected_box)
-            if not is_informative_ocr_box(bgr, text_box):
+        for segment, (text, score) in zip(page.text_segments, rec_results):
+            cleaned_text = text.strip()
+            if not cleaned_text or score < min_text_score:
                 continue
-            text_segments.extend(
-                segment
-                for segment in split_text_box_around_formulas(text_box, formula_block_boxes)
-                if is_informative_ocr_box(masked_bgr, segment.box)
-            )
-        if text_segments:
-            crops = [
-                get_rotate_crop_image(masked_bgr, box_to_points(segment.box))
-                for segment in text_segments
-            ]
-            rec_results = recognize_pp_text_lines(
-                crops,
-                self._resolve_model_dir(TEXT_RECOGNIZER_ID),
-                plan.provider_info,
-                rec_batch_num=self._rec_batch_num(plan.provider_info),
-            )
-            for segment, (text, score) in zip(text_segments, rec_results):
-                cleaned_text = text.strip()
-                if not cleaned_text or score < min_text_score:
-                    continue
-                region = OCRRegion(box=segment.box, text=cleaned_text, score=score)
-                text_regions.append(region)
-                blocks.append(
-                    MathCraftBlock(
-                        kind="text",
-                        box=segment.box,
-                        text=cleaned_text,
-                        score=score,
-                        source="text_rec",
-                    )
+            region = OCRRegion(box=segment.box, text=cleaned_text, score=score)
+            text_regions.append(region)
+            blocks.append(
+                MathCraftBlock(
+                    kind="text",
+                    box=segment.box,
+                    text=cleaned_text,
+                    score=score,
+                    source="text_rec",
                 )
-        formula_jobs: list[tuple[int, int, object]] = []
-        grouped_formula_results: list[list[list[tuple[str, float]]]] = []
-        for index, formula_box in enumerate(formula_boxes):
-            crop = get_rotate_crop_image(rgb, box_to_points(formula_box.box))
-            line_groups = split_formula_line_groups(crop)
-            if line_groups:
-                grouped_formula_results.append([[] for _line_group in line_groups])
-                for line_index, line_group in enumerate(line_groups):
-                    formula_jobs.extend(
-                        (index, line_index, segment.image) for segment in line_group.crops
-                    )
-            else:
-                grouped_formula_results.append([[]])
-                formula_jobs.append((index, 0, crop))
-
-        formula_job_results = recognize_formula_images(
-            [image for _index, _line_index, image in formula_jobs],
-            self._resolve_model_dir(FORMULA_RECOGNIZER_ID),
-            plan.provider_info,
-            max_new_tokens=max_formula_new_tokens,
-        )
-        for (index, line_index, _image), result in zip(formula_jobs, formula_job_results):
+            )
+        grouped_formula_results: list[list[list[tuple[str, float]]]] = [
+            [[] for _line in range(line_count)] for line_count in page.formula_line_counts
+        ]
+        for (index, line_index, _image), result in zip(page.formula_jobs, formula_job_results):
             grouped_formula_results[index][line_index].append(result)
 
-        for formula_box, formula_results in zip(formula_boxes, grouped_formula_results):
+        for formula_box, formula_results in zip(page.formula_boxes, grouped_formula_results):
             if not formula_results:
                 continue
             formula_text, formula_score = _merge_formula_group_results(formula_results)
@@ -444,15 +1071,53 @@ class MathCraftRuntime:
             )
         blocks = list(resolve_formula_text_conflicts(blocks, image_size=(int(width), int(height))))
         ordered_blocks = annotate_blocks(blocks, image_size=(int(width), int(height)))
-        regions = tuple(text_regions)
-        merged = merge_blocks_text(ordered_blocks)
         return MixedRecognitionResult(
-            text=merged,
-            regions=regions,
+            text=merge_blocks_text(ordered_blocks),
+            regions=tuple(text_regions),
             blocks=ordered_blocks,
-            provider=plan.provider_info.active_provider,
+            provider=provider_info.active_provider,
         )
 
+    def mixed_stage_timings(self) -> dict[str, float]:
+        return dict(self._last_mixed_stage_seconds)
+
+    def _use_concurrent_mixed_pipeline(self, provider_info: ProviderInfo) -> bool:
+        if self.mixed_pipeline_mode != "auto":
+            return self.mixed_pipeline_mode == "concurrent"
+        if provider_info.device == "gpu":
+            return True
+        intra = self.session_options.intra_op_threads
+        return intra > 0 and 2 * intra <= (os.cpu_count() or 1)
+
+    def _run_stage_pair(
+        self,
+        first: tuple[str, Callable[[], object]],
+        second: tuple[str, Callable[[], object]],
+        stage_seconds: dict[str, float],
+        *,
+        concurrent: bool,
+    ) -> tuple:
+        def _timed(stage: tuple[str, Callable[[], object]]):
+            name, fn = stage
+            raise_if_cancelled()
+            stage_started = time.perf_counter()
+            try:
+                return fn()
+            finally:
+                stage_seconds[name] = time.perf_counter() - stage_started
+
+        if not concurrent:
+            return _timed(first), _timed(second)
+        if self._mixed_executor is None:
+            self._mixed_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mathcraft-mixed")
+        future = self._mixed_executor.submit(contextvars.copy_context().run, _timed, second)
+        try:
+            first_result = _timed(first)
+        except BaseException:
+            wait((future,))
+            raise
+        return first_result, future.result()
+
     def _recognize_formula_rgb(
         self,
         rgb,
@@ -468,13 +1133,11 @@ class MathCraftRuntime:
                 for line_group in line_groups
                 for segment in line_group.crops
             ]
-            flat_results = (
-                recognize_formula_images(
-                    flat_crops,
-                    model_dir,
-                    provider_info,
-                    max_new_tokens=max_new_tokens,
-                )
+            flat_results = self._recognize_formula_batch(
+                flat_crops,
+                model_dir,
+                provider_info,
+                max_new_tokens=max_new_tokens,
             )
             grouped_results: list[list[tuple[str, float]]] = []
             offset = 0
@@ -486,13 +1149,16 @@ class MathCraftRuntime:
                 rgb,
                 line_groups,
                 grouped_results,
-                model_dir,
-                provider_info,
-                max_new_tokens=max_new_tokens,
+                lambda image: self._recognize_formula_single(
+                    image,
+                    model_dir,
+                    provider_info,
+                    max_new_tokens=max_new_tokens,
+                ),
             )
             merged_text, merged_score = _merge_formula_group_results(grouped_results)
             if has_severe_latex_quality_issue(merged_text):
-                fallback_text, fallback_score = recognize_formula_image(
+                fallback_text, fallback_score = self._recognize_formula_single(
                     rgb,
                     model_dir,
                     provider_info,
@@ -506,7 +1172,7 @@ class MathCraftRuntime:
                 ):
                     return fallback_text, fallback_score
             return merged_text, merged_score
-        return recognize_formula_image(
+        return self._recognize_formula_single(
             rgb,
             model_dir,
             provider_info,
@@ -519,18 +1185,38 @@ class MathCraftRuntime:
         model_ids: tuple[str, ...],
     ) -> WarmupPlan:
         cached = self._warmup_cache.get(profile)
-        if cached and cached.ready and cached.required_models == model_ids:
+        if cached and cached.required_models == model_ids and not self._model_registry.stale_models(model_ids):
             return cached
+        # Serialize cold warmups so a background prewarm and a request never build the same sessions twice.
+        with self._warmup_lock:
+            return self._warmup_selected_models_locked(profile, model_ids)
+
+    def _warmup_selected_models_locked(
+        self,
+        profile: str,
+        model_ids: tuple[str, ...],
+    ) -> WarmupPlan:
+        cached = self._warmup_cache.get(profile)
+        stale: tuple[str, ...] = ()
+        if cached and cached.ready and cached.required_models == model_ids:
+            stale = self._model_registry.stale_models(model_ids)
+            if not stale:
+                return cached
+            self._warmup_cache.pop(profile, None)
+            self._model_registry.invalidate(stale)
 
         self._cache_events = []
+        if stale:
+            self._record_cache_event(f"model files changed for {', '.join(stale)}; re-resolving")
         states = self._ensure_selected_models(model_ids)
         report = self.get_runtime_info()
         missing: list[str] = []
         unsupported: list[str] = []
         component_statuses: list[WarmupComponentStatus] = []
+        drain_session_build_stats()
         for model_id in model_ids:
             state = states[model_id]
-            spec = self.manifest.models[model_id]
+            spec = self.model_manifest.models[model_id]
             if not state.complete:
                 missing.append(model_id)
                 continue
@@ -556,7 +1242,8 @@ class MathCraftRuntime:
                 )
                 continue
             try:
-                handler(state.model_dir, report.provider_info)
+                handler(state.model_dir, report.provider_info, session_options=self.session_options)
+                self._model_registry.register(spec, state.model_dir)
                 component_statuses.append(
                     WarmupComponentStatus(model_id=model_id, ready=True, detail="ok")
                 )
@@ -564,7 +1251,12 @@ class MathCraftRuntime:
                 if self._looks_like_broken_model_error(exc):
                     try:
                         repaired_state = self._repair_model_cache(model_id)
-                        handler(repaired_state.model_dir, report.provider_info)
+                        handler(
+                            repaired_state.model_dir,
+                            report.provider_info,
+                            session_options=self.session_options,
+                        )
+                        self._model_registry.register(spec, repaired_state.model_dir)
                         component_statuses.append(
                             WarmupComponentStatus(
                                 model_id=model_id,
@@ -576,6 +1268,7 @@ class MathCraftRuntime:
                     except Exception as repair_exc:
                         exc = repair_exc
                 component_statuses.append(WarmupComponentStatus(model_id=model_id, ready=False, detail=str(exc)))
+        build_stats = drain_session_build_stats()
         plan = WarmupPlan(
             profile=profile,
             required_models=model_ids,
@@ -587,6 +1280,9 @@ class MathCraftRuntime:
             and not unsupported
             and all(item.ready for item in component_statuses),
             cache_events=tuple(self._cache_events),
+            session_build_seconds=sum(item.seconds for item in build_stats),
+            optimized_cache_hits=sum(1 for item in build_stats if item.cache_hit),
+            optimized_cache_saved_seconds=sum(item.saved_seconds for item in build_stats),
         )
         if plan.ready:
             self._warmup_cache[profile] = plan
@@ -608,6 +1304,75 @@ class MathCraftRuntime:
         return batch
 
 
+def _informative_formula_boxes(rgb, formula_boxes, stats: ImageBoxStats | None = None) -> tuple[FormulaBox, ...]:
+    return tuple(
+        formula_box
+        for formula_box in formula_boxes
+        if is_informative_ocr_box(
+            rgb,
+            formula_box.box,
+            min_width=4.0,
+            min_height=4.0,
+            min_area=24.0,
+            blank_mean_threshold=252.0,
+            blank_std_threshold=3.0,
+            stats=stats,
+        )
+    )
+
+
+def _prepare_mixed_page(
+    rgb,
+    bgr,
+    formula_boxes: tuple[FormulaBox, ...],
+    detected_text_boxes,
+    stats: ImageBoxStats | None = None,
+) -> _MixedPage:
+    # ``stats`` may describe ``rgb`` or ``bgr``; box statistics ignore channel order.
+    height, width = rgb.shape[:2]
+    formula_block_boxes = tuple(item.box for item in formula_boxes)
+    # Masking the BGR view copies the page once, straight into a contiguous BGR buffer.
+    masked_bgr = mask_boxes(bgr, formula_block_boxes, margin=_formula_mask_margin(width, height))
+    formula_grid = BoxGrid(formula_block_boxes)
+    masked_stats = ImageBoxStats(masked_bgr)
+    text_segments = []
+    for detected_box in detected_text_boxes:
+        text_box = points_to_box(detected_box)
+        if not is_informative_ocr_box(bgr, text_box, stats=stats):
+            continue
+        text_segments.extend(
+            segment
+            for segment in split_text_box_around_formulas(text_box, formula_block_boxes, formula_grid=formula_grid)
+            if is_informative_ocr_box(masked_bgr, segment.box, stats=masked_stats)
+        )
+    text_crops = tuple(
+        get_rotate_crop_image(masked_bgr, box_to_points(segment.box))
+        for segment in text_segments
+    )
+    formula_jobs: list[tuple[int, int, object]] = []
+    formula_line_counts: list[int] = []
+    for index, formula_box in enumerate(formula_boxes):
+        crop = get_rotate_crop_image(rgb, box_to_points(formula_box.box))
+        line_groups = split_formula_line_groups(crop)
+        if line_groups:
+            formula_line_counts.append(len(line_groups))
+            for line_index, line_group in enumerate(line_groups):
+                formula_jobs.extend(
+                    (index, line_index, segment.image) for segment in line_group.crops
+                )
+        else:
+            formula_line_counts.append(1)
+            formula_jobs.append((index, 0, crop))
+    return _MixedPage(
+        rgb=rgb,
+        formula_boxes=tuple(formula_boxes),
+        text_segments=tuple(text_segments),
+        text_crops=text_crops,
+        formula_jobs=tuple(formula_jobs),
+        formula_line_counts=tuple(formula_line_counts),
+    )
+
+
 def _full_image_box(image) -> Box4P:
     height, width = image.shape[:2]
     return ((0.0, 0.0), (float(width), 0.0), (float(width), float(height)), (0.0, float(height)))
@@ -625,10 +1390,7 @@ def _repair_severe_segmented_lines(
     rgb,
     line_groups,
     grouped_results: list[list[tuple[str, float]]],
-    model_dir: Path,
-    provider_info: ProviderInfo,
-    *,
-    max_new_tokens: int,
+    recognize_single: Callable[[object], tuple[str, float]],
 ) -> list[list[tuple[str, float]]]:
     repaired = [list(line_results) for line_results in grouped_results]
     for index, (line_group, line_results) in enumerate(zip(line_groups, grouped_results)):
@@ -637,24 +1399,49 @@ def _repair_severe_segmented_lines(
         line_text = compose_formula_line([text for text, _score in line_results])
         if not has_severe_latex_quality_issue(line_text):
             continue
-        fallback_text, fallback_score = recognize_formula_image(
-            _crop_formula_line_group(rgb, line_group),
-            model_dir,
-            provider_info,
-            max_new_tokens=max_new_tokens,
-        )
+        fallback_text, fallback_score = recognize_single(_crop_formula_line_group(rgb, line_group))
         line_score = _mean_score(line_results)
         if _prefer_formula_fallback(line_text, line_score, fallback_text, fallback_score):
             repaired[index] = [(fallback_text, fallback_score)]
     return repaired
 
 
+def _deep_warmup_page():
+    width, height = DEEP_WARMUP_PAGE_SIZE
+    page = np.full((height, width, 3), 255, dtype=np.uint8)
+    for top in range(height // 10, height - height // 10, 64):
+        page[top : top + 18, width // 10 : width - width // 10 : 3] = 32
+    return page
+
+
+def _deep_warmup_strip(width: int, height: int = 64):
+    crop = np.full((height, width, 3), 255, dtype=np.uint8)
+    crop[height // 2 - 2 : height // 2 + 2, width // 8 : width - width // 8] = 0
+    crop[height // 4 : height - height // 4, width // 8 : width // 8 + 3] = 0
+    return crop
+
+
+DEEP_WARMUP_HANDLERS = {
+    FORMULA_DETECTOR_ID: MathCraftRuntime._deep_warmup_formula_detector,
+    FORMULA_RECOGNIZER_ID: MathCraftRuntime._deep_warmup_formula_recognizer,
+    TEXT_DETECTOR_ID: MathCraftRuntime._deep_warmup_text_detector,
+    TEXT_RECOGNIZER_ID: MathCraftRuntime._deep_warmup_text_recognizer,
+}
+
+
+def get_rotate_crop_image(image, points):
+    # rapidocr is only needed once a text or mixed page is cropped; formula-only workers never load it.
+    from rapidocr.utils.process_img import get_rotate_crop_image as rotate_crop
+
+    return rotate_crop(image, points)
+
+
 def _crop_formula_line_group(rgb, line_group) -> object:
     left = min(crop.box[0] for crop in line_group.crops)
     top = min(crop.box[1] for crop in line_group.crops)
     right = max(crop.box[2] for crop in line_group.crops)
     bottom = max(crop.box[3] for crop in line_group.crops)
-    return rgb[top:bottom, left:right].copy()
+    return rgb[top:bottom, left:right]
 
 
 def _mean_score(results: list[tuple[str, float]]) -> float:
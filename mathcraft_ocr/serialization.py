@@ -102,11 +102,27 @@ def warmup_plan_to_json(plan) -> dict:
             for item in plan.component_statuses
         ],
         "cache_events": list(getattr(plan, "cache_events", ())),
+        "session_build_seconds": float(getattr(plan, "session_build_seconds", 0.0)),
+        "optimized_cache_hits": int(getattr(plan, "optimized_cache_hits", 0)),
+        "optimized_cache_saved_seconds": float(getattr(plan, "optimized_cache_saved_seconds", 0.0)),
+        "deep_warmup_seconds": float(getattr(plan, "deep_warmup_seconds", 0.0)),
         "ready": plan.ready,
         "provider_info": provider_info_to_json(plan.provider_info),
     }
 
 
+def formula_result_cache_stats_to_json(stats) -> dict:
+    lookups = stats.hits + stats.misses
+    return {
+        "hits": stats.hits,
+        "misses": stats.misses,
+        "hit_rate": float(stats.hits / lookups) if lookups else 0.0,
+        "entries": stats.entries,
+        "max_entries": stats.max_entries,
+        "persist_path": stats.persist_path,
+    }
+
+
 def doctor_report_to_json(report) -> dict:
     return {
         "python_executable": report.python_executable,
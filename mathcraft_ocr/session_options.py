@@ -0,0 +1,76 @@
+# coding: utf-8
+
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+import os
+
+from .errors import MathCraftError
+
+
+GRAPH_OPTIMIZATION_LEVELS = ("disable", "basic", "extended", "all")
+EXECUTION_MODES = ("sequential", "parallel")
+SESSION_OPTIONS_ENV = "MATHCRAFT_ORT_OPTIONS"
+OPTIMIZED_CACHE_DIRNAME = ".ort-optimized"
+
+
+@dataclass(frozen=True)
+class SessionOptionsProfile:
+    intra_op_threads: int = 0
+    inter_op_threads: int = 0
+    graph_optimization: str = "all"
+    execution_mode: str = "sequential"
+    optimized_cache: bool = True
+    optimized_cache_dir: str = ""
+
+
+DEFAULT_SESSION_OPTIONS = SessionOptionsProfile()
+
+
+def parse_session_options(
+    spec: str,
+    base: SessionOptionsProfile = DEFAULT_SESSION_OPTIONS,
+) -> SessionOptionsProfile:
+    profile = base
+    for item in str(spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        key, sep, value = item.partition("=")
+        key = key.strip().lower()
+        value = value.strip().lower()
+        if not sep or not value:
+            raise MathCraftError(f"invalid ONNX Runtime option: {item!r} (expected key=value)")
+        if key in {"intra", "intra_op_threads"}:
+            profile = replace(profile, intra_op_threads=_parse_threads(key, value))
+        elif key in {"inter", "inter_op_threads"}:
+            profile = replace(profile, inter_op_threads=_parse_threads(key, value))
+        elif key in {"opt", "graph_optimization"}:
+            if value not in GRAPH_OPTIMIZATION_LEVELS:
+                raise MathCraftError(f"unsupported graph optimization level: {value}")
+            profile = replace(profile, graph_optimization=value)
+        elif key in {"mode", "execution_mode"}:
+            if value not in EXECUTION_MODES:
+                raise MathCraftError(f"unsupported execution mode: {value}")
+            profile = replace(profile, execution_mode=value)
+        elif key in {"cache", "optimized_cache"}:
+            if value not in {"1", "0", "on", "off", "true", "false"}:
+                raise MathCraftError(f"invalid optimized cache switch: {value}")
+            profile = replace(profile, optimized_cache=value in {"1", "on", "true"})
+        else:
+            raise MathCraftError(f"unsupported ONNX Runtime option: {key}")
+    return profile
+
+
+def session_options_from_env() -> SessionOptionsProfile:
+    return parse_session_options(os.environ.get(SESSION_OPTIONS_ENV, ""))
+
+
+def _parse_threads(key: str, value: str) -> int:
+    try:
+        threads = int(value)
+    except ValueError as exc:
+        raise MathCraftError(f"invalid thread count for {key}: {value}") from exc
+    if threads < 0:
+        raise MathCraftError(f"thread count for {key} must be non-negative")
+    return threads
@@ -0,0 +1,71 @@
+# coding: utf-8
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+import math
+
+import numpy as np
+
+from .results import Box4P
+
+
+MAX_CELLS_PER_BOX = 4096
+
+
+class BoxGrid:
+    """Uniform grid over page boxes; queries return box indices in insertion order."""
+
+    def __init__(self, boxes: Sequence[Box4P], *, cell_size: float | None = None) -> None:
+        self.rects = [_box_rect(box) for box in boxes]
+        if cell_size is None:
+            sides = [max(x2 - x1, y2 - y1) for x1, y1, x2, y2 in self.rects]
+            cell_size = float(np.median(sides)) if sides else 1.0
+        self.cell_size = max(1.0, float(cell_size))
+        self._cells: dict[tuple[int, int], list[int]] = {}
+        self._oversized: list[int] = []
+        for index, rect in enumerate(self.rects):
+            cols, rows = self._cell_span(*rect)
+            if len(cols) * len(rows) > MAX_CELLS_PER_BOX:
+                self._oversized.append(index)
+                continue
+            for col in cols:
+                for row in rows:
+                    self._cells.setdefault((col, row), []).append(index)
+
+    def __len__(self) -> int:
+        return len(self.rects)
+
+    def query(self, x1: float, y1: float, x2: float, y2: float) -> list[int]:
+        found: set[int] = set(self._oversized)
+        cols, rows = self._cell_span(x1, y1, x2, y2)
+        if len(cols) * len(rows) > len(self._cells):
+            cells = (indices for (col, row), indices in self._cells.items() if col in cols and row in rows)
+        else:
+            cells = (self._cells.get((col, row), ()) for col in cols for row in rows)
+        for indices in cells:
+            found.update(indices)
+        return [
+            index
+            for index in sorted(found)
+            if self.rects[index][0] <= x2
+            and self.rects[index][2] >= x1
+            and self.rects[index][1] <= y2
+            and self.rects[index][3] >= y1
+        ]
+
+    def query_box(self, box: Box4P) -> list[int]:
+        return self.query(*_box_rect(box))
+
+    def _cell_span(self, x1: float, y1: float, x2: float, y2: float) -> tuple[range, range]:
+        size = self.cell_size
+        return (
+            range(math.floor(x1 / size), math.floor(x2 / size) + 1),
+            range(math.floor(y1 / size), math.floor(y2 / size) + 1),
+        )
+
+
+def _box_rect(box: Box4P) -> tuple[float, float, float, float]:
+    xs = [float(point[0]) for point in box]
+    ys = [float(point[1]) for point in box]
+    return min(xs), min(ys), max(xs), max(ys)
@@ -0,0 +1,121 @@
+# coding: utf-8
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+import os
+import secrets
+
+import numpy as np
+from PIL import Image
+
+
+SHARED_IMAGE_TRANSPORT = "shm"
+_NAME_PREFIX = "mathcraft"
+
+
+def is_shared_image(value) -> bool:
+    return isinstance(value, dict) and value.get("transport") == SHARED_IMAGE_TRANSPORT
+
+
+class SharedImageWriter:
+    def __init__(self, image) -> None:
+        from multiprocessing import shared_memory
+
+        if isinstance(image, Image.Image):
+            if image.mode not in {"RGB", "L"}:
+                image = image.convert("RGB")
+            shape = (image.height, image.width, 3) if image.mode == "RGB" else (image.height, image.width)
+            pixels = None
+        else:
+            pixels = np.asarray(image)
+            if pixels.dtype != np.uint8 or pixels.ndim not in (2, 3):
+                raise ValueError(f"shared image must be a 2D or 3D uint8 array, got {pixels.dtype} {pixels.shape}")
+            shape = pixels.shape
+        nbytes = int(np.prod(shape))
+        self._shm = shared_memory.SharedMemory(
+            name=f"{_NAME_PREFIX}-{os.getpid()}-{secrets.token_hex(4)}",
+            create=True,
+            size=max(1, nbytes),
+        )
+        if pixels is None:
+            self._shm.buf[:nbytes] = image.tobytes()
+        else:
+            target = np.ndarray(shape, dtype=np.uint8, buffer=self._shm.buf)
+            target[...] = pixels
+            del target
+        self.descriptor = {
+            "transport": SHARED_IMAGE_TRANSPORT,
+            "name": self._shm.name,
+            "shape": [int(dim) for dim in shape],
+            "dtype": "uint8",
+            "strides": _contiguous_strides(shape),
+        }
+
+    def close(self) -> None:
+        shm, self._shm = self._shm, None
+        if shm is None:
+            return
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> SharedImageWriter:
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self.close()
+
+
+@contextmanager
+def attach_shared_image(descriptor: dict) -> Iterator[np.ndarray]:
+    shape = tuple(int(dim) for dim in descriptor.get("shape", ()))
+    strides = tuple(int(step) for step in descriptor.get("strides", ()) or _contiguous_strides(shape))
+    if str(descriptor.get("dtype", "uint8")) != "uint8":
+        raise ValueError(f"unsupported shared image dtype: {descriptor.get('dtype')!r}")
+    if len(shape) not in (2, 3) or len(strides) != len(shape) or any(dim <= 0 for dim in shape):
+        raise ValueError(f"invalid shared image shape: {shape!r}")
+    shm = _attach_shared_memory(str(descriptor.get("name", "")))
+    view = None
+    try:
+        required = 1 + sum((dim - 1) * step for dim, step in zip(shape, strides))
+        if any(step < 0 for step in strides) or required > shm.size:
+            raise ValueError(f"shared image descriptor exceeds buffer: shape={shape!r}, strides={strides!r}")
+        view = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, strides=strides)
+        view.flags.writeable = False
+        yield view
+    finally:
+        view = None
+        try:
+            shm.close()
+        except BufferError:
+            pass
+
+
+def _attach_shared_memory(name: str):
+    from multiprocessing import shared_memory
+
+    if not name:
+        raise ValueError("shared image descriptor has no name")
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == "posix" and not name.startswith(f"{_NAME_PREFIX}-{os.getpid()}-"):
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _contiguous_strides(shape) -> list[int]:
+    strides: list[int] = []
+    step = 1
+    for dim in reversed(tuple(shape)):
+        strides.append(step)
+        step *= int(dim)
+    return list(reversed(strides))
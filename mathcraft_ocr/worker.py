@@ -4,12 +4,43 @@ from __future__ import annotations
 
 import argparse
 import contextlib
+import itertools
 import json
+import os
+import queue
 import sys
-from typing import TextIO
+import threading
+import time
+from typing import Callable, TextIO
 
+from .cancellation import CancelToken, cancellation_scope
+from .errors import MathCraftError
+from .manifest import MODEL_PRECISIONS
 from .runtime import FORMULA_MAX_NEW_TOKENS, MathCraftRuntime
-from .serialization import doctor_report_to_json, formula_result_to_json, mixed_result_to_json, warmup_plan_to_json
+from .serialization import (
+    block_to_json,
+    doctor_report_to_json,
+    formula_result_cache_stats_to_json,
+    formula_result_to_json,
+    mixed_result_to_json,
+    warmup_plan_to_json,
+)
+from .session_options import SessionOptionsProfile, parse_session_options, session_options_from_env
+from .transport import attach_shared_image, is_shared_image
+
+
+WORKER_CONCURRENCY_ENV = "MATHCRAFT_WORKER_CONCURRENCY"
+RESULT_EVENT = "result"
+
+
+def worker_concurrency_from_env() -> int:
+    raw = os.environ.get(WORKER_CONCURRENCY_ENV, "").strip()
+    if not raw:
+        return 1
+    try:
+        return max(1, int(raw))
+    except ValueError as exc:
+        raise MathCraftError(f"invalid {WORKER_CONCURRENCY_ENV}: {raw!r}") from exc
 
 
 class MathCraftWorker:
@@ -18,39 +49,86 @@ class MathCraftWorker:
         *,
         provider_preference: str = "auto",
         runtime: MathCraftRuntime | None = None,
+        session_options: SessionOptionsProfile | None = None,
+        precision: str | None = None,
     ) -> None:
-        self.runtime = runtime or MathCraftRuntime(provider_preference=provider_preference)
+        self.runtime = runtime or MathCraftRuntime(
+            provider_preference=provider_preference,
+            session_options=session_options,
+            precision=precision,
+        )
+        self._active: dict[str, CancelToken] = {}
+        self._active_lock = threading.Lock()
+
+    def track(self, request_id) -> CancelToken:
+        with self._active_lock:
+            return self._active.setdefault(str(request_id), CancelToken())
 
-    def handle(self, request: dict) -> dict:
+    def cancel(self, request_id) -> bool:
+        with self._active_lock:
+            token = self._active.get(str(request_id))
+        if token is None:
+            return False
+        token.cancel()
+        return True
+
+    def handle(self, request: dict, emit: Callable[[dict], None] | None = None) -> dict:
         request_id = request.get("id")
+        token = self.track(request_id) if request_id is not None else CancelToken()
+        stream = bool(request.get("stream")) and emit is not None
         try:
-            result = self._handle_result(request)
-            return {"id": request_id, "ok": True, "result": result}
+            with contextlib.ExitStack() as resources:
+                resources.enter_context(cancellation_scope(token))
+                result = self._handle_result(request, resources, emit if stream else None)
+            response = {"id": request_id, "ok": True, "result": result}
         except Exception as exc:
-            return {
-                "id": request_id,
-                "ok": False,
-                "error": {
-                    "type": type(exc).__name__,
-                    "message": str(exc),
-                },
-            }
+            response = _error_response(request_id, type(exc).__name__, str(exc))
+        finally:
+            if request_id is not None:
+                with self._active_lock:
+                    if self._active.get(str(request_id)) is token:
+                        del self._active[str(request_id)]
+        if stream:
+            response["event"] = RESULT_EVENT
+        return response
 
-    def _handle_result(self, request: dict) -> dict:
+    def _handle_result(
+        self,
+        request: dict,
+        resources: contextlib.ExitStack,
+        emit: Callable[[dict], None] | None = None,
+    ) -> dict:
         action = str(request.get("action", "")).strip()
         if action == "doctor":
-            return doctor_report_to_json(self.runtime.doctor())
+            cached = bool(request.get("cached"))
+            refresh = bool(request.get("refresh"))
+            if cached or refresh:
+                report = self.runtime.doctor(cached=cached, refresh=refresh)
+            else:
+                report = self.runtime.doctor()
+            data = doctor_report_to_json(report)
+            data["formula_result_cache"] = formula_result_cache_stats_to_json(
+                self.runtime.formula_result_cache_stats()
+            )
+            return data
         if action == "warmup":
             profile = str(request.get("profile", "formula"))
-            return warmup_plan_to_json(self.runtime.warmup(profile))
+            deep = request.get("deep")
+            deep = None if deep is None else bool(deep)
+            plan = self.runtime.warmup(profile, deep=deep)
+            data = warmup_plan_to_json(plan)
+            prewarm = str(request.get("prewarm") or "").strip()
+            if prewarm and plan.ready:
+                data["prewarm_started"] = self.runtime.prewarm_in_background(prewarm, deep=deep)
+            return data
         if action == "recognize_formula":
-            image = _require_image(request)
+            image = _require_image(request, resources)
             max_new_tokens = int(request.get("max_new_tokens", FORMULA_MAX_NEW_TOKENS))
             return formula_result_to_json(
                 self.runtime.recognize_formula(image, max_new_tokens=max_new_tokens)
             )
         if action == "recognize_text":
-            image = _require_image(request)
+            image = _require_image(request, resources)
             min_text_score = float(request.get("min_text_score", 0.45))
             return mixed_result_to_json(
                 self.runtime.recognize_text(
@@ -59,24 +137,132 @@ class MathCraftWorker:
                 )
             )
         if action == "recognize_mixed":
-            image = _require_image(request)
+            image = _require_image(request, resources)
             min_text_score = float(request.get("min_text_score", 0.45))
             max_formula_new_tokens = int(request.get("max_formula_new_tokens", FORMULA_MAX_NEW_TOKENS))
+            on_partial = None
+            if emit is not None:
+                request_id = request.get("id")
+
+                def on_partial(block) -> None:
+                    emit(
+                        {
+                            "id": request_id,
+                            "ok": True,
+                            "event": "text_line" if block.kind == "text" else "formula",
+                            "result": block_to_json(block),
+                        }
+                    )
+
             return mixed_result_to_json(
                 self.runtime.recognize_mixed(
                     image,
                     min_text_score=min_text_score,
                     max_formula_new_tokens=max_formula_new_tokens,
+                    on_partial=on_partial,
                 )
             )
+        if action == "recognize_mixed_batch":
+            images = request.get("images")
+            if not isinstance(images, list) or not images:
+                raise ValueError("request field 'images' must be a non-empty list")
+            images = [_resolve_image(image, resources) for image in images]
+            min_text_score = float(request.get("min_text_score", 0.45))
+            max_formula_new_tokens = int(request.get("max_formula_new_tokens", FORMULA_MAX_NEW_TOKENS))
+            return {
+                "results": [
+                    mixed_result_to_json(result)
+                    for result in self.runtime.recognize_mixed_batch(
+                        images,
+                        min_text_score=min_text_score,
+                        max_formula_new_tokens=max_formula_new_tokens,
+                    )
+                ]
+            }
+        if action == "cancel":
+            return {"cancelled": self.cancel(request.get("target"))}
         if action == "shutdown":
             return {"shutdown": True}
         raise ValueError(f"unsupported worker action: {action}")
 
 
+class RequestDispatcher:
+    def __init__(
+        self,
+        worker: MathCraftWorker,
+        respond: Callable[[dict], None],
+        *,
+        concurrency: int = 1,
+    ) -> None:
+        self._worker = worker
+        self._respond = respond
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._queued: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._run, name=f"mathcraft-dispatch-{index}", daemon=True)
+            for index in range(max(1, int(concurrency)))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, request: dict) -> None:
+        seq = next(self._seq)
+        timeout_sec = request.get("timeout_sec")
+        deadline = time.monotonic() + float(timeout_sec) if timeout_sec is not None else None
+        request_id = request.get("id")
+        if request_id is not None:
+            with self._lock:
+                self._queued[str(request_id)] = seq
+        self._queue.put((-_request_priority(request), seq, deadline, request))
+
+    def cancel(self, request_id) -> bool:
+        with self._lock:
+            if self._queued.pop(str(request_id), None) is None:
+                return self._worker.cancel(request_id)
+        self._respond(_error_response(request_id, "RecognitionCancelled", f"request {request_id} was cancelled"))
+        return True
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for _thread in self._threads:
+            self._queue.put((float("inf"), next(self._seq), None, None))
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self) -> None:
+        while True:
+            _priority, seq, deadline, request = self._queue.get()
+            if request is None:
+                return
+            request_id = request.get("id")
+            expired = deadline is not None and time.monotonic() > deadline
+            if request_id is not None:
+                with self._lock:
+                    if self._queued.get(str(request_id)) != seq:
+                        continue
+                    del self._queued[str(request_id)]
+                    if not expired:
+                        # Register before releasing the lock so a cancel never falls between queue and run.
+                        self._worker.track(request_id)
+            if expired:
+                self._respond(
+                    _error_response(request_id, "TimeoutError", f"request {request_id} timed out before it started")
+                )
+                continue
+            self._respond(self._worker.handle(request, self._respond))
+
+
 def serve_jsonl(
     *,
     provider_preference: str = "auto",
+    session_options: SessionOptionsProfile | None = None,
+    precision: str | None = None,
+    concurrency: int | None = None,
     input_stream: TextIO | None = None,
     output_stream: TextIO | None = None,
     log_stream: TextIO | None = None,
@@ -84,48 +270,98 @@ def serve_jsonl(
     input_stream = input_stream or sys.stdin
     output_stream = output_stream or sys.stdout
     log_stream = log_stream or sys.stderr
-    worker = MathCraftWorker(provider_preference=provider_preference)
+    worker = MathCraftWorker(
+        provider_preference=provider_preference,
+        session_options=session_options,
+        precision=precision,
+    )
+    write_lock = threading.Lock()
 
-    for line in input_stream:
-        line = line.strip()
-        if not line:
-            continue
+    def respond(response: dict) -> None:
+        with write_lock:
+            output_stream.write(json.dumps(response, ensure_ascii=False) + "\n")
+            output_stream.flush()
+
+    with contextlib.redirect_stdout(log_stream):
+        dispatcher = RequestDispatcher(
+            worker,
+            respond,
+            concurrency=concurrency if concurrency is not None else worker_concurrency_from_env(),
+        )
         try:
-            request = json.loads(line)
-        except Exception as exc:
-            response = {
-                "id": None,
-                "ok": False,
-                "error": {
-                    "type": type(exc).__name__,
-                    "message": str(exc),
-                },
-            }
-        else:
-            with contextlib.redirect_stdout(log_stream):
-                response = worker.handle(request)
-        output_stream.write(json.dumps(response, ensure_ascii=False) + "\n")
-        output_stream.flush()
-        if response.get("ok") and response.get("result", {}).get("shutdown"):
-            return 0
+            for line in input_stream:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("worker request must be a JSON object")
+                except Exception as exc:
+                    respond(_error_response(None, type(exc).__name__, str(exc)))
+                    continue
+                action = str(request.get("action", "")).strip()
+                if action == "cancel":
+                    cancelled = dispatcher.cancel(request.get("target"))
+                    respond({"id": request.get("id"), "ok": True, "result": {"cancelled": cancelled}})
+                elif action == "shutdown":
+                    dispatcher.close()
+                    respond(worker.handle(request))
+                    return 0
+                else:
+                    dispatcher.submit(request)
+        finally:
+            dispatcher.close()
     return 0
 
 
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(prog="mathcraft-worker")
     parser.add_argument("--provider", default="auto")
+    parser.add_argument("--ort-options", default="", help="ONNX Runtime session options, e.g. intra=4,opt=all.")
+    parser.add_argument("--precision", choices=MODEL_PRECISIONS, default=None, help="Model precision variant.")
+    parser.add_argument("--concurrency", type=int, default=None, help="Requests executed at the same time.")
     return parser
 
 
 def main(argv: list[str] | None = None) -> int:
     args = build_parser().parse_args(argv)
-    return serve_jsonl(provider_preference=args.provider)
+    return serve_jsonl(
+        provider_preference=args.provider,
+        session_options=parse_session_options(args.ort_options, session_options_from_env()),
+        precision=args.precision,
+        concurrency=args.concurrency,
+    )
+
+
+def _error_response(request_id, error_type: str, message: str) -> dict:
+    return {
+        "id": request_id,
+        "ok": False,
+        "error": {
+            "type": error_type,
+            "message": message,
+        },
+    }
 
 
-def _require_image(request: dict):
+def _request_priority(request: dict) -> int:
+    try:
+        return int(request.get("priority", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _require_image(request: dict, resources: contextlib.ExitStack):
     image = request.get("image")
     if image is None:
         raise ValueError("request field 'image' is required")
+    return _resolve_image(image, resources)
+
+
+def _resolve_image(image, resources: contextlib.ExitStack):
+    if is_shared_image(image):
+        return resources.enter_context(attach_shared_image(image))
     return image
 
 
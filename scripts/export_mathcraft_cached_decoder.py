@@ -0,0 +1,140 @@
+# coding: utf-8
+# ruff: noqa: E402
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from mathcraft_ocr.adapters.formula_recognizer import (
+    DECODER_FILENAME,
+    DECODER_MERGED_FILENAME,
+    DECODER_WITH_PAST_FILENAME,
+    ENCODER_FILENAME,
+    _CachedDecoder,
+    _FullSequenceDecoder,
+    _read_generation_ids,
+)
+from mathcraft_ocr.cache import inspect_model_cache, resolve_user_models_dir
+from mathcraft_ocr.downloader import _sha256_of_file
+from mathcraft_ocr.manifest import load_manifest
+from mathcraft_ocr.profiles import FORMULA_RECOGNIZER_ID
+
+
+EXPORTED_FILES = (DECODER_MERGED_FILENAME, DECODER_WITH_PAST_FILENAME)
+CHECK_STEPS = 4
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Export past-key-values decoders for the formula recognizer and add them to the fp32 model cache."
+        )
+    )
+    parser.add_argument(
+        "--checkpoint",
+        required=True,
+        help="Hugging Face id or local dir of the PyTorch encoder-decoder checkpoint the release was exported from.",
+    )
+    parser.add_argument("--cache-dir", default="", help="MathCraft model cache root.")
+    parser.add_argument("--atol", type=float, default=1e-3, help="Largest logit difference accepted against the cache.")
+    parser.add_argument("--force", action="store_true", help="Overwrite existing decoder exports.")
+    args = parser.parse_args(argv)
+
+    try:
+        import onnxruntime as ort
+        from optimum.exporters.onnx import main_export
+    except ImportError as exc:
+        print(f"optimum[exporters] and onnxruntime are required for the export: {exc}", file=sys.stderr)
+        return 2
+
+    cache_root = resolve_user_models_dir(args.cache_dir or None)
+    spec = load_manifest().models[FORMULA_RECOGNIZER_ID]
+    source = inspect_model_cache(cache_root, spec)
+    if not source.complete:
+        print(f"{FORMULA_RECOGNIZER_ID}: fp32 model incomplete under {source.model_dir}", file=sys.stderr)
+        return 2
+    model_dir = source.model_dir
+    existing = [name for name in EXPORTED_FILES if (model_dir / name).exists()]
+    if existing and not args.force:
+        print(f"{FORMULA_RECOGNIZER_ID}: {', '.join(existing)} exist, pass --force to rebuild", file=sys.stderr)
+        return 2
+
+    with tempfile.TemporaryDirectory(prefix="mathcraft-decoder-export-") as tmp:
+        export_dir = Path(tmp)
+        # optimum writes decoder_model.onnx and decoder_with_past_model.onnx, then merges them.
+        main_export(args.checkpoint, output=export_dir, task="image-to-text-with-past")
+        missing = [name for name in (DECODER_FILENAME, *EXPORTED_FILES) if not (export_dir / name).is_file()]
+        if missing:
+            print(f"export did not produce {', '.join(missing)}", file=sys.stderr)
+            return 2
+
+        def _session(path: Path):
+            return ort.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+
+        reference = _FullSequenceDecoder(_session(model_dir / DECODER_FILENAME))
+        merged = _session(export_dir / DECODER_MERGED_FILENAME)
+        candidates = {
+            DECODER_MERGED_FILENAME: lambda: _CachedDecoder(merged, merged, merged=True),
+            DECODER_WITH_PAST_FILENAME: lambda: _CachedDecoder(
+                _session(export_dir / DECODER_FILENAME),
+                _session(export_dir / DECODER_WITH_PAST_FILENAME),
+                merged=False,
+            ),
+        }
+        encoder_states = _encoder_states(_session(model_dir / ENCODER_FILENAME))
+        start_id = _read_generation_ids(str(model_dir))[0] or 0
+        for name, build in candidates.items():
+            diff = _max_logit_difference(reference, build(), encoder_states, int(start_id))
+            print(f"{name}: max logit difference against {DECODER_FILENAME} is {diff:.2e}")
+            if diff > args.atol:
+                print(
+                    f"{name} does not match the cached {DECODER_FILENAME}; "
+                    "the checkpoint is not the one this release was exported from",
+                    file=sys.stderr,
+                )
+                return 1
+
+        listing = []
+        for name in EXPORTED_FILES:
+            target = model_dir / name
+            shutil.copy2(export_dir / name, target)
+            listing.append({"path": name, "sha256": _sha256_of_file(target)})
+            print(f"{FORMULA_RECOGNIZER_ID}: {name} -> {target}")
+    print(json.dumps({"model_id": FORMULA_RECOGNIZER_ID, "optional_files": listing}, indent=2))
+    return 0
+
+
+def _encoder_states(encoder_session) -> np.ndarray:
+    meta = encoder_session.get_inputs()[0]
+    shape = [dim if isinstance(dim, int) and dim > 0 else 1 for dim in meta.shape]
+    pixels = np.random.default_rng(0).uniform(-1.0, 1.0, size=shape).astype(np.float32)
+    return encoder_session.run(None, {meta.name: pixels})[0]
+
+
+def _max_logit_difference(reference, candidate, encoder_states: np.ndarray, start_id: int) -> float:
+    # Greedy steps from the reference decoder drive both paths, so every step compares the same prefix.
+    input_ids = np.full((encoder_states.shape[0], 1), start_id, dtype=np.int64)
+    next_column = None
+    worst = 0.0
+    for _ in range(CHECK_STEPS):
+        expected = reference.step(input_ids, next_column, encoder_states)
+        actual = candidate.step(input_ids, next_column, encoder_states)
+        worst = max(worst, float(np.max(np.abs(expected - actual))))
+        next_column = np.argmax(expected, axis=-1).astype(np.int64)
+        input_ids = np.concatenate([input_ids, next_column[:, None]], axis=1)
+    return worst
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,85 @@
+# coding: utf-8
+# ruff: noqa: E402
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+import shutil
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from mathcraft_ocr.cache import inspect_model_cache, resolve_user_models_dir
+from mathcraft_ocr.downloader import _sha256_of_file
+from mathcraft_ocr.manifest import load_manifest
+from mathcraft_ocr.profiles import FORMULA_RECOGNIZER_ID
+
+
+QUANTIZED_OP_TYPES = ("MatMul", "Gemm")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Build INT8 dynamic-quantized MathCraft model variants next to the fp32 cache."
+    )
+    parser.add_argument("--cache-dir", default="", help="MathCraft model cache root.")
+    parser.add_argument("--models", nargs="+", default=[FORMULA_RECOGNIZER_ID], help="Model ids to quantize.")
+    parser.add_argument("--per-channel", action="store_true", help="Quantize weights per output channel.")
+    parser.add_argument("--force", action="store_true", help="Overwrite an existing variant directory.")
+    args = parser.parse_args(argv)
+
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as exc:
+        print(f"onnxruntime.quantization is unavailable (install the onnx package): {exc}", file=sys.stderr)
+        return 2
+
+    cache_root = resolve_user_models_dir(args.cache_dir or None)
+    manifest = load_manifest()
+    for model_id in args.models:
+        base = manifest.models[model_id]
+        variant = base.variant("int8")
+        if variant is None or variant is base:
+            print(f"{model_id}: manifest declares no int8 variant", file=sys.stderr)
+            return 2
+        source = inspect_model_cache(cache_root, base)
+        if not source.complete:
+            print(f"{model_id}: fp32 model incomplete under {source.model_dir}", file=sys.stderr)
+            return 2
+        target = cache_root / variant.dir_name
+        if target.exists():
+            if not args.force:
+                print(f"{model_id}: {target} exists, pass --force to rebuild", file=sys.stderr)
+                return 2
+            shutil.rmtree(target)
+        target.mkdir(parents=True)
+
+        listing = []
+        for file_spec in (*variant.files, *variant.optional_files):
+            src = source.model_dir / file_spec.path
+            dst = target / file_spec.path
+            if not src.is_file():
+                continue
+            if src.suffix == ".onnx":
+                quantize_dynamic(
+                    str(src),
+                    str(dst),
+                    op_types_to_quantize=list(QUANTIZED_OP_TYPES),
+                    per_channel=args.per_channel,
+                    weight_type=QuantType.QInt8,
+                )
+            else:
+                shutil.copy2(src, dst)
+            size_ratio = dst.stat().st_size / max(1, src.stat().st_size)
+            listing.append({"path": file_spec.path, "sha256": _sha256_of_file(dst)})
+            print(f"{model_id}: {file_spec.path} -> {dst} ({size_ratio:.2f}x size)")
+        print(json.dumps({"model_id": model_id, "files": listing}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,16 +3,22 @@
 from __future__ import annotations
 
 from collections import deque
+from concurrent.futures import (
+    CancelledError as FutureCancelledError,
+    Future,
+    ThreadPoolExecutor,
+    TimeoutError as FutureTimeoutError,
+)
+import itertools
 import json
 import os
 from pathlib import Path
-import queue
 import re
 import subprocess
 import sys
 import tempfile
 import threading
-from typing import Any
+from typing import Any, Callable
 
 from PIL import Image
 from runtime.app_paths import app_config_path
@@ -70,6 +76,11 @@ MODEL_MODES = {
 FORMULA_RECOGNITION_MAX_NEW_TOKENS = 512
 EMPTY_IMAGE_STD_THRESHOLD = 2.5
 EMPTY_IMAGE_FOREGROUND_RATIO_THRESHOLD = 0.0015
+IMAGE_TRANSPORTS = ("shm", "path")
+MAX_WORKER_POOL_SIZE = 8
+WORKER_RESULT_EVENT = "result"
+# Profiles warmed on a background thread once the key profile is ready.
+BACKGROUND_PREWARM_PROFILES = {"formula": "mixed"}
 
 
 def _repo_root() -> Path:
@@ -412,6 +423,42 @@ def resolve_mathcraft_provider_preference() -> str:
     return _infer_provider_preference_from_deps_state(get_deps_python())
 
 
+def resolve_mathcraft_image_transport() -> str:
+    explicit = (os.environ.get("MATHCRAFT_IMAGE_TRANSPORT", "") or "").strip().lower()
+    return explicit if explicit in IMAGE_TRANSPORTS else "shm"
+
+
+def resolve_mathcraft_pool_size(value: Any = None) -> int:
+    raw = os.environ.get("MATHCRAFT_POOL_SIZE", "") if value is None else value
+    try:
+        size = int(str(raw).strip() or 1)
+    except ValueError:
+        size = 1
+    if size <= 0:
+        size = max(1, min(4, (os.cpu_count() or 1) // 4))
+    return min(size, MAX_WORKER_POOL_SIZE)
+
+
+def resolve_mathcraft_deep_warmup() -> bool:
+    raw = os.environ.get("MATHCRAFT_DEEP_WARMUP", "").strip().lower()
+    return raw in {"1", "on", "true"}
+
+
+def _pool_intra_threads(pool_size: int) -> int:
+    if pool_size <= 1:
+        return 0
+    return max(1, (os.cpu_count() or 1) // pool_size)
+
+
+def _looks_like_image_transport_error(detail: str, shm_name: str = "") -> bool:
+    text = str(detail or "")
+    return (
+        "unsupported image input" in text
+        or "shared image" in text
+        or bool(shm_name and shm_name in text)
+    )
+
+
 def classify_mathcraft_failure(detail: str) -> dict[str, str]:
     raw = str(detail or "").strip()
     lower = raw.lower()
@@ -580,12 +627,18 @@ class ModelWrapper(QObject):
         self._worker: subprocess.Popen | None = None
         self._worker_lock = threading.Lock()
         self._request_lock = threading.Lock()
-        self._request_seq = 0
+        self._request_seq = itertools.count(1)
+        self._pending: dict[str, Future] = {}
+        self._event_handlers: dict[str, Callable[[dict[str, Any]], None]] = {}
+        self._job_requests: dict[str, dict[str, tuple[subprocess.Popen, dict[str, Future]]]] = {}
         self._ready = False
         self._import_failed = False
         self._last_error = ""
         self._last_error_code = ""
         self._provider = resolve_mathcraft_provider_preference()
+        self._image_transport = resolve_mathcraft_image_transport()
+        self._pool_size = resolve_mathcraft_pool_size()
+        self._pool_workers: list[tuple[subprocess.Popen, dict[str, Future]]] = []
         self._ready_modes: set[str] = set()
         self._stderr_lock = threading.Lock()
         self._worker_stderr_tail: deque[str] = deque(maxlen=80)
@@ -620,6 +673,9 @@ class ModelWrapper(QObject):
             env["MATHCRAFT_BUNDLED_MODELS_DIR"] = str(bundled_models)
         else:
             env.pop("MATHCRAFT_BUNDLED_MODELS_DIR", None)
+        if self._pool_size > 1:
+            # Pool members already split the cores; overlapping two sessions per member would double them.
+            env["MATHCRAFT_MIXED_PIPELINE"] = "sequential"
         return env
 
     def _normalize_model_name(self, model_name: str | None) -> str:
@@ -636,11 +692,26 @@ class ModelWrapper(QObject):
         self._default_model = self._normalize_model_name(model_name or "mathcraft")
 
     def _next_request_id(self) -> str:
-        self._request_seq += 1
-        return f"mathcraft-{self._request_seq}"
+        return f"mathcraft-{next(self._request_seq)}"
+
+    @property
+    def pool_size(self) -> int:
+        return self._pool_size
+
+    def set_pool_size(self, size: Any) -> None:
+        size = resolve_mathcraft_pool_size(size)
+        if size == self._pool_size:
+            return
+        self._pool_size = size
+        if self._worker is not None or self._pool_workers:
+            self._stop_mathcraft_worker()
 
     def _worker_argv(self) -> list[str]:
         roots = [str(root) for root in _worker_code_roots()]
+        args = ["worker", "--provider", self._provider]
+        intra_threads = _pool_intra_threads(self._pool_size)
+        if intra_threads:
+            args += ["--ort-options", f"intra={intra_threads}"]
         code = (
             "import ssl, sys, urllib.request; "
             "assert any(type(h).__name__ == 'HTTPSHandler' "
@@ -649,7 +720,7 @@ class ModelWrapper(QObject):
             "insert_at=next((i for i,p in enumerate(sys.path) if 'site-packages' in p.lower()), len(sys.path)); "
             "[sys.path.insert(insert_at, p) for p in reversed(roots) if p not in sys.path]; "
             "from mathcraft_ocr.cli import main; "
-            f"raise SystemExit(main(['worker', '--provider', {self._provider!r}]))"
+            f"raise SystemExit(main({args!r}))"
         )
         return [get_deps_python(), "-u", "-c", code]
 
@@ -691,6 +762,77 @@ class ModelWrapper(QObject):
 
         threading.Thread(target=_pump, daemon=True).start()
 
+    def _start_worker_stdout_reader(self, proc: subprocess.Popen, pending: dict[str, Future]) -> None:
+        stdout = proc.stdout
+        if stdout is None:
+            return
+
+        def _read() -> None:
+            try:
+                for raw_line in stdout:
+                    line = str(raw_line or "").strip()
+                    if not line:
+                        continue
+                    try:
+                        response = json.loads(line)
+                    except Exception:
+                        self._remember_worker_stderr(f"MathCraft OCR 返回了无效 JSON: {line[:300]}")
+                        continue
+                    if not isinstance(response, dict):
+                        continue
+                    if response.get("event") not in (None, WORKER_RESULT_EVENT):
+                        self._dispatch_worker_event(response)
+                        continue
+                    with self._request_lock:
+                        future = pending.pop(str(response.get("id")), None)
+                    if future is not None and not future.done():
+                        future.set_result(response)
+            except Exception:
+                pass
+            finally:
+                self._fail_pending_requests(proc, pending)
+
+        threading.Thread(target=_read, name="MathCraftWorkerReader", daemon=True).start()
+
+    def _fail_pending_requests(self, proc: subprocess.Popen, pending: dict[str, Future]) -> None:
+        with self._request_lock:
+            futures = list(pending.values())
+            pending.clear()
+        if self._worker is proc:
+            self._stop_mathcraft_worker()
+        else:
+            with self._worker_lock:
+                self._pool_workers = [slot for slot in self._pool_workers if slot[0] is not proc]
+        if not futures:
+            return
+        try:
+            proc.wait(timeout=1.0)
+        except Exception:
+            pass
+        detail = self._worker_stderr_text()
+        message = "MathCraft OCR 运行进程已退出且没有返回结果"
+        error = RuntimeError(f"{message}: {detail}" if detail else message)
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+
+    def _spawn_worker_process(self) -> tuple[subprocess.Popen, dict[str, Future]]:
+        proc = subprocess.Popen(
+            self._worker_argv(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            env=self._build_subprocess_env(),
+            **_hidden_subprocess_kwargs(),
+        )
+        pending: dict[str, Future] = {}
+        self._start_worker_stderr_pump(proc)
+        self._start_worker_stdout_reader(proc, pending)
+        return proc, pending
+
     def _ensure_worker(self) -> bool:
         proc = self._worker
         if proc is not None and proc.poll() is None:
@@ -703,19 +845,7 @@ class ModelWrapper(QObject):
                 self._cache_events_seen.clear()
                 with self._stderr_lock:
                     self._worker_stderr_tail.clear()
-                proc = subprocess.Popen(
-                    self._worker_argv(),
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    encoding="utf-8",
-                    errors="replace",
-                    env=self._build_subprocess_env(),
-                    **_hidden_subprocess_kwargs(),
-                )
-                self._worker = proc
-                self._start_worker_stderr_pump(proc)
+                self._worker, self._pending = self._spawn_worker_process()
                 return True
             except Exception as exc:
                 self._set_error(str(exc))
@@ -723,56 +853,105 @@ class ModelWrapper(QObject):
                 self._worker = None
                 return False
 
-    def _send_worker_request(self, payload: dict[str, Any], timeout_sec: float | None = 300.0) -> dict[str, Any]:
+    def _worker_slots(self) -> list[tuple[subprocess.Popen, dict[str, Future]]]:
         if not self._ensure_worker():
             raise RuntimeError(self._last_error or "MathCraft OCR 运行进程启动失败")
-        proc = self._worker
-        if proc is None or proc.stdin is None or proc.stdout is None:
+        slots = [(self._worker, self._pending)]
+        if self._pool_size <= 1:
+            return slots
+        with self._worker_lock:
+            self._pool_workers = [slot for slot in self._pool_workers if slot[0].poll() is None]
+            while len(self._pool_workers) < self._pool_size - 1:
+                try:
+                    slot = self._spawn_worker_process()
+                except Exception as exc:
+                    self._emit(f"[WARN] MathCraft OCR 并行进程启动失败: {exc}")
+                    break
+                self._pool_workers.append(slot)
+                self._prime_worker_slot(slot)
+            slots.extend(self._pool_workers)
+        return slots
+
+    def _prime_worker_slot(self, slot: tuple[subprocess.Popen, dict[str, Future]]) -> None:
+        # A member respawned after the pool became ready queues the warmups it missed ahead of
+        # its first page instead of building every session on that page.
+        proc, pending = slot
+        if proc.stdin is None:
+            return
+        for mode in sorted(self._ready_modes):
+            request = self._warmup_request(mode)
+            request["id"] = self._next_request_id()
+            with self._request_lock:
+                pending[request["id"]] = Future()
+                try:
+                    proc.stdin.write(json.dumps(request, ensure_ascii=False) + "\n")
+                    proc.stdin.flush()
+                except Exception:
+                    pending.pop(request["id"], None)
+                    return
+
+    def _dispatch_worker_event(self, response: dict[str, Any]) -> None:
+        with self._request_lock:
+            handler = self._event_handlers.get(str(response.get("id")))
+        if handler is None:
+            return
+        try:
+            handler(response)
+        except Exception as exc:
+            self._emit(f"[WARN] MathCraft OCR 部分结果处理失败: {exc}")
+
+    def _send_worker_request(
+        self,
+        payload: dict[str, Any],
+        timeout_sec: float | None = 300.0,
+        *,
+        on_event: Callable[[dict[str, Any]], None] | None = None,
+        slot: tuple[subprocess.Popen, dict[str, Future]] | None = None,
+        job: str = "",
+    ) -> dict[str, Any]:
+        slots = [slot] if slot is not None else [item for item in self._worker_slots() if item[0] is not None]
+        if not slots or any(proc.stdin is None or proc.stdout is None for proc, _pending in slots):
             raise RuntimeError("MathCraft OCR 运行进程管道不可用")
 
         request = dict(payload)
-        request["id"] = request.get("id") or self._next_request_id()
+        request_id = str(request.get("id") or self._next_request_id())
+        request["id"] = request_id
+        if timeout_sec is not None:
+            request.setdefault("timeout_sec", max(float(timeout_sec), 1.0))
+        if on_event is not None:
+            request["stream"] = True
+        future: Future = Future()
         with self._request_lock:
+            proc, pending = min(slots, key=lambda slot: len(slot[1]))
+            pending[request_id] = future
+            if on_event is not None:
+                self._event_handlers[request_id] = on_event
+            if job:
+                self._job_requests.setdefault(job, {})[request_id] = (proc, pending)
             try:
                 proc.stdin.write(json.dumps(request, ensure_ascii=False) + "\n")
                 proc.stdin.flush()
             except Exception as exc:
-                self._stop_mathcraft_worker()
-                raise RuntimeError(f"MathCraft OCR 请求发送失败: {exc}") from exc
-            lines: queue.Queue[str | BaseException] = queue.Queue(maxsize=1)
-
-            def _readline() -> None:
-                try:
-                    lines.put(proc.stdout.readline())
-                except BaseException as exc:
-                    lines.put(exc)
-
-            reader = threading.Thread(target=_readline, daemon=True)
-            reader.start()
-            try:
-                line_or_exc = (
-                    lines.get()
-                    if timeout_sec is None
-                    else lines.get(timeout=max(float(timeout_sec), 1.0))
-                )
-            except queue.Empty as exc:
-                self._stop_mathcraft_worker()
-                raise RuntimeError(f"MathCraft OCR 运行进程超时（>{timeout_sec:.0f}s）") from exc
-            if isinstance(line_or_exc, BaseException):
-                self._stop_mathcraft_worker()
-                raise RuntimeError(f"MathCraft OCR 响应读取失败: {line_or_exc}") from line_or_exc
-            line = line_or_exc
-
-        if not line:
-            detail = self._worker_stderr_text()
+                pending.pop(request_id, None)
+                self._event_handlers.pop(request_id, None)
+                self._forget_job_request(job, request_id)
+                send_error = exc
+            else:
+                send_error = None
+        if send_error is not None:
             self._stop_mathcraft_worker()
-            if detail:
-                raise RuntimeError(f"MathCraft OCR 运行进程已退出且没有返回结果: {detail}")
-            raise RuntimeError("MathCraft OCR 运行进程已退出且没有返回结果")
+            raise RuntimeError(f"MathCraft OCR 请求发送失败: {send_error}") from send_error
         try:
-            response = json.loads(line)
-        except Exception as exc:
-            raise RuntimeError(f"MathCraft OCR 返回了无效 JSON: {line[:300]}") from exc
+            response = future.result(timeout=None if timeout_sec is None else max(float(timeout_sec), 1.0))
+        except FutureTimeoutError as exc:
+            self._cancel_worker_request(proc, pending, request_id)
+            raise RuntimeError(f"MathCraft OCR 运行进程超时（>{timeout_sec:.0f}s）") from exc
+        except FutureCancelledError as exc:
+            raise RuntimeError("MathCraft OCR 识别已取消") from exc
+        finally:
+            with self._request_lock:
+                self._event_handlers.pop(request_id, None)
+                self._forget_job_request(job, request_id)
         if not response.get("ok"):
             err = response.get("error", {})
             message = err.get("message") if isinstance(err, dict) else str(err)
@@ -780,6 +959,36 @@ class ModelWrapper(QObject):
         result = response.get("result")
         return result if isinstance(result, dict) else {}
 
+    def cancel_worker_requests(self, job: str) -> int:
+        # Only the requests sent for this job; warmups and other jobs on the same workers keep running.
+        with self._request_lock:
+            requests = list(self._job_requests.pop(job, {}).items())
+        for request_id, (proc, pending) in requests:
+            self._cancel_worker_request(proc, pending, request_id)
+        return len(requests)
+
+    def _forget_job_request(self, job: str, request_id: str) -> None:
+        requests = self._job_requests.get(job)
+        if requests is None:
+            return
+        requests.pop(request_id, None)
+        if not requests:
+            self._job_requests.pop(job, None)
+
+    def _cancel_worker_request(self, proc: subprocess.Popen, pending: dict[str, Future], request_id: str) -> None:
+        with self._request_lock:
+            future = pending.pop(request_id, None)
+            if future is not None:
+                future.cancel()
+            if proc.stdin is None or proc.poll() is not None:
+                return
+            try:
+                cancel = {"id": self._next_request_id(), "action": "cancel", "target": request_id}
+                proc.stdin.write(json.dumps(cancel) + "\n")
+                proc.stdin.flush()
+            except Exception:
+                pass
+
     def _set_error(self, detail: str) -> dict[str, str]:
         info = classify_mathcraft_failure(detail)
         self._last_error = str(info.get("user_message", "") or detail or "").strip()
@@ -796,21 +1005,55 @@ class ModelWrapper(QObject):
     def _stop_mathcraft_worker(self) -> None:
         proc = self._worker
         self._worker = None
+        pool_workers, self._pool_workers = self._pool_workers, []
+        for pool_proc, _pending in pool_workers:
+            self._terminate_worker_process(pool_proc)
         if not proc:
             self._ready = False
             return
+        self._terminate_worker_process(proc)
+        self._ready = False
+        self._ready_modes.clear()
+
+    def _terminate_worker_process(self, proc: subprocess.Popen) -> None:
         try:
-            if proc.stdin and proc.poll() is None:
-                proc.stdin.write(json.dumps({"id": self._next_request_id(), "action": "shutdown"}) + "\n")
-                proc.stdin.flush()
+            with self._request_lock:
+                if proc.stdin and proc.poll() is None:
+                    proc.stdin.write(json.dumps({"id": self._next_request_id(), "action": "shutdown"}) + "\n")
+                    proc.stdin.flush()
         except Exception:
             pass
         try:
             proc.terminate()
         except Exception:
             pass
-        self._ready = False
-        self._ready_modes.clear()
+
+    def _warmup_request(self, mode: str) -> dict[str, Any]:
+        request = {
+            "action": "warmup",
+            "profile": mode,
+            "deep": resolve_mathcraft_deep_warmup(),
+        }
+        if mode in BACKGROUND_PREWARM_PROFILES:
+            request["prewarm"] = BACKGROUND_PREWARM_PROFILES[mode]
+        return request
+
+    def _warm_worker_slots(self, request: dict[str, Any]) -> dict[str, Any]:
+        slots = [slot for slot in self._worker_slots() if slot[0] is not None]
+        if len(slots) <= 1:
+            return self._send_worker_request(request, timeout_sec=None)
+        # Every pool member warms up together; otherwise the cold ones would all build
+        # their sessions on their first PDF page at the same time.
+        with ThreadPoolExecutor(max_workers=len(slots), thread_name_prefix="MathCraftWarmup") as executor:
+            futures = [
+                executor.submit(self._send_worker_request, dict(request), None, slot=slot)
+                for slot in slots
+            ]
+            results = [future.result() for future in futures]
+        for result in results:
+            if not result.get("ready"):
+                return result
+        return results[0]
 
     def _lazy_load_mathcraft(self, model_name: str | None = None) -> bool:
         model = self._normalize_model_name(model_name or self._default_model)
@@ -820,13 +1063,7 @@ class ModelWrapper(QObject):
             self._ready = True
             return True
         try:
-            result = self._send_worker_request(
-                {
-                    "action": "warmup",
-                    "profile": mode,
-                },
-                timeout_sec=None,
-            )
+            result = self._warm_worker_slots(self._warmup_request(mode))
             ready = bool(result.get("ready"))
             if not ready:
                 missing = result.get("missing_models", [])
@@ -884,46 +1121,47 @@ class ModelWrapper(QObject):
             return f"model ready (MathCraft, device={self.device})"
         return "model not loaded"
 
-    def predict_result(self, pil_img: Image.Image, model_name: str = "mathcraft") -> dict[str, Any]:
+    def predict_result(
+        self,
+        pil_img: Image.Image,
+        model_name: str = "mathcraft",
+        *,
+        priority: int = 0,
+        on_partial: Callable[[dict[str, Any]], None] | None = None,
+        job: str = "",
+    ) -> dict[str, Any]:
         model = self._normalize_model_name(model_name)
         mode = self._mode_for_model(model)
         if mode not in self._ready_modes and not self._lazy_load_mathcraft(model):
             raise RuntimeError(self._last_error or "MathCraft OCR not ready")
 
         tmp_path = ""
+        shared = None
         try:
             image_rgb = pil_img.convert("RGB")
             if _looks_like_empty_ocr_input(image_rgb):
                 return _empty_recognition_result(model, mode, image_rgb, "empty_image")
-            with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-                tmp_path = tmp.name
-                image_rgb.save(tmp, format="PNG", compress_level=1)
-            if mode == "formula":
-                result = self._send_worker_request(
-                    {
-                        "action": "recognize_formula",
-                        "image": tmp_path,
-                        "max_new_tokens": FORMULA_RECOGNITION_MAX_NEW_TOKENS,
-                    },
-                    timeout_sec=300.0,
-                )
-            elif mode == "text":
-                result = self._send_worker_request(
-                    {
-                        "action": "recognize_text",
-                        "image": tmp_path,
-                    },
-                    timeout_sec=600.0,
-                )
-            else:
-                result = self._send_worker_request(
-                    {
-                        "action": "recognize_mixed",
-                        "image": tmp_path,
-                        "max_formula_new_tokens": FORMULA_RECOGNITION_MAX_NEW_TOKENS,
-                    },
-                    timeout_sec=600.0,
-                )
+            result = None
+            on_event = None
+            if on_partial is not None and mode == "mixed":
+
+                def on_event(response: dict[str, Any]) -> None:
+                    on_partial(response.get("result") or {})
+
+            shared = self._open_shared_image(image_rgb)
+            if shared is not None:
+                try:
+                    result = self._send_recognition_request(mode, shared.descriptor, priority, on_event, job)
+                except RuntimeError as exc:
+                    if not _looks_like_image_transport_error(str(exc), shared.descriptor["name"]):
+                        raise
+                    self._image_transport = "path"
+                    self._emit(f"[WARN] MathCraft OCR 共享内存传图失败，改用临时文件: {exc}")
+            if result is None:
+                with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
+                    tmp_path = tmp.name
+                    image_rgb.save(tmp, format="PNG", compress_level=1)
+                result = self._send_recognition_request(mode, tmp_path, priority, on_event, job)
             result["model"] = model
             result["mode"] = mode
             result["image_size"] = [int(image_rgb.width), int(image_rgb.height)]
@@ -932,12 +1170,69 @@ class ModelWrapper(QObject):
                 return _empty_recognition_result(model, mode, image_rgb, "degenerate_formula_output")
             return result
         finally:
+            if shared is not None:
+                try:
+                    shared.close()
+                except Exception:
+                    pass
             if tmp_path:
                 try:
                     os.unlink(tmp_path)
                 except Exception:
                     pass
 
+    def _open_shared_image(self, image_rgb: Image.Image):
+        if self._image_transport != "shm":
+            return None
+        try:
+            from mathcraft_ocr.transport import SharedImageWriter
+
+            return SharedImageWriter(image_rgb)
+        except (ImportError, OSError, ValueError) as exc:
+            self._image_transport = "path"
+            self._emit(f"[WARN] MathCraft OCR 共享内存传图不可用，改用临时文件: {exc}")
+            return None
+
+    def _send_recognition_request(
+        self,
+        mode: str,
+        image: str | dict[str, Any],
+        priority: int,
+        on_event: Callable[[dict[str, Any]], None] | None = None,
+        job: str = "",
+    ) -> dict[str, Any]:
+        options: dict[str, Any] = {"job": job} if job else {}
+        if mode == "formula":
+            return self._send_worker_request(
+                {
+                    "action": "recognize_formula",
+                    "image": image,
+                    "priority": priority,
+                    "max_new_tokens": FORMULA_RECOGNITION_MAX_NEW_TOKENS,
+                },
+                timeout_sec=300.0,
+                **options,
+            )
+        if mode == "text":
+            return self._send_worker_request(
+                {
+                    "action": "recognize_text",
+                    "image": image,
+                    "priority": priority,
+                },
+                timeout_sec=600.0,
+                **options,
+            )
+        payload = {
+            "action": "recognize_mixed",
+            "image": image,
+            "priority": priority,
+            "max_formula_new_tokens": FORMULA_RECOGNITION_MAX_NEW_TOKENS,
+        }
+        if on_event is not None:
+            options["on_event"] = on_event
+        return self._send_worker_request(payload, timeout_sec=600.0, **options)
+
     def predict(self, pil_img: Image.Image, model_name: str = "mathcraft") -> str:
         result = self.predict_result(pil_img, model_name=model_name)
         text = str(result.get("text", "") or "").strip()
@@ -286,12 +286,6 @@ class PdfRecognitionControllerMixin:
                 self.pdf_predict_worker.cancel()
             except Exception:
                 pass
-        model = getattr(self, "model", None)
-        if model and hasattr(model, "_stop_mathcraft_worker"):
-            try:
-                model._stop_mathcraft_worker()
-            except Exception:
-                pass
         if self.pdf_progress:
             try:
                 self.pdf_progress.setLabelText("正在取消识别...")
@@ -334,7 +328,14 @@ class PdfRecognitionControllerMixin:
         self.set_action_status("PDF 识别完成", auto_clear_ms=3500)
         self._release_pdf_progress()
         elapsed = self.pdf_predict_worker.elapsed
-        if elapsed is not None:
+        pages_done = getattr(self.pdf_predict_worker, "pages_done", None)
+        if elapsed is not None and pages_done:
+            pool_size = getattr(getattr(self, "model", None), "pool_size", 1)
+            print(
+                f"[INFO] PDF 识别完成 model={used} time={elapsed:.2f}s pages={pages_done} "
+                f"pages_per_sec={pages_done / max(elapsed, 1e-6):.2f} pool={pool_size}"
+            )
+        elif elapsed is not None:
             print(f"[INFO] PDF 识别完成 model={used} time={elapsed:.2f}s")
         else:
             print(f"[INFO] PDF 识别完成 model={used}")
@@ -81,13 +81,6 @@ class RecognitionControllerMixin:
                 cancelled = True
             except Exception:
                 pass
-        model = getattr(self, "model", None)
-        if model and hasattr(model, "_stop_mathcraft_worker"):
-            try:
-                model._stop_mathcraft_worker()
-                cancelled = True
-            except Exception:
-                pass
         for thread_name in ("predict_thread", "pdf_predict_thread"):
             thread = getattr(self, thread_name, None)
             if thread:
@@ -184,6 +177,7 @@ class RecognitionControllerMixin:
                 self.predict_thread = None
 
         self.predict_thread.started.connect(self.predict_worker.run)
+        self.predict_worker.partial.connect(self._on_internal_predict_partial)
         self.predict_worker.finished.connect(self._on_internal_predict_ok)
         self.predict_worker.failed.connect(self._on_internal_predict_fail)
         self.predict_worker.finished.connect(self.predict_thread.quit)
@@ -294,6 +288,12 @@ class RecognitionControllerMixin:
             self.predict_worker.elapsed,
         )
 
+    def _on_internal_predict_partial(self, count: int, preview: str) -> None:
+        if self._recognition_cancel_requested or not self._predict_busy:
+            return
+        snippet = preview if len(preview) <= 60 else f"{preview[:60]}..."
+        self.set_model_status(f"识别中 ({count}): {snippet}" if snippet else "识别中...")
+
     def _on_external_predict_fail(self, msg: str):
         model_name = self._get_external_model_display_name(config=self.predict_worker.config)
         self.on_predict_fail(msg, model_name, self.predict_worker.elapsed, external_model=True)
@@ -116,6 +116,9 @@ class MainWindowSetupMixin:
 
             self._apply_mathcraft_env()
             self.model = create_model_wrapper("mathcraft", auto_warmup=False)
+            pool_size = self.cfg.get("mathcraft_pool_size", None)
+            if pool_size is not None:
+                self.model.set_pool_size(pool_size)
             self.model.status_signal.connect(self.show_status_message)
             print("[INFO] ModelWrapper 初始化完成")
 
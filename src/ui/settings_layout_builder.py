@@ -116,6 +116,20 @@ class SettingsLayoutMixin:
         self.mathcraft_mode_combo.currentIndexChanged.connect(self._on_mathcraft_mode_changed)
         mathcraft_mode_layout.addWidget(self.mathcraft_mode_combo)
         lay.addWidget(self.mathcraft_mode_widget)
+        self.mathcraft_pool_widget = QWidget()
+        mathcraft_pool_layout = QHBoxLayout(self.mathcraft_pool_widget)
+        mathcraft_pool_layout.setContentsMargins(0, 0, 0, 0)
+        mathcraft_pool_layout.setSpacing(6)
+        mathcraft_pool_layout.addWidget(QLabel("PDF 并行进程:"))
+        self.mathcraft_pool_combo = ComboBox()
+        self.mathcraft_pool_combo.setFixedHeight(30)
+        self.mathcraft_pool_combo.addItem("1（默认）", userData=1)
+        for size in (2, 3, 4):
+            self.mathcraft_pool_combo.addItem(str(size), userData=size)
+        self.mathcraft_pool_combo.addItem("自动", userData=0)
+        self.mathcraft_pool_combo.currentIndexChanged.connect(self._on_mathcraft_pool_size_changed)
+        mathcraft_pool_layout.addWidget(self.mathcraft_pool_combo)
+        lay.addWidget(self.mathcraft_pool_widget)
         self.external_model_widget = QWidget()
         external_layout = QVBoxLayout(self.external_model_widget)
         external_layout.setContentsMargins(0, 6, 0, 0)
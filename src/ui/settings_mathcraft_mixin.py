@@ -324,6 +324,7 @@ class SettingsMathCraftMixin:
         self._init_mathcraft_pyexe()
         self._schedule_mathcraft_pkg_probe()
         self._init_mathcraft_mode()
+        self._init_mathcraft_pool_size()
         self._init_external_model_config()
         self._update_mathcraft_visibility()
 
@@ -365,6 +366,29 @@ class SettingsMathCraftMixin:
                 self.mathcraft_mode_combo.blockSignals(prev)
                 break
 
+    def _init_mathcraft_pool_size(self):
+        size = 1
+        if self.parent() and hasattr(self.parent(), "cfg"):
+            size = self.parent().cfg.get("mathcraft_pool_size", 1)
+        for i in range(self.mathcraft_pool_combo.count()):
+            if self.mathcraft_pool_combo.itemData(i) == size:
+                prev = self.mathcraft_pool_combo.blockSignals(True)
+                self.mathcraft_pool_combo.setCurrentIndex(i)
+                self.mathcraft_pool_combo.blockSignals(prev)
+                break
+
+    def _on_mathcraft_pool_size_changed(self, index: int):
+        if index < 0:
+            return
+        size = self.mathcraft_pool_combo.itemData(index)
+        if size is None or not self.parent():
+            return
+        if hasattr(self.parent(), "cfg"):
+            self.parent().cfg.set("mathcraft_pool_size", size)
+        model = getattr(self.parent(), "model", None)
+        if model is not None and hasattr(model, "set_pool_size"):
+            model.set_pool_size(size)
+
     def _mathcraft_mode_to_model(self, mode_key: str) -> str:
         mapping = {
             "formula": "mathcraft",
@@ -496,6 +520,7 @@ class SettingsMathCraftMixin:
                 self.mathcraft_dl_widget.setVisible(visible)
             # Keep recognition type visible so users can preselect it.
             self.mathcraft_mode_widget.setVisible(visible)
+            self.mathcraft_pool_widget.setVisible(visible)
             self.external_model_widget.setVisible(external_visible)
             if visible:
                 if not pyexe_exists:
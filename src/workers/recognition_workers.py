@@ -2,10 +2,13 @@
 
 from __future__ import annotations
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import inspect
 import queue
 import threading
 import time
 from typing import Any
+import uuid
 
 from PIL import Image
 from PyQt6.QtCore import QObject, QThread, pyqtSignal
@@ -13,6 +16,10 @@ from PyQt6.QtCore import QObject, QThread, pyqtSignal
 from recognition.image_preprocess import optimize_mathcraft_input_image
 
 
+PDF_PAGE_PRIORITY = -1
+STREAMING_MODEL_NAMES = {"mathcraft_mixed"}
+
+
 def _empty_recognition_message(result: dict[str, Any] | None = None) -> str:
     mode = str((result or {}).get("mode") or "").strip().lower()
     if mode == "text":
@@ -22,9 +29,40 @@ def _empty_recognition_message(result: dict[str, Any] | None = None) -> str:
     return "未识别到公式内容"
 
 
+def _accepts_keyword(fn: Any, name: str) -> bool:
+    try:
+        return name in inspect.signature(fn).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _cancel_job_requests(model_wrapper: Any, job_id: str) -> None:
+    cancel = getattr(model_wrapper, "cancel_worker_requests", None)
+    if cancel is None:
+        return
+    try:
+        cancel(job_id)
+    except Exception:
+        pass
+
+
+def _partial_preview_text(blocks: list[dict[str, Any]]) -> str:
+    def _position(block: dict[str, Any]) -> tuple[float, float]:
+        points = block.get("box") or [[0.0, 0.0]]
+        return min(float(point[1]) for point in points), min(float(point[0]) for point in points)
+
+    parts = []
+    for block in sorted(blocks, key=_position):
+        text = str(block.get("text", "") or "").strip()
+        if text:
+            parts.append(text if block.get("kind") == "text" else f"${text}$")
+    return " ".join(parts)
+
+
 class PredictionWorker(QObject):
     finished = pyqtSignal(str)
     failed = pyqtSignal(str)
+    partial = pyqtSignal(int, str)
 
     def __init__(self, model_wrapper: Any, image: Image.Image, model_name: str):
         super().__init__()
@@ -32,10 +70,18 @@ class PredictionWorker(QObject):
         self.image = image
         self.model_name = model_name
         self.elapsed = None
+        self.job_id = uuid.uuid4().hex
         self._cancelled = False
+        self._partial_blocks: list[dict[str, Any]] = []
 
     def cancel(self):
         self._cancelled = True
+        _cancel_job_requests(self.model_wrapper, self.job_id)
+
+    def _on_partial_block(self, block: dict[str, Any]) -> None:
+        # Called on the model wrapper's reader thread; the queued signal hands it to the UI thread.
+        self._partial_blocks.append(block)
+        self.partial.emit(len(self._partial_blocks), _partial_preview_text(self._partial_blocks))
 
     def run(self):
         t0 = time.perf_counter()
@@ -46,7 +92,14 @@ class PredictionWorker(QObject):
                 return
             image = optimize_mathcraft_input_image(self.image)
             if hasattr(self.model_wrapper, "predict_result"):
-                result_obj = self.model_wrapper.predict_result(image, model_name=self.model_name)
+                options: dict[str, Any] = {}
+                if _accepts_keyword(self.model_wrapper.predict_result, "job"):
+                    options["job"] = self.job_id
+                if self.model_name in STREAMING_MODEL_NAMES and _accepts_keyword(
+                    self.model_wrapper.predict_result, "on_partial"
+                ):
+                    options["on_partial"] = self._on_partial_block
+                result_obj = self.model_wrapper.predict_result(image, model_name=self.model_name, **options)
                 result = str(result_obj.get("text", "") or "").strip()
                 if result_obj.get("empty_reason") or not result:
                     self.elapsed = time.perf_counter() - t0
@@ -94,11 +147,14 @@ class PdfPredictWorker(QObject):
         self.model_name = model_name
         self.output_format = output_format
         self.dpi = dpi
+        self.job_id = uuid.uuid4().hex
         self._cancelled = False
         self.elapsed = None
+        self.pages_done = 0
 
     def cancel(self):
         self._cancelled = True
+        _cancel_job_requests(self.model_wrapper, self.job_id)
 
     def run(self):
         t0 = time.perf_counter()
@@ -130,7 +186,8 @@ class PdfPredictWorker(QObject):
         except Exception:
             pass
 
-        render_queue = queue.Queue(maxsize=1)
+        parallel = max(1, int(getattr(self.model_wrapper, "pool_size", 1) or 1))
+        render_queue = queue.Queue(maxsize=parallel)
         render_thread = threading.Thread(
             target=lambda: self._render_pages(fitz, page_indices, render_queue),
             name="MathCraftPdfRenderPrefetch",
@@ -138,32 +195,45 @@ class PdfPredictWorker(QObject):
         )
         render_thread.start()
 
-        page_results = []
+        results_by_position = {}
+        executor = ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="MathCraftPdfPage")
+        in_flight = {}
+        rendering = True
         try:
-            while True:
+            while rendering or in_flight:
                 if self._cancel_requested():
                     _set_elapsed()
                     self.failed.emit("已取消")
                     return
-                try:
-                    item = render_queue.get(timeout=0.1)
-                except queue.Empty:
+                while rendering and len(in_flight) < parallel:
+                    try:
+                        item = render_queue.get_nowait() if in_flight else render_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        rendering = False
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    progress_index, page_index, img, image_size = item
+                    future = executor.submit(self._predict_page, img)
+                    in_flight[future] = (progress_index, page_index, image_size)
+                if not in_flight:
                     continue
-                if item is None:
-                    break
-                if isinstance(item, Exception):
-                    raise item
-                progress_index, page_index, img, image_size = item
-                result = self._predict_page(img)
-                if self._cancel_requested():
-                    _set_elapsed()
-                    self.failed.emit("已取消")
-                    return
-                if isinstance(result, dict):
-                    result["page_index"] = page_index + 1
-                    result.setdefault("image_size", image_size)
-                    page_results.append(result)
-                self.progress.emit(progress_index + 1, total)
+                done, _ = wait(in_flight, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    progress_index, page_index, image_size = in_flight.pop(future)
+                    result = future.result()
+                    if self._cancel_requested():
+                        _set_elapsed()
+                        self.failed.emit("已取消")
+                        return
+                    if isinstance(result, dict):
+                        result["page_index"] = page_index + 1
+                        result.setdefault("image_size", image_size)
+                        results_by_position[progress_index] = result
+                    self.pages_done += 1
+                    self.progress.emit(self.pages_done, total)
         except Exception as exc:
             _set_elapsed()
             if self._cancel_requested():
@@ -171,6 +241,9 @@ class PdfPredictWorker(QObject):
                 return
             self.failed.emit(str(exc))
             return
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        page_results = [results_by_position[index] for index in sorted(results_by_position)]
 
         from core.mathcraft_document_engine import compose_mathcraft_markdown_pages
 
@@ -223,5 +296,9 @@ class PdfPredictWorker(QObject):
 
     def _predict_page(self, img: Image.Image) -> dict:
         if hasattr(self.model_wrapper, "predict_result"):
-            return self.model_wrapper.predict_result(img, model_name=self.model_name)
+            if _accepts_keyword(self.model_wrapper.predict_result, "job"):
+                return self.model_wrapper.predict_result(
+                    img, model_name=self.model_name, priority=PDF_PAGE_PRIORITY, job=self.job_id
+                )
+            return self.model_wrapper.predict_result(img, model_name=self.model_name, priority=PDF_PAGE_PRIORITY)
         return {"text": self.model_wrapper.predict(img, model_name=self.model_name)}
@@ -7,6 +7,7 @@ import re
 import shutil
 import sys
 import tempfile
+import time
 import tomllib
 import unittest
 from unittest import mock
@@ -193,6 +194,25 @@ class InternalModelMathCraftTests(unittest.TestCase):
 
         self.assertEqual(requests[-1]["max_new_tokens"], FORMULA_RECOGNITION_MAX_NEW_TOKENS)
 
+    def test_model_wrapper_warmup_requests_deep_warmup_and_mixed_prewarm(self):
+        from backend.model import ModelWrapper
+
+        wrapper = ModelWrapper(auto_warmup=False)
+        requests = []
+
+        def _fake_request(payload, timeout_sec=None):
+            requests.append(dict(payload))
+            return {"ready": True, "provider_info": {"device": "cpu"}}
+
+        wrapper._send_worker_request = _fake_request
+        with mock.patch.dict(os.environ, {"MATHCRAFT_DEEP_WARMUP": "1"}):
+            self.assertTrue(wrapper._lazy_load_mathcraft("mathcraft"))
+        with mock.patch.dict(os.environ, {"MATHCRAFT_DEEP_WARMUP": ""}):
+            self.assertTrue(wrapper._lazy_load_mathcraft("mathcraft_text"))
+
+        self.assertEqual(requests[0], {"action": "warmup", "profile": "formula", "deep": True, "prewarm": "mixed"})
+        self.assertEqual(requests[1], {"action": "warmup", "profile": "text", "deep": False})
+
     def test_model_wrapper_uses_extended_mixed_formula_decode_budget(self):
         from backend.model import FORMULA_RECOGNITION_MAX_NEW_TOKENS, ModelWrapper
 
@@ -264,6 +284,281 @@ class InternalModelMathCraftTests(unittest.TestCase):
         self.assertEqual(result["text"], r"\int _ { 0 } ^ { 1 } x ^ { 2 } dx")
         self.assertNotIn("empty_reason", result)
 
+    def test_model_wrapper_sends_images_through_shared_memory(self):
+        from backend.model import ModelWrapper
+        from mathcraft_ocr.transport import attach_shared_image
+
+        wrapper = ModelWrapper(auto_warmup=False)
+        wrapper._ready_modes.add("formula")
+        wrapper._image_transport = "shm"
+        image = _nonblank_test_image()
+        seen = []
+
+        def _fake_request(payload, timeout_sec=300.0):
+            with attach_shared_image(payload["image"]) as pixels:
+                seen.append(pixels.copy())
+            return {"text": "x", "score": 0.9}
+
+        wrapper._send_worker_request = _fake_request
+        wrapper.predict_result(image, model_name="mathcraft")
+
+        self.assertEqual(seen[0].shape, (image.height, image.width, 3))
+        self.assertEqual(seen[0].tobytes(), image.convert("RGB").tobytes())
+
+    def test_model_wrapper_falls_back_to_temp_png_when_worker_rejects_shared_memory(self):
+        from backend.model import ModelWrapper
+
+        wrapper = ModelWrapper(auto_warmup=False)
+        wrapper._ready_modes.add("formula")
+        wrapper._image_transport = "shm"
+        images = []
+
+        def _fake_request(payload, timeout_sec=300.0):
+            images.append(payload["image"])
+            if isinstance(payload["image"], dict):
+                raise RuntimeError("unsupported image input: <class 'dict'>")
+            self.assertTrue(Path(payload["image"]).is_file())
+            return {"text": "x", "score": 0.9}
+
+        wrapper._send_worker_request = _fake_request
+        wrapper.predict_result(_nonblank_test_image(), model_name="mathcraft")
+        wrapper.predict_result(_nonblank_test_image(), model_name="mathcraft")
+
+        self.assertEqual([type(item) for item in images], [dict, str, str])
+        self.assertEqual(wrapper._image_transport, "path")
+
+    def test_model_wrapper_multiplexes_worker_responses_by_id(self):
+        import threading
+
+        from backend.model import ModelWrapper
+
+        script = (
+            "import json, sys\n"
+            "held = []\n"
+            "for line in sys.stdin:\n"
+            "    request = json.loads(line)\n"
+            "    if request['action'] == 'cancel':\n"
+            "        print(json.dumps({'id': request['id'], 'ok': True, 'result': {'cancelled': True}}), flush=True)\n"
+            "        continue\n"
+            "    if request['action'] == 'shutdown':\n"
+            "        break\n"
+            "    if request.get('tag') == 'slow':\n"
+            "        continue\n"
+            "    held.append(request)\n"
+            "    if len(held) == 2:\n"
+            "        for item in reversed(held):\n"
+            "            print(json.dumps({'id': item['id'], 'ok': True, 'result': {'tag': item['tag']}}), flush=True)\n"
+            "        held.clear()\n"
+        )
+        wrapper = ModelWrapper(auto_warmup=False)
+        wrapper._worker_argv = lambda: [sys.executable, "-c", script]
+        try:
+            results = {}
+
+            def _send(tag):
+                results[tag] = wrapper._send_worker_request({"action": "echo", "tag": tag}, timeout_sec=30.0)
+
+            threads = [threading.Thread(target=_send, args=(tag,)) for tag in ("a", "b")]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=30.0)
+            self.assertEqual(results, {"a": {"tag": "a"}, "b": {"tag": "b"}})
+
+            proc = wrapper._worker
+            with self.assertRaisesRegex(RuntimeError, "超时"):
+                wrapper._send_worker_request({"action": "echo", "tag": "slow"}, timeout_sec=0.01)
+            self.assertIs(wrapper._worker, proc)
+            self.assertIsNone(proc.poll())
+            self.assertEqual(wrapper._pending, {})
+        finally:
+            wrapper._stop_mathcraft_worker()
+
+    def test_model_wrapper_cancel_keeps_worker_process_alive(self):
+        import threading
+
+        from backend.model import ModelWrapper
+
+        script = (
+            "import json, sys\n"
+            "cancelled = []\n"
+            "for line in sys.stdin:\n"
+            "    request = json.loads(line)\n"
+            "    if request['action'] == 'cancel':\n"
+            "        cancelled.append(request['target'])\n"
+            "        print(json.dumps({'id': request['target'], 'ok': False, 'error': {'type': 'RecognitionCancelled'}}), flush=True)\n"
+            "    elif request['action'] == 'shutdown':\n"
+            "        break\n"
+            "    elif request.get('tag') != 'slow':\n"
+            "        print(json.dumps({'id': request['id'], 'ok': True, 'result': {'cancelled': cancelled}}), flush=True)\n"
+        )
+        wrapper = ModelWrapper(auto_warmup=False)
+        wrapper._worker_argv = lambda: [sys.executable, "-c", script]
+        errors = {}
+        threads = []
+        try:
+
+            def _send(name, **kwargs):
+                try:
+                    wrapper._send_worker_request({"action": "echo", "tag": "slow"}, timeout_sec=30.0, **kwargs)
+                except RuntimeError as exc:
+                    errors[name] = str(exc)
+
+            # A screenshot job, a concurrent PDF job and a priming warmup share one worker.
+            for name, kwargs in (("screenshot", {"job": "screenshot"}), ("pdf", {"job": "pdf"}), ("warmup", {})):
+                threads.append(threading.Thread(target=_send, args=(name,), kwargs=kwargs))
+                threads[-1].start()
+            deadline = time.monotonic() + 10.0
+            while len(wrapper._pending) < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            proc = wrapper._worker
+            self.assertEqual(wrapper.cancel_worker_requests("screenshot"), 1)
+            threads[0].join(timeout=10.0)
+
+            self.assertEqual(list(errors), ["screenshot"])
+            self.assertIn("已取消", errors["screenshot"])
+            self.assertEqual(len(wrapper._pending), 2)
+            self.assertIs(wrapper._worker, proc)
+            self.assertIsNone(proc.poll())
+            result = wrapper._send_worker_request({"action": "echo", "tag": "next"}, timeout_sec=30.0)
+            self.assertEqual(len(result["cancelled"]), 1)
+            self.assertEqual(wrapper.cancel_worker_requests("screenshot"), 0)
+        finally:
+            wrapper._stop_mathcraft_worker()
+            for thread in threads:
+                thread.join(timeout=10.0)
+
+    def test_model_wrapper_forwards_streamed_partial_blocks(self):
+        from backend.model import ModelWrapper
+
+        script = (
+            "import json, sys\n"
+            "for line in sys.stdin:\n"
+            "    request = json.loads(line)\n"
+            "    if request['action'] == 'shutdown':\n"
+            "        break\n"
+            "    for index, kind in enumerate(('text_line', 'formula')):\n"
+            "        block = {'kind': 'text', 'text': f'part-{index}'}\n"
+            "        print(json.dumps({'id': request['id'], 'ok': True, 'event': kind, 'result': block}), flush=True)\n"
+            "    final = {'id': request['id'], 'ok': True, 'result': {'text': 'done', 'stream': request.get('stream')}}\n"
+            "    if request.get('stream'):\n"
+            "        final['event'] = 'result'\n"
+            "    print(json.dumps(final), flush=True)\n"
+        )
+        wrapper = ModelWrapper(auto_warmup=False)
+        wrapper._worker_argv = lambda: [sys.executable, "-c", script]
+        wrapper._ready_modes.add("mixed")
+        try:
+            partials = []
+            result = wrapper.predict_result(_nonblank_test_image(), model_name="mathcraft_mixed", on_partial=partials.append)
+            self.assertEqual([block["text"] for block in partials], ["part-0", "part-1"])
+            self.assertEqual(result["text"], "done")
+            self.assertTrue(result["stream"])
+            self.assertEqual(wrapper._event_handlers, {})
+
+            plain = wrapper.predict_result(_nonblank_test_image(), model_name="mathcraft_mixed")
+            self.assertIsNone(plain["stream"])
+            self.assertEqual(len(partials), 2)
+        finally:
+            wrapper._stop_mathcraft_worker()
+
+    def test_model_wrapper_pool_spreads_requests_across_worker_processes(self):
+        import threading
+
+        from backend.model import ModelWrapper, resolve_mathcraft_pool_size
+
+        self.assertEqual(resolve_mathcraft_pool_size("3"), 3)
+        self.assertEqual(resolve_mathcraft_pool_size("bad"), 1)
+        self.assertGreaterEqual(resolve_mathcraft_pool_size(0), 1)
+
+        script = (
+            "import json, os, sys, time\n"
+            "for line in sys.stdin:\n"
+            "    request = json.loads(line)\n"
+            "    if request['action'] == 'shutdown':\n"
+            "        break\n"
+            "    time.sleep(0.3)\n"
+            "    print(json.dumps({'id': request['id'], 'ok': True, 'result': {'pid': os.getpid()}}), flush=True)\n"
+        )
+        wrapper = ModelWrapper(auto_warmup=False)
+        wrapper.set_pool_size(2)
+        self.assertIn("intra=", wrapper._worker_argv()[-1])
+        wrapper._worker_argv = lambda: [sys.executable, "-c", script]
+        try:
+            pids = []
+
+            def _send():
+                pids.append(wrapper._send_worker_request({"action": "echo"}, timeout_sec=30.0)["pid"])
+
+            threads = [threading.Thread(target=_send) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=30.0)
+            self.assertEqual(len(set(pids)), 2)
+            self.assertEqual(len(wrapper._pool_workers), 1)
+        finally:
+            wrapper._stop_mathcraft_worker()
+        self.assertEqual(wrapper._pool_workers, [])
+
+    def test_model_wrapper_pool_keeps_total_ort_threads_within_cores(self):
+        from backend.model import ModelWrapper
+        from mathcraft_ocr.providers import ProviderInfo
+        from mathcraft_ocr.runtime import MathCraftRuntime
+        from mathcraft_ocr.session_options import parse_session_options
+
+        cpu = ProviderInfo((), "CPUExecutionProvider", "cpu", False, False, False)
+        with mock.patch("os.cpu_count", return_value=16), tempfile.TemporaryDirectory() as d:
+            for pool_size in (2, 3, 4):
+                wrapper = ModelWrapper(auto_warmup=False)
+                wrapper.set_pool_size(pool_size)
+                intra = int(re.search(r"intra=(\d+)", wrapper._worker_argv()[-1]).group(1))
+                env = wrapper._build_subprocess_env()
+                runtime = MathCraftRuntime(
+                    cache_dir=d,
+                    session_options=parse_session_options(f"intra={intra}"),
+                    mixed_pipeline_mode=env.get("MATHCRAFT_MIXED_PIPELINE"),
+                )
+                sessions = 2 if runtime._use_concurrent_mixed_pipeline(cpu) else 1
+                self.assertLessEqual(pool_size * sessions * intra, 16)
+
+    def test_model_wrapper_pool_warms_every_worker_process(self):
+        from backend.model import ModelWrapper
+
+        with tempfile.TemporaryDirectory() as d:
+            log_path = Path(d) / "warmups.txt"
+            script = (
+                "import json, os, sys\n"
+                "for line in sys.stdin:\n"
+                "    request = json.loads(line)\n"
+                "    if request['action'] == 'shutdown':\n"
+                "        break\n"
+                "    if request['action'] == 'warmup':\n"
+                f"        with open({str(log_path)!r}, 'a', encoding='utf-8') as fh:\n"
+                "            fh.write(f\"{os.getpid()} {request['profile']}\\n\")\n"
+                "    print(json.dumps({'id': request['id'], 'ok': True, 'result': {'ready': True}}), flush=True)\n"
+            )
+            wrapper = ModelWrapper(auto_warmup=False)
+            wrapper.set_pool_size(2)
+            wrapper._worker_argv = lambda: [sys.executable, "-c", script]
+            try:
+                self.assertTrue(wrapper._lazy_load_mathcraft("mathcraft"))
+                first = log_path.read_text(encoding="utf-8").split()
+                self.assertEqual(len(set(first[0::2])), 2)
+                self.assertEqual(set(first[1::2]), {"formula"})
+
+                member = wrapper._pool_workers[0][0]
+                member.kill()
+                member.wait(timeout=10.0)
+                wrapper._worker_slots()
+                respawned = wrapper._pool_workers[0][0]
+                deadline = time.monotonic() + 10.0
+                while f"{respawned.pid} formula" not in log_path.read_text(encoding="utf-8"):
+                    self.assertLess(time.monotonic(), deadline)
+                    time.sleep(0.05)
+            finally:
+                wrapper._stop_mathcraft_worker()
+
     def test_model_wrapper_predict_empty_hint_has_no_render_brackets(self):
         from backend.model import ModelWrapper
 
@@ -3,23 +3,44 @@
 
 from __future__ import annotations
 
+import json
 import sys
 import os
 import tempfile
+import threading
+import time
+import weakref
 from collections.abc import Callable
+from dataclasses import replace
 from pathlib import Path
 
 import numpy as np
+import pytest
+from PIL import Image
 
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 from mathcraft_ocr.manifest import load_manifest
+from mathcraft_ocr.batching import (
+    FormulaBatchPolicy,
+    formula_batch_policy_from_env,
+    plan_formula_batches,
+    run_in_batches,
+)
+from mathcraft_ocr.cli import main as cli_main
+from mathcraft_ocr.doctor import read_doctor_snapshot
 import mathcraft_ocr.hardware as hardware_mod
 import mathcraft_ocr.runtime as runtime_mod
+import mathcraft_ocr.result_cache as result_cache_mod
+import mathcraft_ocr.adapters.common as adapters_common_mod
+import mathcraft_ocr.adapters.formula_detector as formula_detector_mod
+import mathcraft_ocr.adapters.formula_processor as formula_processor_mod
+import mathcraft_ocr.adapters.formula_recognizer as formula_recognizer_mod
 import mathcraft_ocr.adapters.text_recognizer as text_recognizer_mod
-from mathcraft_ocr.errors import ModelCacheError
+from mathcraft_ocr.cancellation import CancelToken, cancellation_scope, raise_if_cancelled
+from mathcraft_ocr.errors import MathCraftError, ModelCacheError, RecognitionCancelled
 from mathcraft_ocr.adapters.formula_detector import FormulaBox
 from mathcraft_ocr.formula_lines import (
     compose_aligned_formula,
@@ -28,19 +49,27 @@ from mathcraft_ocr.formula_lines import (
     split_formula_line_groups,
 )
 from mathcraft_ocr.hardware import HardwareInfo, choose_rec_batch_num
-from mathcraft_ocr.image import load_image_rgb
+from mathcraft_ocr.image import load_image_rgb, rgb_to_bgr
 from mathcraft_ocr.latex_quality import latex_quality_flags
 from mathcraft_ocr.layout import (
+    ImageBoxStats,
     annotate_blocks,
+    group_blocks_into_lines,
     is_informative_ocr_box,
+    mask_boxes,
     merge_blocks_text,
     resolve_formula_text_conflicts,
     split_text_box_around_formulas,
+    xyxy_to_box,
 )
 from mathcraft_ocr.providers import ProviderInfo
 from mathcraft_ocr.results import FormulaRecognitionResult, MathCraftBlock, MixedRecognitionResult
-from mathcraft_ocr.serialization import block_to_json, provider_info_to_json
-from mathcraft_ocr.cache import resolve_model_roots
+from mathcraft_ocr.result_cache import FormulaResultCache, FormulaResultCachePolicy
+from mathcraft_ocr.serialization import block_to_json, provider_info_to_json, warmup_plan_to_json
+from mathcraft_ocr.session_options import SessionOptionsProfile, parse_session_options
+from mathcraft_ocr.spatial import BoxGrid
+from mathcraft_ocr.cache import inspect_model_cache, resolve_model_roots
+from mathcraft_ocr.transport import SharedImageWriter
 from mathcraft_ocr.runtime import (
     FORMULA_MAX_NEW_TOKENS,
     FORMULA_DETECTOR_ID,
@@ -49,7 +78,7 @@ from mathcraft_ocr.runtime import (
     TEXT_DETECTOR_ID,
     TEXT_RECOGNIZER_ID,
 )
-from mathcraft_ocr.worker import MathCraftWorker
+from mathcraft_ocr.worker import MathCraftWorker, RequestDispatcher, worker_concurrency_from_env
 
 
 def _touch(path: Path, content: bytes = b"x") -> None:
@@ -90,6 +119,124 @@ def _synthetic_matrix_like_wide_line_image() -> np.ndarray:
     return image
 
 
+class _FakeNodeArg:
+    def __init__(self, name: str, shape=None, type_name: str = "tensor(float)") -> None:
+        self.name = name
+        self.shape = shape or []
+        self.type = type_name
+
+
+class _FakeFormulaTokenizer:
+    bos_token_id = 2
+    eos_token_id = 7
+
+    def decode(self, ids, skip_special_tokens=True):
+        _ = skip_special_tokens
+        return " ".join(f"t{token}" for token in ids)
+
+
+class _FakeFormulaProcessor:
+    tokenizer = _FakeFormulaTokenizer()
+
+    def __call__(self, images, return_tensors="np"):
+        _ = return_tensors
+        pixel_values = np.zeros((len(images), 3, 4, 4), dtype=np.float32)
+        for index, image in enumerate(images):
+            pixel_values[index] = float(image.width)
+        return {"pixel_values": pixel_values}
+
+
+def _fake_next_token_logits(
+    last_tokens: np.ndarray,
+    encoder_hidden_states: np.ndarray,
+    vocab_size: int = 8,
+) -> np.ndarray:
+    logits = np.zeros((len(last_tokens), vocab_size), dtype=np.float32)
+    limits = encoder_hidden_states[:, 0, 0].astype(np.int64)
+    for row, token in enumerate(last_tokens.tolist()):
+        next_token = int(token) + 1
+        logits[row, next_token if next_token < min(int(limits[row]), vocab_size) else vocab_size - 1] = 5.0
+    return logits
+
+
+class _FakeEncoderSession:
+    def get_inputs(self):
+        return [_FakeNodeArg("pixel_values")]
+
+    def run(self, _outputs, feeds):
+        pixel_values = feeds["pixel_values"]
+        return [pixel_values[:, 0, :3, :].copy()]
+
+
+class _FakeFullDecoderSession:
+    def __init__(self) -> None:
+        self.input_lengths: list[int] = []
+        self.batch_sizes: list[int] = []
+
+    def get_inputs(self):
+        return [_FakeNodeArg("input_ids"), _FakeNodeArg("encoder_hidden_states")]
+
+    def get_outputs(self):
+        return [_FakeNodeArg("logits")]
+
+    def run(self, _outputs, feeds):
+        input_ids = feeds["input_ids"]
+        states = feeds["encoder_hidden_states"]
+        assert states.shape[0] == input_ids.shape[0]
+        self.input_lengths.append(int(input_ids.shape[1]))
+        self.batch_sizes.append(int(input_ids.shape[0]))
+        logits = np.stack(
+            [_fake_next_token_logits(input_ids[:, col], states) for col in range(input_ids.shape[1])],
+            axis=1,
+        )
+        return [logits]
+
+
+class _FakeMergedDecoderSession:
+    def __init__(self) -> None:
+        self.input_lengths: list[int] = []
+        self.past_lengths: list[int] = []
+
+    def get_inputs(self):
+        return [
+            _FakeNodeArg("input_ids"),
+            _FakeNodeArg("encoder_hidden_states"),
+            _FakeNodeArg("past_key_values.0.decoder.key", ["batch", 2, "past", 4]),
+            _FakeNodeArg("use_cache_branch", [1], "tensor(bool)"),
+        ]
+
+    def get_outputs(self):
+        return [_FakeNodeArg("logits"), _FakeNodeArg("present.0.decoder.key")]
+
+    def run(self, _outputs, feeds):
+        input_ids = feeds["input_ids"]
+        past = feeds["past_key_values.0.decoder.key"]
+        self.input_lengths.append(int(input_ids.shape[1]))
+        self.past_lengths.append(int(past.shape[2]))
+        batch = input_ids.shape[0]
+        assert past.shape[0] == batch
+        present = np.concatenate(
+            [past, np.zeros((batch, 2, input_ids.shape[1], 4), dtype=np.float32)],
+            axis=2,
+        )
+        logits = _fake_next_token_logits(input_ids[:, -1], feeds["encoder_hidden_states"])[:, np.newaxis, :]
+        return [logits, present]
+
+
+def _fake_formula_model_dir(root: Path, *, merged: bool) -> Path:
+    model_dir = root / FORMULA_RECOGNIZER_ID
+    model_dir.mkdir(parents=True, exist_ok=True)
+    (model_dir / "generation_config.json").write_text(
+        '{"decoder_start_token_id": 2, "eos_token_id": 7}',
+        encoding="utf-8",
+    )
+    _touch(model_dir / "encoder_model.onnx")
+    _touch(model_dir / "decoder_model.onnx")
+    if merged:
+        _touch(model_dir / "decoder_model_merged.onnx")
+    return model_dir
+
+
 def test_manifest_loads_expected_models() -> None:
     manifest = load_manifest()
     expected = {
@@ -113,6 +260,46 @@ def test_cache_inspection_marks_incomplete_model() -> None:
         assert "decoder_model.onnx" in state.missing_files
 
 
+def test_runtime_info_caches_providers_and_tracks_model_dir_changes(monkeypatch, capsys) -> None:
+    manifest = load_manifest()
+    probes: list[str] = []
+
+    def _fake_detect_providers(prefer: str = "auto") -> ProviderInfo:
+        probes.append(prefer)
+        return _cpu_provider_info()
+
+    monkeypatch.setattr(runtime_mod, "detect_providers", _fake_detect_providers)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _touch(root / FORMULA_RECOGNIZER_ID / "encoder_model.onnx")
+        runtime = MathCraftRuntime(cache_dir=root, manifest=manifest, provider_preference="cpu")
+        first = runtime.get_runtime_info()
+        assert runtime.get_runtime_info() is first
+        assert runtime.doctor(cached=True) is first
+        assert first.cache_states[FORMULA_RECOGNIZER_ID].complete is False
+
+        time.sleep(0.05)
+        _touch_model(root, manifest, FORMULA_RECOGNIZER_ID)
+        second = runtime.doctor()
+        assert second is not first
+        assert second.cache_states[FORMULA_RECOGNIZER_ID].complete is True
+        assert probes == ["cpu"]
+
+        snapshot = read_doctor_snapshot(root)
+        assert snapshot["cache_states"][FORMULA_RECOGNIZER_ID]["complete"] is True
+        monkeypatch.setenv("MATHCRAFT_HOME", str(root))
+        assert cli_main(["doctor", "--cached"]) == 0
+        assert json.loads(capsys.readouterr().out) == snapshot
+        assert probes == ["cpu"]
+
+        worker = MathCraftWorker(runtime=runtime)
+        response = worker.handle({"id": "d", "action": "doctor", "cached": True})
+        assert response["result"]["cache_states"][FORMULA_RECOGNIZER_ID]["complete"] is True
+        assert probes == ["cpu"]
+        worker.handle({"id": "r", "action": "doctor", "refresh": True})
+        assert probes == ["cpu", "cpu"]
+
+
 def test_formula_warmup_plan_reports_missing_models() -> None:
     manifest = load_manifest()
     with tempfile.TemporaryDirectory() as tmp:
@@ -154,8 +341,8 @@ def test_warmup_auto_downloads_missing_models_before_handlers() -> None:
     try:
         runtime_mod.download_model_archive = _fake_download
         runtime_mod.ONNX_WARMUP_HANDLERS = {
-            FORMULA_DETECTOR_ID: lambda model_dir, provider_info: warmed.append(Path(model_dir).name),
-            FORMULA_RECOGNIZER_ID: lambda model_dir, provider_info: warmed.append(Path(model_dir).name),
+            FORMULA_DETECTOR_ID: lambda model_dir, provider_info, **_kwargs: warmed.append(Path(model_dir).name),
+            FORMULA_RECOGNIZER_ID: lambda model_dir, provider_info, **_kwargs: warmed.append(Path(model_dir).name),
             TEXT_DETECTOR_ID: old_handlers[TEXT_DETECTOR_ID],
             TEXT_RECOGNIZER_ID: old_handlers[TEXT_RECOGNIZER_ID],
         }
@@ -216,10 +403,10 @@ def test_formula_warmup_succeeds_with_stubbed_onnx_handlers() -> None:
     old_handlers = dict(runtime_mod.ONNX_WARMUP_HANDLERS)
     calls = []
     runtime_mod.ONNX_WARMUP_HANDLERS = {
-        FORMULA_DETECTOR_ID: lambda model_dir, provider_info: calls.append(
+        FORMULA_DETECTOR_ID: lambda model_dir, provider_info, **_kwargs: calls.append(
             ("mfd", Path(model_dir).name)
         ),
-        FORMULA_RECOGNIZER_ID: lambda model_dir, provider_info: calls.append(
+        FORMULA_RECOGNIZER_ID: lambda model_dir, provider_info, **_kwargs: calls.append(
             ("mfr", Path(model_dir).name)
         ),
         TEXT_DETECTOR_ID: old_handlers[TEXT_DETECTOR_ID],
@@ -246,10 +433,10 @@ def test_successful_warmup_plan_is_cached_per_profile() -> None:
     old_handlers = dict(runtime_mod.ONNX_WARMUP_HANDLERS)
     calls = []
     runtime_mod.ONNX_WARMUP_HANDLERS = {
-        FORMULA_DETECTOR_ID: lambda model_dir, provider_info: calls.append(
+        FORMULA_DETECTOR_ID: lambda model_dir, provider_info, **_kwargs: calls.append(
             ("mfd", Path(model_dir).name)
         ),
-        FORMULA_RECOGNIZER_ID: lambda model_dir, provider_info: calls.append(
+        FORMULA_RECOGNIZER_ID: lambda model_dir, provider_info, **_kwargs: calls.append(
             ("mfr", Path(model_dir).name)
         ),
         TEXT_DETECTOR_ID: old_handlers[TEXT_DETECTOR_ID],
@@ -273,16 +460,484 @@ def test_successful_warmup_plan_is_cached_per_profile() -> None:
         runtime_mod.ONNX_WARMUP_HANDLERS = old_handlers
 
 
+def _stub_formula_warmup_handlers(monkeypatch, calls: list) -> None:
+    handlers = dict(runtime_mod.ONNX_WARMUP_HANDLERS)
+    handlers[FORMULA_DETECTOR_ID] = lambda model_dir, provider_info, **_kwargs: calls.append(("mfd", Path(model_dir).name))
+    handlers[FORMULA_RECOGNIZER_ID] = lambda model_dir, provider_info, **_kwargs: calls.append(("mfr", Path(model_dir).name))
+    monkeypatch.setattr(runtime_mod, "ONNX_WARMUP_HANDLERS", handlers)
+
+
+def _stub_all_warmup_handlers(monkeypatch, calls: list) -> None:
+    monkeypatch.setattr(
+        runtime_mod,
+        "ONNX_WARMUP_HANDLERS",
+        {
+            model_id: (lambda model_dir, provider_info, model_id=model_id, **_kwargs: calls.append(("session", model_id)))
+            for model_id in (FORMULA_DETECTOR_ID, FORMULA_RECOGNIZER_ID, TEXT_DETECTOR_ID, TEXT_RECOGNIZER_ID)
+        },
+    )
+
+
+def test_deep_warmup_runs_each_model_once_on_representative_inputs(monkeypatch) -> None:
+    manifest = load_manifest()
+    calls: list = []
+    _stub_all_warmup_handlers(monkeypatch, calls)
+    monkeypatch.setattr(
+        runtime_mod,
+        "detect_formula_boxes",
+        lambda image, model_dir, provider_info, **_kwargs: calls.append(("mfd", image.shape)) or (),
+    )
+    monkeypatch.setattr(
+        runtime_mod,
+        "detect_text_boxes",
+        lambda image, model_dir, provider_info, **_kwargs: calls.append(("det", image.shape)) or (np.zeros((0, 4, 2)), ()),
+    )
+    monkeypatch.setattr(
+        runtime_mod,
+        "recognize_pp_text_lines",
+        lambda crops, model_dir, provider_info, **kwargs: calls.append(("rec", len(crops))) or [("", 0.0)] * len(crops),
+    )
+
+    def _recognize_formulas(images, model_dir, provider_info, **kwargs):
+        calls.append(("mfr", tuple(image.shape[1] for image in images), kwargs["max_new_tokens"]))
+        return [("x", 0.9)] * len(images)
+
+    monkeypatch.setattr(runtime_mod, "recognize_formula_images", _recognize_formulas)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        for model_id in (FORMULA_DETECTOR_ID, FORMULA_RECOGNIZER_ID, TEXT_DETECTOR_ID, TEXT_RECOGNIZER_ID):
+            _touch_model(root, manifest, model_id)
+        runtime = MathCraftRuntime(cache_dir=root, manifest=manifest, provider_preference="cpu")
+        shallow = runtime.warmup("formula")
+        assert [call for call in calls if call[0] != "session"] == []
+
+        plan = runtime.warmup("formula", deep=True)
+        formula_calls = [call for call in calls if call[0] == "mfr"]
+        assert [call[1] for call in formula_calls] == [(96,), (320,), (768,), (96, 320, 768)]
+        assert all(call[2] == runtime_mod.DEEP_WARMUP_MAX_NEW_TOKENS for call in formula_calls)
+        assert ("mfd", (1754, 1240, 3)) in calls
+        assert plan.ready and plan.deep_warmup_seconds >= 0.0
+        assert shallow.deep_warmup_seconds == 0.0
+
+        calls.clear()
+        runtime.warmup("formula", deep=True)
+        runtime.warmup("mixed", deep=True)
+        assert sorted(call[0] for call in calls if call[0] != "session") == ["det", "rec"]
+        assert runtime.formula_result_cache_stats().misses == 0
+
+
+def test_background_prewarm_does_not_block_warm_profiles(monkeypatch) -> None:
+    import threading
+
+    manifest = load_manifest()
+    calls: list = []
+    release = threading.Event()
+    _stub_all_warmup_handlers(monkeypatch, calls)
+    handlers = dict(runtime_mod.ONNX_WARMUP_HANDLERS)
+    handlers[TEXT_RECOGNIZER_ID] = lambda model_dir, provider_info, **_kwargs: release.wait(5.0)
+    monkeypatch.setattr(runtime_mod, "ONNX_WARMUP_HANDLERS", handlers)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _touch_model(root, manifest, FORMULA_DETECTOR_ID)
+        _touch_model(root, manifest, FORMULA_RECOGNIZER_ID)
+        runtime = MathCraftRuntime(cache_dir=root, manifest=manifest, provider_preference="cpu")
+        formula = runtime.warmup("formula")
+        assert runtime.prewarm_in_background("mixed") is False
+
+        _touch_model(root, manifest, TEXT_DETECTOR_ID)
+        _touch_model(root, manifest, TEXT_RECOGNIZER_ID)
+        assert runtime.prewarm_in_background("mixed") is True
+        assert runtime.prewarm_in_background("mixed") is False
+        assert runtime.warmup("formula") is formula
+        release.set()
+        runtime._prewarm_thread.join(5.0)
+        assert runtime.warmup("mixed").ready is True
+        assert ("session", TEXT_DETECTOR_ID) in calls
+        assert runtime.prewarm_in_background("mixed") is False
+
+
+def test_int8_precision_warms_side_by_side_variant_cache(monkeypatch) -> None:
+    manifest = load_manifest()
+    variant = manifest.models[FORMULA_RECOGNIZER_ID].variant("int8")
+    assert variant is not None and variant.precision == "int8"
+    assert variant.dir_name == f"{FORMULA_RECOGNIZER_ID}.int8"
+    assert manifest.models[FORMULA_DETECTOR_ID].variant("int8") is None
+    calls: list = []
+    _stub_formula_warmup_handlers(monkeypatch, calls)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _touch_model(root, manifest, FORMULA_DETECTOR_ID)
+        _touch_model(root, manifest, FORMULA_RECOGNIZER_ID)
+        for file_spec in variant.files:
+            _touch(root / variant.dir_name / file_spec.path)
+        with pytest.raises(MathCraftError):
+            MathCraftRuntime(cache_dir=root, manifest=manifest, precision="fp16")
+        runtime = MathCraftRuntime(
+            cache_dir=root,
+            manifest=manifest,
+            provider_preference="cpu",
+            auto_download=False,
+            precision="int8",
+        )
+        plan = runtime.warmup("formula")
+        assert plan.ready is True
+        assert calls == [("mfd", FORMULA_DETECTOR_ID), ("mfr", variant.dir_name)]
+        assert runtime.model_precisions()[FORMULA_DETECTOR_ID] == "fp32"
+        assert runtime.model_precisions()[FORMULA_RECOGNIZER_ID] == "int8"
+        fp32_states = MathCraftRuntime(cache_dir=root, manifest=manifest, precision="fp32").check_models()
+        assert fp32_states[FORMULA_RECOGNIZER_ID].model_dir == root / FORMULA_RECOGNIZER_ID
+
+
+def test_int8_precision_falls_back_to_fp32_without_variant_source(monkeypatch) -> None:
+    manifest = load_manifest()
+    calls: list = []
+    _stub_formula_warmup_handlers(monkeypatch, calls)
+
+    def _unexpected_download(spec, **kwargs):
+        raise AssertionError(f"unexpected download for {spec.dir_name}")
+
+    monkeypatch.setattr(runtime_mod, "download_model_archive", _unexpected_download)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _touch_model(root, manifest, FORMULA_DETECTOR_ID)
+        _touch_model(root, manifest, FORMULA_RECOGNIZER_ID)
+        runtime = MathCraftRuntime(cache_dir=root, manifest=manifest, provider_preference="cpu", precision="int8")
+        plan = runtime.warmup("formula")
+        assert plan.ready is True
+        assert ("mfr", FORMULA_RECOGNIZER_ID) in calls
+        assert runtime.model_precisions()[FORMULA_RECOGNIZER_ID] == "fp32"
+        assert any("no int8 variant available" in event for event in plan.cache_events)
+
+
+def test_formula_recognition_after_warmup_does_not_scan_model_cache(monkeypatch) -> None:
+    manifest = load_manifest()
+    calls: list = []
+    seen_dirs: list[Path] = []
+    _stub_formula_warmup_handlers(monkeypatch, calls)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _touch_model(root, manifest, FORMULA_DETECTOR_ID)
+        _touch_model(root, manifest, FORMULA_RECOGNIZER_ID)
+        runtime = MathCraftRuntime(cache_dir=root, manifest=manifest, provider_preference="cpu")
+        assert runtime.warmup("formula").ready is True
+
+        def _no_scan(*args, **kwargs):
+            raise AssertionError("model cache was scanned after warmup")
+
+        def _fake_recognize(image, model_dir, provider_info, max_new_tokens=256, **kwargs):
+            seen_dirs.append(Path(model_dir))
+            return ("x", 0.9)
+
+        monkeypatch.setattr(runtime_mod, "recognize_formula_image", _fake_recognize)
+        with monkeypatch.context() as scan_guard:
+            scan_guard.setattr(runtime_mod, "inspect_manifest_roots", _no_scan)
+            scan_guard.setattr(Path, "glob", _no_scan)
+            scan_guard.setattr(Path, "rglob", _no_scan)
+            scan_guard.setattr(os, "scandir", _no_scan)
+            scan_guard.setattr(os, "listdir", _no_scan)
+            result = runtime.recognize_formula(np.full((32, 64, 3), 255, dtype=np.uint8))
+
+    assert result.text == "x"
+    assert seen_dirs == [root / FORMULA_RECOGNIZER_ID]
+    assert len(calls) == 2
+
+
+def test_warmup_re_resolves_models_when_files_change(monkeypatch) -> None:
+    manifest = load_manifest()
+    calls: list = []
+    _stub_formula_warmup_handlers(monkeypatch, calls)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _touch_model(root, manifest, FORMULA_DETECTOR_ID)
+        _touch_model(root, manifest, FORMULA_RECOGNIZER_ID)
+        runtime = MathCraftRuntime(cache_dir=root, manifest=manifest, provider_preference="cpu")
+        first = runtime.warmup("formula")
+        assert runtime.warmup("formula") is first
+        detector_file = manifest.models[FORMULA_DETECTOR_ID].files[0].path
+        _touch(root / FORMULA_DETECTOR_ID / detector_file, b"replaced model")
+        second = runtime.warmup("formula")
+
+    assert second is not first
+    assert second.ready is True
+    assert calls.count(("mfd", FORMULA_DETECTOR_ID)) == 2
+    assert any("re-resolving" in event for event in second.cache_events)
+
+
+def test_formula_detector_model_lookup_is_cached_until_invalidated(monkeypatch) -> None:
+    globs: list[str] = []
+    original_glob = Path.glob
+
+    def _counting_glob(self, pattern):
+        globs.append(pattern)
+        return original_glob(self, pattern)
+
+    monkeypatch.setattr(Path, "glob", _counting_glob)
+    with tempfile.TemporaryDirectory() as tmp:
+        _touch(Path(tmp) / "mathcraft-mfd.onnx")
+        formula_detector_mod.clear_formula_detector_cache()
+        first = formula_detector_mod._find_detector_model(tmp)
+        second = formula_detector_mod._find_detector_model(tmp)
+        runtime_mod.ModelRegistry().invalidate()
+        third = formula_detector_mod._find_detector_model(tmp)
+
+    assert first == second == third
+    assert globs == ["*mfd*.onnx", "*mfd*.onnx"]
+
+
+def test_invalidating_one_model_keeps_sessions_of_the_others(monkeypatch) -> None:
+    manifest = load_manifest()
+    fake_ort = _FakeOrt()
+    monkeypatch.setattr(adapters_common_mod, "_ort", lambda: fake_ort)
+    provider = _cpu_provider_info()
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        registry = runtime_mod.ModelRegistry()
+        paths = {}
+        for model_id in (FORMULA_DETECTOR_ID, TEXT_DETECTOR_ID):
+            spec = manifest.models[model_id]
+            _touch_model(root, manifest, model_id)
+            registry.register(spec, root / spec.dir_name)
+            paths[model_id] = root / spec.dir_name / spec.files[0].path
+        adapters_common_mod.clear_session_cache()
+        try:
+            kept = adapters_common_mod.create_session(paths[TEXT_DETECTOR_ID], provider)
+            adapters_common_mod.create_session(paths[FORMULA_DETECTOR_ID], provider)
+            registry.invalidate((FORMULA_DETECTOR_ID,))
+
+            assert adapters_common_mod.create_session(paths[TEXT_DETECTOR_ID], provider) is kept
+            adapters_common_mod.create_session(paths[FORMULA_DETECTOR_ID], provider)
+        finally:
+            adapters_common_mod.clear_session_cache()
+
+    assert [name for name, _level, _threads in fake_ort.loads] == [
+        paths[TEXT_DETECTOR_ID].name,
+        paths[FORMULA_DETECTOR_ID].name,
+        paths[FORMULA_DETECTOR_ID].name,
+    ]
+
+
+class _FakeOrtSessionOptions:
+    def __init__(self) -> None:
+        self.intra_op_num_threads = 0
+        self.inter_op_num_threads = 0
+        self.execution_mode = None
+        self.graph_optimization_level = None
+        self.optimized_model_filepath = ""
+
+
+class _FakeOrt:
+    __version__ = "test"
+    SessionOptions = _FakeOrtSessionOptions
+
+    class GraphOptimizationLevel:
+        ORT_DISABLE_ALL = "disable"
+        ORT_ENABLE_BASIC = "basic"
+        ORT_ENABLE_EXTENDED = "extended"
+        ORT_ENABLE_ALL = "all"
+
+    class ExecutionMode:
+        ORT_SEQUENTIAL = "sequential"
+        ORT_PARALLEL = "parallel"
+
+    def __init__(self) -> None:
+        self.loads: list[tuple[str, str, int]] = []
+        ort = self
+
+        class _Session:
+            def __init__(self, model_path, sess_options=None, providers=None) -> None:
+                ort.loads.append(
+                    (Path(model_path).name, sess_options.graph_optimization_level, sess_options.intra_op_num_threads)
+                )
+                if sess_options.optimized_model_filepath:
+                    Path(sess_options.optimized_model_filepath).write_bytes(b"optimized")
+                self._providers = list(providers or [])
+
+            def get_providers(self):
+                return self._providers
+
+        self.InferenceSession = _Session
+
+
+def test_optimized_graph_cache_builds_from_two_threads_use_separate_temp_files(monkeypatch) -> None:
+    fake_ort = _FakeOrt()
+    temp_paths: list[str] = []
+    barrier = threading.Barrier(2, timeout=5)
+    base_session = fake_ort.InferenceSession
+
+    class _SlowSession(base_session):
+        def __init__(self, model_path, sess_options=None, providers=None) -> None:
+            if sess_options.optimized_model_filepath:
+                temp_paths.append(sess_options.optimized_model_filepath)
+                barrier.wait()
+            super().__init__(model_path, sess_options=sess_options, providers=providers)
+
+    fake_ort.InferenceSession = _SlowSession
+    monkeypatch.setattr(adapters_common_mod, "_ort", lambda: fake_ort)
+    build = adapters_common_mod._create_session_cached.__wrapped__
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = Path(tmp) / "model" / "mathcraft-mfd.onnx"
+        _touch(model_path)
+        options = SessionOptionsProfile(optimized_cache_dir=str(Path(tmp) / "optimized"))
+        threads = [
+            threading.Thread(target=build, args=(str(model_path), ("CPUExecutionProvider",), options))
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        cached = sorted(path.name for path in (Path(tmp) / "optimized").rglob("*.onnx"))
+
+    assert len(set(temp_paths)) == 2
+    assert len(cached) == 1 and ".tmp" not in cached[0]
+
+
+def test_optimized_graph_cache_keeps_other_providers_until_the_source_changes(monkeypatch) -> None:
+    monkeypatch.setattr(adapters_common_mod, "_ort", lambda: _FakeOrt())
+    build = adapters_common_mod._create_session_cached.__wrapped__
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = Path(tmp) / "model" / "mathcraft-mfd.onnx"
+        _touch(model_path)
+        cache_dir = Path(tmp) / "optimized"
+        options = SessionOptionsProfile(optimized_cache_dir=str(cache_dir))
+        build(str(model_path), ("CPUExecutionProvider",), options)
+        build(str(model_path), ("CUDAExecutionProvider", "CPUExecutionProvider"), options)
+        build(str(model_path), ("CPUExecutionProvider",), replace(options, graph_optimization="extended"))
+        assert len(list(cache_dir.rglob("*.onnx"))) == 3
+
+        stat = model_path.stat()
+        os.utime(model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        build(str(model_path), ("CPUExecutionProvider",), options)
+        assert len(list(cache_dir.rglob("*.onnx"))) == 1
+
+
+def test_session_options_spec_parses_threads_level_and_cache_switch() -> None:
+    options = parse_session_options("intra=4, inter=1, opt=extended, mode=parallel, cache=off")
+
+    assert options == SessionOptionsProfile(
+        intra_op_threads=4,
+        inter_op_threads=1,
+        graph_optimization="extended",
+        execution_mode="parallel",
+        optimized_cache=False,
+    )
+    for bad_spec in ("intra=-1", "opt=max", "threads=4", "intra"):
+        try:
+            parse_session_options(bad_spec)
+        except MathCraftError:
+            continue
+        raise AssertionError(f"expected {bad_spec!r} to be rejected")
+
+
+def test_warmup_reuses_optimized_graph_cache_on_later_starts(monkeypatch) -> None:
+    manifest = load_manifest()
+    fake_ort = _FakeOrt()
+    monkeypatch.setattr(adapters_common_mod, "_ort", lambda: fake_ort)
+    handlers = dict(runtime_mod.ONNX_WARMUP_HANDLERS)
+    handlers[FORMULA_DETECTOR_ID] = lambda model_dir, provider_info, session_options: adapters_common_mod.create_session(
+        Path(model_dir) / "mathcraft-mfd.onnx", provider_info, session_options
+    )
+    handlers[FORMULA_RECOGNIZER_ID] = lambda model_dir, provider_info, **_kwargs: None
+    monkeypatch.setattr(runtime_mod, "ONNX_WARMUP_HANDLERS", handlers)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _touch(root / FORMULA_DETECTOR_ID / "mathcraft-mfd.onnx")
+        _touch_model(root, manifest, FORMULA_RECOGNIZER_ID)
+        options = SessionOptionsProfile(intra_op_threads=3)
+        adapters_common_mod.clear_session_cache()
+        first = MathCraftRuntime(cache_dir=root, manifest=manifest, provider_preference="cpu", session_options=options)
+        first_plan = first.warmup("formula")
+        adapters_common_mod.clear_session_cache()
+        second = MathCraftRuntime(cache_dir=root, manifest=manifest, provider_preference="cpu", session_options=options)
+        second_plan = second.warmup("formula")
+        cached_models = sorted(path.name for path in (root / ".ort-optimized").rglob("*.onnx"))
+        adapters_common_mod.clear_session_cache()
+
+    assert first_plan.ready is True and second_plan.ready is True
+    assert first_plan.optimized_cache_hits == 0
+    assert second_plan.optimized_cache_hits == 1
+    assert warmup_plan_to_json(second_plan)["optimized_cache_hits"] == 1
+    assert fake_ort.loads[0] == ("mathcraft-mfd.onnx", "all", 3)
+    assert fake_ort.loads[1][1:] == ("disable", 3)
+    assert fake_ort.loads[1][0] == cached_models[0]
+    assert len(cached_models) == 1
+
+
+def test_runtimes_in_one_process_keep_their_own_session_options(monkeypatch) -> None:
+    manifest = load_manifest()
+    seen: list[int] = []
+    handlers = dict(runtime_mod.ONNX_WARMUP_HANDLERS)
+    handlers[FORMULA_DETECTOR_ID] = lambda model_dir, provider_info, session_options: seen.append(
+        session_options.intra_op_threads
+    )
+    handlers[FORMULA_RECOGNIZER_ID] = lambda model_dir, provider_info, **_kwargs: None
+    monkeypatch.setattr(runtime_mod, "ONNX_WARMUP_HANDLERS", handlers)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _touch_model(root, manifest, FORMULA_DETECTOR_ID)
+        _touch_model(root, manifest, FORMULA_RECOGNIZER_ID)
+        first, second = (
+            MathCraftRuntime(
+                cache_dir=root,
+                manifest=manifest,
+                provider_preference="cpu",
+                session_options=SessionOptionsProfile(intra_op_threads=threads),
+            )
+            for threads in (3, 5)
+        )
+        first.warmup("formula")
+        second.warmup("formula")
+        first.clear_warmup_cache()
+        first.warmup("formula")
+
+    assert seen == [3, 5, 3]
+
+
+def test_repaired_model_warms_with_the_runtime_session_options(monkeypatch) -> None:
+    manifest = load_manifest()
+    seen: list[int] = []
+
+    def _broken_then_ok(model_dir, provider_info, session_options):
+        seen.append(session_options.intra_op_threads)
+        if len(seen) == 1:
+            raise RuntimeError("Failed to load model: invalid protobuf")
+
+    handlers = dict(runtime_mod.ONNX_WARMUP_HANDLERS)
+    handlers[FORMULA_DETECTOR_ID] = _broken_then_ok
+    handlers[FORMULA_RECOGNIZER_ID] = lambda model_dir, provider_info, **_kwargs: None
+    monkeypatch.setattr(runtime_mod, "ONNX_WARMUP_HANDLERS", handlers)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _touch_model(root, manifest, FORMULA_DETECTOR_ID)
+        _touch_model(root, manifest, FORMULA_RECOGNIZER_ID)
+        runtime = MathCraftRuntime(
+            cache_dir=root,
+            manifest=manifest,
+            provider_preference="cpu",
+            session_options=SessionOptionsProfile(intra_op_threads=3),
+        )
+        monkeypatch.setattr(
+            runtime,
+            "_repair_model_cache",
+            lambda model_id: inspect_model_cache(root, manifest.models[model_id]),
+        )
+        plan = runtime.warmup("formula")
+
+    assert plan.ready is True
+    assert plan.component_statuses[0].detail == "repaired"
+    assert seen == [3, 3]
+
+
 def test_failed_warmup_plan_is_not_cached() -> None:
     manifest = load_manifest()
     old_handlers = dict(runtime_mod.ONNX_WARMUP_HANDLERS)
     calls = []
 
-    def _fail(model_dir, provider_info):
+    def _fail(model_dir, provider_info, **_kwargs):
         calls.append(Path(model_dir).name)
         raise RuntimeError("warmup failed")
 
-    def _ok(model_dir, provider_info):
+    def _ok(model_dir, provider_info, **_kwargs):
         return None
 
     runtime_mod.ONNX_WARMUP_HANDLERS = {
@@ -317,10 +972,10 @@ def test_cuda_warmup_failure_does_not_repair_model_cache() -> None:
         "onnxruntime_providers_cuda.dll"
     )
 
-    def _fail_with_cuda_runtime_error(model_dir, provider_info):
+    def _fail_with_cuda_runtime_error(model_dir, provider_info, **_kwargs):
         raise RuntimeError(cuda_detail)
 
-    def _ok(model_dir, provider_info):
+    def _ok(model_dir, provider_info, **_kwargs):
         return None
 
     def _download(*args, **kwargs):
@@ -527,6 +1182,47 @@ def test_formula_line_groups_still_split_regular_multiline_equations() -> None:
     assert len(groups) == 3
 
 
+def test_formula_line_groups_split_wide_rows_into_segments_with_page_boxes() -> None:
+    image = np.full((160, 1400, 3), 255, dtype=np.uint8)
+    image[20:44, 40:1360] = 0
+    image[100:124, 40:560] = 0
+    image[100:124, 820:1360] = 0
+
+    groups = split_formula_line_groups(image)
+
+    assert [len(group.crops) for group in groups] == [1, 2]
+    for group in groups:
+        for crop in group.crops:
+            left, top, right, bottom = crop.box
+            assert np.array_equal(crop.image, image[top:bottom, left:right])
+    first, second = groups[1].crops
+    assert first.box[2] <= 820 and second.box[0] >= 560
+
+
+def test_page_pixels_stay_shared_until_formula_masking() -> None:
+    pixels = np.zeros((40, 200, 3), dtype=np.uint8)
+    pixels[:, :, 0] = 200
+    rgb = load_image_rgb(Image.fromarray(pixels))
+    bgr = rgb_to_bgr(rgb)
+
+    assert np.shares_memory(rgb, bgr)
+    assert np.array_equal(bgr[:, :, 2], pixels[:, :, 0])
+
+    masked = mask_boxes(bgr, [xyxy_to_box(10, 10, 30, 20)], margin=0)
+
+    assert masked.flags.c_contiguous and not np.shares_memory(masked, rgb)
+    assert np.array_equal(masked[:, :, ::-1][:10], pixels[:10])
+    assert (masked[10:20, 10:30] == 255).all()
+    assert np.array_equal(rgb, pixels)
+
+    image = np.full((160, 1400, 3), 255, dtype=np.uint8)
+    image[20:44, 40:1360] = 0
+    image[100:124, 40:560] = 0
+    image[100:124, 820:1360] = 0
+    crops = [crop for group in split_formula_line_groups(image) for crop in group.crops]
+    assert crops and all(np.shares_memory(crop.image, image) for crop in crops)
+
+
 def test_formula_line_groups_keep_matrix_like_wide_line_whole() -> None:
     image = _sample_or_synthetic_image(
         "\u77e9\u96352.png",
@@ -554,6 +1250,438 @@ def test_latex_quality_flags_detect_repeated_and_duplicate_relation_artifacts()
     )
 
 
+def test_manifest_declares_optional_cached_decoder_exports() -> None:
+    manifest = load_manifest()
+    spec = manifest.models[FORMULA_RECOGNIZER_ID]
+    optional_paths = {item.path for item in spec.optional_files}
+    assert "decoder_model_merged.onnx" in optional_paths
+    assert "decoder_with_past_model.onnx" in optional_paths
+    assert not optional_paths & {item.path for item in spec.files}
+
+
+def test_formula_cached_decoding_matches_full_sequence_decoding(monkeypatch) -> None:
+    full_session = _FakeFullDecoderSession()
+    merged_session = _FakeMergedDecoderSession()
+    sessions = {
+        "encoder_model.onnx": _FakeEncoderSession(),
+        "decoder_model.onnx": full_session,
+        "decoder_model_merged.onnx": merged_session,
+    }
+    monkeypatch.setattr(formula_recognizer_mod, "_load_processor", lambda model_dir: _FakeFormulaProcessor())
+    monkeypatch.setattr(
+        formula_recognizer_mod,
+        "create_session",
+        lambda model_path, provider_info, session_options: sessions[Path(model_path).name],
+    )
+    images = [np.zeros((8, 8, 3), dtype=np.uint8), np.zeros((8, 8, 3), dtype=np.uint8)]
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = _fake_formula_model_dir(Path(tmp), merged=True)
+        stats = []
+        full = formula_recognizer_mod.recognize_formula_images(
+            images, model_dir, None, max_new_tokens=16, decode_mode="full", stats_callback=stats.append
+        )
+        cached = formula_recognizer_mod.recognize_formula_images(
+            images, model_dir, None, max_new_tokens=16, decode_mode="auto", stats_callback=stats.append
+        )
+
+    assert [text for text, _score in cached] == [text for text, _score in full]
+    assert full[0][0] == "t3 t4 t5 t6"
+    assert full_session.input_lengths == [1, 2, 3, 4, 5]
+    assert merged_session.input_lengths == [1, 1, 1, 1, 1]
+    assert merged_session.past_lengths == [0, 1, 2, 3, 4]
+    assert [item.mode for item in stats] == ["full", "cached"]
+    assert stats[1].generated_tokens == 8
+
+
+def test_formula_decoding_falls_back_to_full_sequence_for_old_caches(monkeypatch) -> None:
+    full_session = _FakeFullDecoderSession()
+    sessions = {
+        "encoder_model.onnx": _FakeEncoderSession(),
+        "decoder_model.onnx": full_session,
+    }
+    monkeypatch.setattr(formula_recognizer_mod, "_load_processor", lambda model_dir: _FakeFormulaProcessor())
+    monkeypatch.setattr(
+        formula_recognizer_mod,
+        "create_session",
+        lambda model_path, provider_info, session_options: sessions[Path(model_path).name],
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = _fake_formula_model_dir(Path(tmp), merged=False)
+        stats = []
+        text, _score = formula_recognizer_mod.recognize_formula_image(
+            np.zeros((8, 8, 3), dtype=np.uint8), model_dir, None, stats_callback=stats.append
+        )
+        try:
+            formula_recognizer_mod.recognize_formula_image(
+                np.zeros((8, 8, 3), dtype=np.uint8), model_dir, None, decode_mode="cached"
+            )
+        except FileNotFoundError:
+            pass
+        else:
+            raise AssertionError("cached decode mode requires a past-key-values export")
+
+    assert text == "t3 t4 t5 t6"
+    assert stats[0].mode == "full"
+
+
+def test_formula_decoding_drops_finished_rows_from_the_live_batch(monkeypatch) -> None:
+    sessions = {
+        "encoder_model.onnx": _FakeEncoderSession(),
+        "decoder_model.onnx": _FakeFullDecoderSession(),
+        "decoder_model_merged.onnx": _FakeMergedDecoderSession(),
+    }
+    monkeypatch.setattr(formula_recognizer_mod, "_load_processor", lambda model_dir: _FakeFormulaProcessor())
+    monkeypatch.setattr(
+        formula_recognizer_mod,
+        "create_session",
+        lambda model_path, provider_info, session_options: sessions[Path(model_path).name],
+    )
+    images = [
+        np.zeros((8, 8, 3), dtype=np.uint8),
+        np.zeros((8, 4, 3), dtype=np.uint8),
+        np.zeros((8, 5, 3), dtype=np.uint8),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = _fake_formula_model_dir(Path(tmp), merged=True)
+        full = formula_recognizer_mod.recognize_formula_images(
+            images, model_dir, None, max_new_tokens=16, decode_mode="full"
+        )
+        cached = formula_recognizer_mod.recognize_formula_images(
+            images, model_dir, None, max_new_tokens=16, decode_mode="cached"
+        )
+
+    assert [text for text, _score in full] == ["t3 t4 t5 t6", "t3", "t3 t4"]
+    assert [text for text, _score in cached] == [text for text, _score in full]
+    assert sessions["decoder_model.onnx"].batch_sizes == [3, 3, 2, 1, 1]
+
+
+def test_formula_greedy_pick_matches_softmax_probability() -> None:
+    logits = np.array([[0.5, 3.0, -1.0, 2.5], [10.0, -4.0, 9.0, 0.0]], dtype=np.float32)
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    probs = shifted / shifted.sum(axis=1, keepdims=True)
+
+    tokens, scores = formula_recognizer_mod._greedy_pick(logits)
+
+    assert tokens.tolist() == [1, 0]
+    assert tokens.dtype == np.int64
+    assert np.allclose(scores, probs[[0, 1], [1, 0]])
+
+
+class _FakeLatexTokenizer(_FakeFormulaTokenizer):
+    vocab = {3: "x", 4: "=", 5: r"\quad", 6: "y"}
+
+    def decode(self, ids, skip_special_tokens=True):
+        _ = skip_special_tokens
+        return " ".join(self.vocab.get(int(token), "?") for token in ids)
+
+
+class _FakeLatexFormulaProcessor(_FakeFormulaProcessor):
+    tokenizer = _FakeLatexTokenizer()
+
+
+class _FakeLoopingDecoderSession(_FakeFullDecoderSession):
+    def run(self, _outputs, feeds):
+        input_ids = feeds["input_ids"]
+        self.input_lengths.append(int(input_ids.shape[1]))
+        self.batch_sizes.append(int(input_ids.shape[0]))
+        widths = feeds["encoder_hidden_states"][:, 0, 0].astype(np.int64)
+        logits = np.zeros((input_ids.shape[0], 1, 8), dtype=np.float32)
+        for row, (width, last) in enumerate(zip(widths.tolist(), input_ids[:, -1].tolist())):
+            if width == 1:
+                next_token = 3 if last == 2 else 5
+            else:
+                next_token = {2: 3, 3: 4, 4: 6}.get(int(last), 7)
+            logits[row, 0, next_token] = 5.0
+        return [logits]
+
+
+def test_formula_decoding_stops_degenerate_rows_early(monkeypatch) -> None:
+    sessions = {
+        "encoder_model.onnx": _FakeEncoderSession(),
+        "decoder_model.onnx": _FakeLoopingDecoderSession(),
+    }
+    monkeypatch.setattr(formula_recognizer_mod, "_load_processor", lambda model_dir: _FakeLatexFormulaProcessor())
+    monkeypatch.setattr(
+        formula_recognizer_mod,
+        "create_session",
+        lambda model_path, provider_info, session_options: sessions[Path(model_path).name],
+    )
+    images = [np.zeros((8, 1, 3), dtype=np.uint8), np.zeros((8, 5, 3), dtype=np.uint8)]
+    stats: list = []
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = _fake_formula_model_dir(Path(tmp), merged=False)
+        results = formula_recognizer_mod.recognize_formula_images(
+            images, model_dir, None, max_new_tokens=512, stats_callback=stats.append
+        )
+        guarded_steps = len(sessions["decoder_model.onnx"].input_lengths)
+        unguarded = formula_recognizer_mod.recognize_formula_images(
+            images, model_dir, None, max_new_tokens=64, repetition_guard=False
+        )
+
+    assert guarded_steps == 16
+    assert stats[0].degenerate_rows == 1
+    assert results[1][0] == "x = y"
+    assert "repeated_token_run" in latex_quality_flags(results[0][0])
+    assert runtime_mod.has_severe_latex_quality_issue(results[0][0])
+    assert unguarded[0][0].count(r"\quad") == 63
+
+
+def test_formula_decoding_stops_between_steps_when_cancelled(monkeypatch) -> None:
+    token = CancelToken()
+
+    class _CancellingDecoderSession(_FakeLoopingDecoderSession):
+        def run(self, outputs, feeds):
+            if len(self.input_lengths) == 3:
+                token.cancel()
+            return super().run(outputs, feeds)
+
+    decoder = _CancellingDecoderSession()
+    sessions = {"encoder_model.onnx": _FakeEncoderSession(), "decoder_model.onnx": decoder}
+    monkeypatch.setattr(formula_recognizer_mod, "_load_processor", lambda model_dir: _FakeLatexFormulaProcessor())
+    monkeypatch.setattr(
+        formula_recognizer_mod,
+        "create_session",
+        lambda model_path, provider_info, session_options: sessions[Path(model_path).name],
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = _fake_formula_model_dir(Path(tmp), merged=False)
+        with cancellation_scope(token), pytest.raises(RecognitionCancelled):
+            formula_recognizer_mod.recognize_formula_images(
+                [np.zeros((8, 1, 3), dtype=np.uint8)], model_dir, None, max_new_tokens=512, repetition_guard=False
+            )
+
+    assert len(decoder.input_lengths) == 4
+
+
+def _write_synthetic_trocr_processor(model_dir: Path) -> None:
+    from tokenizers import ByteLevelBPETokenizer
+
+    model_dir.mkdir(parents=True, exist_ok=True)
+    (model_dir / "preprocessor_config.json").write_text(
+        json.dumps(
+            {
+                "do_normalize": True,
+                "do_rescale": True,
+                "do_resize": True,
+                "image_mean": [0.5, 0.5, 0.5],
+                "image_processor_type": "ViTImageProcessor",
+                "image_std": [0.5, 0.5, 0.5],
+                "resample": 2,
+                "rescale_factor": 0.00392156862745098,
+                "size": {"height": 64, "width": 96},
+            }
+        ),
+        encoding="utf-8",
+    )
+    special = ["<s>", "<pad>", "</s>", "<unk>", "<mask>"]
+    tokenizer = ByteLevelBPETokenizer()
+    tokenizer.train_from_iterator(
+        [r"\frac{a}{b} = c", r"x^{2} + y^{2} = z^{2}", r"\sum_{i=1}^{n} i , don't ."] * 20,
+        vocab_size=300,
+        special_tokens=special,
+    )
+    tokenizer.save(str(model_dir / "tokenizer.json"))
+    (model_dir / "tokenizer_config.json").write_text(
+        json.dumps(
+            {
+                "bos_token": "<s>",
+                "eos_token": "</s>",
+                "pad_token": "<pad>",
+                "unk_token": "<unk>",
+                "mask_token": "<mask>",
+                "clean_up_tokenization_spaces": True,
+                "tokenizer_class": "RobertaTokenizer",
+            }
+        ),
+        encoding="utf-8",
+    )
+    (model_dir / "special_tokens_map.json").write_text(
+        json.dumps({"bos_token": "<s>", "eos_token": "</s>", "pad_token": "<pad>", "unk_token": "<unk>"}),
+        encoding="utf-8",
+    )
+
+
+def test_lightweight_formula_processor_matches_transformers() -> None:
+    pytest.importorskip("transformers")
+    pytest.importorskip("tokenizers")
+    rng = np.random.default_rng(7)
+    images = [
+        rng.integers(0, 256, size=(37, 211, 3), dtype=np.uint8),
+        rng.integers(0, 256, size=(120, 80, 3), dtype=np.uint8),
+        np.full((64, 96, 3), 200, dtype=np.uint8),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = Path(tmp) / FORMULA_RECOGNIZER_ID
+        _write_synthetic_trocr_processor(model_dir)
+        light = formula_processor_mod.load_formula_processor(model_dir)
+        reference = formula_recognizer_mod._load_transformers_processor(str(model_dir))
+        assert light is not None
+        pil_images = [Image.fromarray(image) for image in images]
+        light_pixels = light(images=pil_images, return_tensors="np")["pixel_values"]
+        reference_pixels = np.asarray(reference(images=pil_images, return_tensors="np")["pixel_values"])
+        texts = [r"\frac{a}{b} = c", r"x^{2} + y^{2} , don't .", r"\sum_{i=1}^{n} i"]
+        id_sequences = [reference.tokenizer.encode(text) for text in texts]
+        id_sequences.append(list(range(0, 40)))
+
+        assert light_pixels.dtype == reference_pixels.dtype
+        assert light_pixels.tobytes() == reference_pixels.tobytes()
+        for ids in id_sequences:
+            assert light.tokenizer.decode(ids, skip_special_tokens=True) == reference.tokenizer.decode(
+                ids, skip_special_tokens=True
+            )
+        assert light.tokenizer.bos_token_id == reference.tokenizer.bos_token_id
+        assert light.tokenizer.eos_token_id == reference.tokenizer.eos_token_id
+
+
+def test_formula_batch_plan_keeps_small_requests_in_one_batch() -> None:
+    sizes = [(400, 40), (60, 40), (900, 40)]
+
+    assert plan_formula_batches(sizes, max_batch_size=8) == [[0, 1, 2]]
+    assert plan_formula_batches([], max_batch_size=8) == []
+
+
+def test_formula_batch_plan_buckets_crops_by_aspect_ratio() -> None:
+    sizes = [(40, 40), (600, 40), (50, 40), (620, 40), (45, 40), (300, 40)]
+    policy = FormulaBatchPolicy(aspect_ratio_edges=(2.0, 10.0), max_batch_size=2, max_batch_aspect_sum=0.0)
+
+    batches = plan_formula_batches(sizes, policy, max_batch_size=32)
+
+    assert batches == [[0, 4], [2], [5], [1, 3]]
+    assert sorted(index for batch in batches for index in batch) == list(range(len(sizes)))
+
+
+def test_formula_batch_plan_caps_aspect_sum_per_batch() -> None:
+    sizes = [(800, 40)] * 5
+    policy = FormulaBatchPolicy(max_batch_size=16, max_batch_aspect_sum=45.0)
+
+    assert plan_formula_batches(sizes, policy, max_batch_size=32) == [[0, 1], [2, 3], [4]]
+
+
+def test_formula_batch_results_are_returned_in_input_order() -> None:
+    items = ["a", "b", "c", "d"]
+    seen: list[list[str]] = []
+
+    def _run(batch: list[str]) -> list[str]:
+        seen.append(batch)
+        return [item.upper() for item in batch]
+
+    assert run_in_batches(items, [[3, 1], [0, 2]], _run) == ["A", "B", "C", "D"]
+    assert seen == [["d", "b"], ["a", "c"]]
+
+
+def test_formula_batch_policy_env_rejects_malformed_values(monkeypatch) -> None:
+    monkeypatch.setenv("MATHCRAFT_FORMULA_MAX_BATCH", "8")
+    monkeypatch.setenv("MATHCRAFT_FORMULA_BATCH_ASPECT_SUM", "32.5")
+    monkeypatch.setenv("MATHCRAFT_FORMULA_BUCKET_EDGES", "2, 6,12")
+
+    assert formula_batch_policy_from_env() == FormulaBatchPolicy((2.0, 6.0, 12.0), 8, 32.5)
+
+    for name, value in (
+        ("MATHCRAFT_FORMULA_MAX_BATCH", "many"),
+        ("MATHCRAFT_FORMULA_MAX_BATCH", "-1"),
+        ("MATHCRAFT_FORMULA_BATCH_ASPECT_SUM", "nan"),
+        ("MATHCRAFT_FORMULA_BUCKET_EDGES", "2,x"),
+        ("MATHCRAFT_FORMULA_BUCKET_EDGES", "0,4"),
+        ("MATHCRAFT_FORMULA_BUCKET_EDGES", "8,4"),
+    ):
+        with monkeypatch.context() as patch:
+            patch.setenv(name, value)
+            with pytest.raises(MathCraftError, match=name):
+                formula_batch_policy_from_env()
+
+
+def _cpu_provider_info() -> ProviderInfo:
+    return ProviderInfo(
+        available_providers=("CPUExecutionProvider",),
+        active_provider="CPUExecutionProvider",
+        device="cpu",
+        gpu_requested=False,
+        gpu_runtime_ok=False,
+        cpu_fallback=False,
+    )
+
+
+def test_formula_result_cache_skips_repeated_crops(monkeypatch) -> None:
+    batches: list[int] = []
+
+    def _fake_recognize_images(images, model_dir, provider_info, **kwargs):
+        batches.append(len(images))
+        return [(f"x_{int(image[0, 0, 0])}", 0.9) for image in images]
+
+    monkeypatch.setattr(runtime_mod, "recognize_formula_images", _fake_recognize_images)
+    first = np.full((20, 40, 3), 1, dtype=np.uint8)
+    second = np.full((20, 40, 3), 2, dtype=np.uint8)
+    with tempfile.TemporaryDirectory() as tmp:
+        runtime = MathCraftRuntime(
+            cache_dir=tmp,
+            manifest=load_manifest(),
+            formula_result_cache=FormulaResultCachePolicy(max_entries=4),
+        )
+        provider = _cpu_provider_info()
+        results = runtime._recognize_formula_batch(
+            [first, second, first.copy()], Path(tmp), provider, max_new_tokens=64
+        )
+        assert results == [("x_1", 0.9), ("x_2", 0.9), ("x_1", 0.9)]
+        assert batches == [2]
+        assert runtime._recognize_formula_batch([second], Path(tmp), provider, max_new_tokens=64) == [("x_2", 0.9)]
+        assert batches == [2]
+        runtime._recognize_formula_batch([second], Path(tmp), provider, max_new_tokens=32)
+        assert batches == [2, 1]
+        stats = runtime.formula_result_cache_stats()
+        assert (stats.hits, stats.misses, stats.entries) == (1, 4, 3)
+
+        worker = MathCraftWorker(runtime=runtime)
+        monkeypatch.setattr(runtime, "doctor", lambda: runtime.get_runtime_info())
+        response = worker.handle({"id": "d", "action": "doctor"})
+        assert response["result"]["formula_result_cache"]["hits"] == 1
+        assert response["result"]["formula_result_cache"]["max_entries"] == 4
+
+
+def test_formula_result_cache_persists_and_evicts_least_recent() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        policy = FormulaResultCachePolicy(max_entries=2, persist=True, persist_dir=tmp)
+        cache = FormulaResultCache(policy)
+        cache.put("a", ("a", 0.5))
+        cache.put("b", ("b", 0.6))
+        assert cache.get("a") == ("a", 0.5)
+        cache.put("c", ("c", 0.7))
+        assert cache.get("b") is None
+
+        reloaded = FormulaResultCache(policy)
+        assert reloaded.get("a") is None
+        assert reloaded.get("c") == ("c", 0.7)
+        assert reloaded.stats().entries == 2
+        assert FormulaResultCache(FormulaResultCachePolicy(max_entries=0)).enabled is False
+
+
+def test_formula_result_cache_compaction_keeps_lines_appended_during_rewrite(monkeypatch) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        policy = FormulaResultCachePolicy(max_entries=2, persist=True, persist_dir=tmp)
+        path = Path(tmp) / "formula-results.v1.jsonl"
+        lines = [json.dumps({"k": key, "t": key, "s": 0.5}) + "\n" for key in "abcde"]
+        path.write_text("".join(lines), encoding="utf-8")
+
+        FormulaResultCache(policy)
+        assert len(path.read_text(encoding="utf-8").splitlines()) == 2
+        assert sorted(p.name for p in Path(tmp).iterdir()) == [path.name]
+
+        path.write_text("".join(lines), encoding="utf-8")
+        real_signature = result_cache_mod._file_signature
+        calls = []
+
+        def _signature_with_concurrent_append(target):
+            calls.append(target)
+            if len(calls) == 2:
+                with target.open("a", encoding="utf-8") as fh:
+                    fh.write(json.dumps({"k": "f", "t": "f", "s": 0.5}) + "\n")
+            return real_signature(target)
+
+        monkeypatch.setattr(result_cache_mod, "_file_signature", _signature_with_concurrent_append)
+        FormulaResultCache(policy)
+        assert len(path.read_text(encoding="utf-8").splitlines()) == 6
+        assert sorted(p.name for p in Path(tmp).iterdir()) == [path.name]
+
+
 def test_recognize_formula_uses_formula_adapter() -> None:
     manifest = load_manifest()
     old_warmup = MathCraftRuntime.warmup
@@ -573,7 +1701,7 @@ def test_recognize_formula_uses_formula_adapter() -> None:
 
         MathCraftRuntime.warmup = _fake_warmup
         runtime_mod.recognize_formula_image = (
-            lambda image, model_dir, provider_info, max_new_tokens=256: ("x+y", 0.91)
+            lambda image, model_dir, provider_info, max_new_tokens=256, **kwargs: ("x+y", 0.91)
         )
         with tempfile.TemporaryDirectory() as tmp:
             runtime = MathCraftRuntime(cache_dir=tmp, manifest=manifest, provider_preference="cpu")
@@ -605,13 +1733,13 @@ def test_recognize_formula_splits_multiline_image_before_generation() -> None:
                 ready=True,
             )
 
-        def _fake_recognize_images(images, model_dir, provider_info, max_new_tokens=256):
+        def _fake_recognize_images(images, model_dir, provider_info, max_new_tokens=256, **kwargs):
             calls.append(len(images))
             return [(f"line{index + 1}", 0.9) for index, _image in enumerate(images)]
 
         MathCraftRuntime.warmup = _fake_warmup
         runtime_mod.recognize_formula_image = (
-            lambda image, model_dir, provider_info, max_new_tokens=256: ("single", 0.1)
+            lambda image, model_dir, provider_info, max_new_tokens=256, **kwargs: ("single", 0.1)
         )
         runtime_mod.recognize_formula_images = _fake_recognize_images
 
@@ -650,13 +1778,13 @@ def test_recognize_formula_rejoins_extra_wide_single_row_segments() -> None:
                 ready=True,
             )
 
-        def _fake_recognize_images(images, model_dir, provider_info, max_new_tokens=256):
+        def _fake_recognize_images(images, model_dir, provider_info, max_new_tokens=256, **kwargs):
             calls.append(len(images))
             return [(f"part{index + 1}", 0.9) for index, _image in enumerate(images)]
 
         MathCraftRuntime.warmup = _fake_warmup
         runtime_mod.recognize_formula_image = (
-            lambda image, model_dir, provider_info, max_new_tokens=256: ("single", 0.1)
+            lambda image, model_dir, provider_info, max_new_tokens=256, **kwargs: ("single", 0.1)
         )
         runtime_mod.recognize_formula_images = _fake_recognize_images
 
@@ -696,13 +1824,13 @@ def test_recognize_formula_retries_whole_image_for_severe_split_artifacts() -> N
 
         MathCraftRuntime.warmup = _fake_warmup
         runtime_mod.recognize_formula_images = (
-            lambda images, model_dir, provider_info, max_new_tokens=256: [
+            lambda images, model_dir, provider_info, max_new_tokens=256, **kwargs: [
                 ("x = = y", 0.91),
                 ("z", 0.91),
             ]
         )
         runtime_mod.recognize_formula_image = (
-            lambda image, model_dir, provider_info, max_new_tokens=256: ("x = y", 0.82)
+            lambda image, model_dir, provider_info, max_new_tokens=256, **kwargs: ("x = y", 0.82)
         )
 
         image = np.full((120, 220, 3), 255, dtype=np.uint8)
@@ -762,7 +1890,7 @@ def test_recognize_mixed_uses_text_pipeline() -> None:
                 (0.9, 0.8),
             )
         )
-        runtime_mod.detect_formula_boxes = lambda image, model_dir, provider_info: ()
+        runtime_mod.detect_formula_boxes = lambda image, model_dir, provider_info, **_kwargs: ()
         runtime_mod.get_rotate_crop_image = (
             lambda image, box: np.zeros((8, 8, 3), dtype=np.uint8)
         )
@@ -815,9 +1943,9 @@ def test_recognize_mixed_splits_multiline_formula_blocks() -> None:
 
         MathCraftRuntime._warmup_selected_models = _fake_warmup_selected
         runtime_mod.detect_text_boxes = (
-            lambda image, model_dir, provider_info: (np.zeros((0, 4, 2), dtype=np.float32), ())
+            lambda image, model_dir, provider_info, **_kwargs: (np.zeros((0, 4, 2), dtype=np.float32), ())
         )
-        runtime_mod.detect_formula_boxes = lambda image, model_dir, provider_info: (
+        runtime_mod.detect_formula_boxes = lambda image, model_dir, provider_info, **_kwargs: (
             FormulaBox(box=((0.0, 0.0), (220.0, 0.0), (220.0, 130.0), (0.0, 130.0)), score=0.95, label="formula"),
         )
         runtime_mod.get_rotate_crop_image = lambda image, box: formula_image
@@ -844,6 +1972,234 @@ def test_recognize_mixed_splits_multiline_formula_blocks() -> None:
         runtime_mod.get_rotate_crop_image = old_crop
 
 
+def test_recognize_mixed_concurrent_pipeline_overlaps_detectors(monkeypatch) -> None:
+    import threading
+
+    def _fake_warmup_selected(self, profile: str, model_ids):
+        return runtime_mod.WarmupPlan(
+            profile=profile,
+            required_models=tuple(model_ids),
+            missing_models=(),
+            unsupported_models=(),
+            component_statuses=(),
+            provider_info=_cpu_provider_info(),
+            ready=True,
+        )
+
+    barrier = threading.Barrier(2, timeout=5)
+    threads: dict[str, str] = {}
+
+    def _detect_formula(image, model_dir, provider_info, **_kwargs):
+        threads["formula"] = threading.current_thread().name
+        if barrier_enabled:
+            barrier.wait()
+        return (FormulaBox(box=((4.0, 4.0), (90.0, 4.0), (90.0, 40.0), (4.0, 40.0)), score=0.95, label="formula"),)
+
+    def _detect_text(image, model_dir, provider_info, **_kwargs):
+        threads["text"] = threading.current_thread().name
+        if barrier_enabled:
+            barrier.wait()
+        return np.asarray([[[120, 10], [190, 10], [190, 34], [120, 34]]], dtype=np.float32), (0.9,)
+
+    image = np.full((48, 200, 3), 255, dtype=np.uint8)
+    image[14:30, 10:80] = 0
+    image[16:28, 124:186] = 0
+    monkeypatch.setattr(MathCraftRuntime, "_warmup_selected_models", _fake_warmup_selected)
+    monkeypatch.setattr(runtime_mod, "detect_formula_boxes", _detect_formula)
+    monkeypatch.setattr(runtime_mod, "detect_text_boxes", _detect_text)
+    monkeypatch.setattr(
+        runtime_mod,
+        "recognize_pp_text_lines",
+        lambda crops, model_dir, provider_info, **kwargs: [("where", 0.95)] * len(crops),
+    )
+    monkeypatch.setattr(
+        runtime_mod,
+        "recognize_formula_images",
+        lambda images, model_dir, provider_info, **kwargs: [("x^2", 0.9)] * len(images),
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        barrier_enabled = False
+        sequential = MathCraftRuntime(cache_dir=tmp, manifest=load_manifest(), mixed_pipeline_mode="sequential")
+        expected = sequential.recognize_mixed(image)
+        assert threads["formula"] == threads["text"]
+        assert sorted(block.source for block in expected.blocks) == ["formula_rec", "text_rec"]
+
+        barrier_enabled = True
+        runtime = MathCraftRuntime(cache_dir=tmp, manifest=load_manifest(), mixed_pipeline_mode="concurrent")
+        result = runtime.recognize_mixed(image)
+        assert result == expected
+        assert threads["text"].startswith("mathcraft-mixed")
+        timings = runtime.mixed_stage_timings()
+        for stage in ("formula_detect", "text_detect", "detect_wall", "text_recognize", "formula_recognize", "total"):
+            assert timings[stage] >= 0.0
+        with pytest.raises(MathCraftError):
+            MathCraftRuntime(cache_dir=tmp, manifest=load_manifest(), mixed_pipeline_mode="threads")
+
+
+class _FakeDetectorSession:
+    def __init__(self, batch_dim) -> None:
+        self.batch_dim = batch_dim
+        self.calls: list[int] = []
+
+    def get_inputs(self):
+        return [type("_Input", (), {"name": "images", "shape": [self.batch_dim, 3, 768, 768]})()]
+
+    def run(self, _outputs, feeds):
+        batch = feeds["images"]
+        if isinstance(self.batch_dim, int) and batch.shape[0] != self.batch_dim:
+            raise ValueError(f"got batch {batch.shape[0]}, expected {self.batch_dim}")
+        self.calls.append(int(batch.shape[0]))
+        preds = np.zeros((batch.shape[0], 6, 2), dtype=np.float32)
+        for row in range(batch.shape[0]):
+            preds[row, :, 0] = (384.0, 384.0, 100.0 + 10 * row, 40.0, 0.9, 0.1)
+        return [preds]
+
+
+def test_formula_detector_batch_stacks_pages_into_one_run(monkeypatch) -> None:
+    pages = [np.full((600, 800, 3), 255, dtype=np.uint8), np.full((400, 300, 3), 255, dtype=np.uint8)]
+    monkeypatch.setattr(formula_detector_mod, "_find_detector_model", lambda model_dir: Path(model_dir) / "mfd.onnx")
+    dynamic = _FakeDetectorSession("batch")
+    monkeypatch.setattr(formula_detector_mod, "create_session", lambda model_path, provider_info, session_options: dynamic)
+    batched = formula_detector_mod.detect_formula_boxes_batch(pages, "models", None, batch_size=4)
+    assert dynamic.calls == [2]
+
+    static = _FakeDetectorSession(1)
+    monkeypatch.setattr(formula_detector_mod, "create_session", lambda model_path, provider_info, session_options: static)
+    singles = formula_detector_mod.detect_formula_boxes_batch(pages, "models", None, batch_size=4)
+    assert static.calls == [1, 1]
+    assert singles[0] == batched[0]
+    assert singles[0] == formula_detector_mod.detect_formula_boxes(pages[0], "models", None)
+    assert len(batched[1]) == 1 and batched[1][0].label == "embedding"
+
+
+def test_formula_detector_batch_pads_last_chunk_for_fixed_batch_axis(monkeypatch) -> None:
+    pages = [np.full((600, 800, 3), 255, dtype=np.uint8) for _ in range(3)]
+    monkeypatch.setattr(formula_detector_mod, "_find_detector_model", lambda model_dir: Path(model_dir) / "mfd.onnx")
+    static = _FakeDetectorSession(2)
+    monkeypatch.setattr(formula_detector_mod, "create_session", lambda model_path, provider_info, session_options: static)
+
+    results = formula_detector_mod.detect_formula_boxes_batch(pages, "models", None, batch_size=4)
+
+    assert static.calls == [2, 2]
+    assert len(results) == 3
+    assert results[2] == results[0]
+
+
+def test_recognize_mixed_batch_pools_crops_across_pages(monkeypatch) -> None:
+    def _fake_warmup_selected(self, profile: str, model_ids):
+        return runtime_mod.WarmupPlan(
+            profile=profile,
+            required_models=tuple(model_ids),
+            missing_models=(),
+            unsupported_models=(),
+            component_statuses=(),
+            provider_info=_cpu_provider_info(),
+            ready=True,
+        )
+
+    formula_box = FormulaBox(box=((4.0, 4.0), (90.0, 4.0), (90.0, 40.0), (4.0, 40.0)), score=0.95, label="formula")
+    text_boxes = np.asarray([[[120, 10], [190, 10], [190, 34], [120, 34]]], dtype=np.float32)
+    calls: dict[str, list[int]] = {"detect_batch": [], "text": [], "formula": []}
+    monkeypatch.setattr(MathCraftRuntime, "_warmup_selected_models", _fake_warmup_selected)
+    monkeypatch.setattr(runtime_mod, "detect_formula_boxes", lambda image, model_dir, provider_info, **_kwargs: (formula_box,))
+
+    def _detect_batch(images, model_dir, provider_info, **kwargs):
+        calls["detect_batch"].append(len(images))
+        return [(formula_box,) for _image in images]
+
+    def _recognize_lines(crops, model_dir, provider_info, **kwargs):
+        calls["text"].append(len(crops))
+        return [("where", 0.95)] * len(crops)
+
+    live_stats = weakref.WeakSet()
+
+    class _TrackedStats(ImageBoxStats):
+        def __init__(self, image) -> None:
+            super().__init__(image)
+            live_stats.add(self)
+
+    def _recognize_formulas(images, model_dir, provider_info, **kwargs):
+        calls["formula"].append(len(images))
+        assert len(live_stats) == 0
+        return [(f"x_{int(image.mean())}", 0.9) for image in images]
+
+    monkeypatch.setattr(runtime_mod, "ImageBoxStats", _TrackedStats)
+    monkeypatch.setattr(runtime_mod, "detect_formula_boxes_batch", _detect_batch)
+    monkeypatch.setattr(runtime_mod, "detect_text_boxes", lambda image, model_dir, provider_info, **_kwargs: (text_boxes, (0.9,)))
+    monkeypatch.setattr(runtime_mod, "recognize_pp_text_lines", _recognize_lines)
+    monkeypatch.setattr(runtime_mod, "recognize_formula_images", _recognize_formulas)
+    pages = []
+    for shade in (0, 40, 80):
+        page = np.full((48, 200, 3), 255, dtype=np.uint8)
+        page[14:30, 10:80] = shade
+        page[16:28, 124:186] = 0
+        pages.append(page)
+    with tempfile.TemporaryDirectory() as tmp:
+        runtime = MathCraftRuntime(
+            cache_dir=tmp,
+            manifest=load_manifest(),
+            mixed_pipeline_mode="sequential",
+            formula_result_cache=FormulaResultCachePolicy(max_entries=0),
+        )
+        results = runtime.recognize_mixed_batch(pages)
+        assert calls == {"detect_batch": [3], "text": [3], "formula": [3]}
+        assert results == [runtime.recognize_mixed(page) for page in pages]
+        assert len({result.text for result in results}) == 3
+
+
+def test_recognize_mixed_streams_blocks_as_batches_finish(monkeypatch) -> None:
+    def _fake_warmup_selected(self, profile: str, model_ids):
+        return runtime_mod.WarmupPlan(
+            profile=profile,
+            required_models=tuple(model_ids),
+            missing_models=(),
+            unsupported_models=(),
+            component_statuses=(),
+            provider_info=_cpu_provider_info(),
+            ready=True,
+        )
+
+    formula_boxes = tuple(
+        FormulaBox(box=((x, 4.0), (x + 86.0, 4.0), (x + 86.0, 40.0), (x, 40.0)), score=0.95, label="embedding")
+        for x in (4.0, 204.0)
+    )
+    text_boxes = np.asarray(
+        [[[120, 10], [190, 10], [190, 34], [120, 34]], [[320, 10], [390, 10], [390, 34], [320, 34]]],
+        dtype=np.float32,
+    )
+    text_calls: list[int] = []
+
+    def _recognize_lines(crops, model_dir, provider_info, **kwargs):
+        text_calls.append(len(crops))
+        return [("where", 0.95)] * len(crops)
+
+    monkeypatch.setattr(MathCraftRuntime, "_warmup_selected_models", _fake_warmup_selected)
+    monkeypatch.setattr(MathCraftRuntime, "_rec_batch_num", lambda self, provider_info: 1)
+    monkeypatch.setattr(runtime_mod, "detect_formula_boxes", lambda image, model_dir, provider_info, **_kwargs: formula_boxes)
+    monkeypatch.setattr(runtime_mod, "detect_text_boxes", lambda image, model_dir, provider_info, **_kwargs: (text_boxes, (0.9, 0.9)))
+    monkeypatch.setattr(runtime_mod, "recognize_pp_text_lines", _recognize_lines)
+    monkeypatch.setattr(
+        runtime_mod,
+        "recognize_formula_images",
+        lambda images, model_dir, provider_info, **kwargs: [("x^2", 0.9)] * len(images),
+    )
+    image = np.full((48, 400, 3), 255, dtype=np.uint8)
+    for left in (10, 124, 210, 324):
+        image[14:30, left : left + 60] = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        runtime = MathCraftRuntime(cache_dir=tmp, manifest=load_manifest(), mixed_pipeline_mode="sequential")
+        expected = runtime.recognize_mixed(image)
+        text_calls.clear()
+        partials: list[MathCraftBlock] = []
+        result = runtime.recognize_mixed(image, on_partial=partials.append)
+
+    assert result == expected
+    assert text_calls == [1, 1]
+    assert [block.kind for block in partials] == ["text", "text", "embedding", "embedding"]
+    assert {block.text for block in partials} == {"x^2", "where"}
+    assert all(block.reading_order is None for block in partials)
+
+
 def test_recognize_text_skips_formula_pipeline() -> None:
     manifest = load_manifest()
     old_warmup_selected = MathCraftRuntime._warmup_selected_models
@@ -869,7 +2225,7 @@ def test_recognize_text_skips_formula_pipeline() -> None:
 
         MathCraftRuntime._warmup_selected_models = _fake_warmup_selected
         runtime_mod.detect_formula_boxes = (
-            lambda image, model_dir, provider_info: (_ for _ in ()).throw(
+            lambda image, model_dir, provider_info, **_kwargs: (_ for _ in ()).throw(
                 AssertionError("formula detector should not run in text mode")
             )
         )
@@ -1150,6 +2506,66 @@ def test_layout_marks_journal_running_header() -> None:
     assert "AUTHOR et al.: TITLE" not in merge_blocks_text(ordered)
 
 
+def test_layout_line_grouping_tracks_growing_line_boxes() -> None:
+    def _text(text: str, x1: float, y1: float, height: float = 20.0) -> MathCraftBlock:
+        x2 = x1 + 60.0
+        y2 = y1 + height
+        return MathCraftBlock(kind="text", box=((x1, y1), (x2, y1), (x2, y2), (x1, y2)), text=text, score=0.9)
+
+    blocks = (
+        _text("c", 300.0, 118.0),
+        _text("a", 100.0, 100.0),
+        _text("next", 100.0, 400.0),
+        _text("b", 200.0, 108.0),
+        _text("tall", 400.0, 90.0, height=60.0),
+    )
+    lines = group_blocks_into_lines(blocks)
+    assert [[block.text for block in line] for line in lines] == [["a", "b", "c", "tall"], ["next"]]
+
+
+def test_layout_merge_regroups_annotated_two_column_page() -> None:
+    def _text(text: str, x1: float, y1: float, width: float, height: float) -> MathCraftBlock:
+        x2 = x1 + width
+        y2 = y1 + height
+        return MathCraftBlock(kind="text", box=((x1, y1), (x2, y1), (x2, y2), (x1, y2)), text=text, score=0.9)
+
+    blocks = (
+        _text("left one", 122.0, 555.0, 328.0, 18.0),
+        _text("right two", 521.0, 674.0, 271.0, 29.0),
+        _text("wide", 463.0, 1124.0, 355.0, 22.0),
+        _text("left two", 130.0, 707.0, 297.0, 27.0),
+        _text("right one", 495.0, 423.0, 128.0, 15.0),
+        _text("16", 555.0, 1317.0, 94.0, 27.0),
+    )
+    annotated = annotate_blocks(blocks, image_size=(1000, 1400))
+    regrouped = [
+        " ".join(block.text for block in line if block.role != "page_number")
+        for line in group_blocks_into_lines(annotated)
+    ]
+    merged = merge_blocks_text(annotated)
+    assert merged == "\n".join(text for text in regrouped if text)
+    assert merged.startswith("left one\nleft two\nright one\nright two")
+
+
+def test_box_grid_queries_only_touching_boxes_in_insertion_order() -> None:
+    boxes = [
+        ((500.0, 10.0), (540.0, 10.0), (540.0, 30.0), (500.0, 30.0)),
+        ((0.0, 0.0), (5000.0, 0.0), (5000.0, 5000.0), (0.0, 5000.0)),
+        ((100.0, 10.0), (140.0, 10.0), (140.0, 30.0), (100.0, 30.0)),
+        ((100.0, 400.0), (140.0, 400.0), (140.0, 420.0), (100.0, 420.0)),
+    ]
+    grid = BoxGrid(boxes, cell_size=20.0)
+    assert grid.query(90.0, 0.0, 600.0, 40.0) == [0, 1, 2]
+    assert grid.query(140.0, 30.0, 160.0, 50.0) == [1, 2]
+    assert grid.query_box(boxes[3]) == [1, 3]
+
+    text_box = ((0.0, 10.0), (800.0, 10.0), (800.0, 30.0), (0.0, 30.0))
+    formula_boxes = [boxes[0], boxes[2], boxes[3]]
+    assert split_text_box_around_formulas(
+        text_box, formula_boxes, formula_grid=BoxGrid(formula_boxes)
+    ) == split_text_box_around_formulas(text_box, formula_boxes)
+
+
 def test_informative_ocr_box_rejects_blank_and_tiny_crops() -> None:
     blank = np.full((64, 64, 3), 255, dtype=np.uint8)
     ink = blank.copy()
@@ -1168,6 +2584,23 @@ def test_informative_ocr_box_rejects_blank_and_tiny_crops() -> None:
     )
 
 
+def test_image_box_stats_match_direct_crop_reductions() -> None:
+    rng = np.random.default_rng(7)
+    image = np.full((48, 64, 3), 255, dtype=np.uint8)
+    image[10:30, 8:40] = rng.integers(0, 256, size=(20, 32, 3), dtype=np.uint8)
+    image[36:44, 44:60] = 252
+    stats = ImageBoxStats(image)
+    boxes = [(8, 10, 40, 30), (44, 36, 60, 44), (0, 0, 64, 48), (45, 37, 47, 39)] * 8
+    for left, top, right, bottom in boxes:
+        crop = image[top:bottom, left:right]
+        assert stats.mean(left, top, right, bottom) == pytest.approx(float(np.mean(crop)))
+        assert stats.std(left, top, right, bottom) == pytest.approx(float(np.std(crop)), abs=1e-9)
+
+    box = ((44.0, 36.0), (60.0, 36.0), (60.0, 44.0), (44.0, 44.0))
+    assert not is_informative_ocr_box(image, box, stats=stats)
+    assert is_informative_ocr_box(image, box, blank_mean_threshold=253.0, stats=stats)
+
+
 def test_block_serialization_preserves_structured_fields() -> None:
     block = MathCraftBlock(
         kind="isolated",
@@ -1247,7 +2680,7 @@ def test_hardware_batch_policy_uses_total_vram_when_free_vram_unknown() -> None:
 def test_text_recognizer_enables_cuda_only_for_cuda_providers(monkeypatch) -> None:
     calls: list[tuple[str, bool, bool]] = []
 
-    def _fake_cached(model_dir: str, use_cuda: bool, use_dml: bool):
+    def _fake_cached(model_dir: str, use_cuda: bool, use_dml: bool, *thread_counts: int):
         calls.append((model_dir, use_cuda, use_dml))
         return object()
 
@@ -1261,7 +2694,7 @@ def test_text_recognizer_enables_cuda_only_for_cuda_providers(monkeypatch) -> No
         cpu_fallback=False,
     )
 
-    text_recognizer_mod._create_pp_text_recognizer(Path("."), provider)
+    text_recognizer_mod._create_pp_text_recognizer(Path("."), provider, SessionOptionsProfile())
 
     assert calls[0][1:] == (True, False)
 
@@ -1269,7 +2702,7 @@ def test_text_recognizer_enables_cuda_only_for_cuda_providers(monkeypatch) -> No
 def test_text_recognizer_enables_dml_without_cuda(monkeypatch) -> None:
     calls: list[tuple[str, bool, bool]] = []
 
-    def _fake_cached(model_dir: str, use_cuda: bool, use_dml: bool):
+    def _fake_cached(model_dir: str, use_cuda: bool, use_dml: bool, *thread_counts: int):
         calls.append((model_dir, use_cuda, use_dml))
         return object()
 
@@ -1283,7 +2716,7 @@ def test_text_recognizer_enables_dml_without_cuda(monkeypatch) -> None:
         cpu_fallback=False,
     )
 
-    text_recognizer_mod._create_pp_text_recognizer(Path("."), provider)
+    text_recognizer_mod._create_pp_text_recognizer(Path("."), provider, SessionOptionsProfile())
 
     assert calls[0][1:] == (False, True)
 
@@ -1386,7 +2819,7 @@ def test_worker_serializes_formula_result() -> None:
 
 def test_worker_passes_extended_formula_budget_to_mixed_runtime() -> None:
     class _FakeRuntime:
-        def recognize_mixed(self, image, *, min_text_score=0.45, max_formula_new_tokens=256):
+        def recognize_mixed(self, image, *, min_text_score=0.45, max_formula_new_tokens=256, on_partial=None):
             _ = min_text_score
             assert image == "sample.png"
             assert max_formula_new_tokens == FORMULA_MAX_NEW_TOKENS
@@ -1405,6 +2838,213 @@ def test_worker_passes_extended_formula_budget_to_mixed_runtime() -> None:
     assert response["result"]["text"] == "x"
 
 
+def test_worker_streams_mixed_partial_events_before_result() -> None:
+    block = MathCraftBlock(kind="text", box=((0.0, 0.0), (4.0, 0.0), (4.0, 2.0), (0.0, 2.0)), text="where", score=0.9)
+
+    class _Runtime:
+        def recognize_mixed(self, image, *, min_text_score=0.45, max_formula_new_tokens=256, on_partial=None):
+            if on_partial is not None:
+                on_partial(block)
+                on_partial(MathCraftBlock(kind="embedding", box=block.box, text="x", score=0.8))
+            return MixedRecognitionResult(text="where $x$", regions=(), blocks=(block,), provider="CPUExecutionProvider")
+
+    worker = MathCraftWorker(runtime=_Runtime())  # type: ignore[arg-type]
+    events: list[dict] = []
+    request = {"id": "page", "action": "recognize_mixed", "image": "page.png", "stream": True}
+    response = worker.handle(request, events.append)
+
+    assert [event["event"] for event in events] == ["text_line", "formula"]
+    assert all(event["id"] == "page" for event in events)
+    assert events[0]["result"]["text"] == "where"
+    assert response["event"] == "result"
+    assert response["result"]["text"] == "where $x$"
+    plain = worker.handle(dict(request, stream=False), events.append)
+    assert "event" not in plain
+    assert len(events) == 2
+
+
+def test_worker_warmup_forwards_deep_flag_and_starts_prewarm() -> None:
+    calls: list = []
+
+    class _Runtime:
+        def warmup(self, profile, *, deep=None):
+            calls.append(("warmup", profile, deep))
+            return runtime_mod.WarmupPlan(
+                profile=profile,
+                required_models=(FORMULA_RECOGNIZER_ID,),
+                missing_models=(),
+                unsupported_models=(),
+                component_statuses=(),
+                provider_info=_cpu_provider_info(),
+                ready=True,
+                deep_warmup_seconds=0.5,
+            )
+
+        def prewarm_in_background(self, profile, *, deep=None):
+            calls.append(("prewarm", profile, deep))
+            return True
+
+    worker = MathCraftWorker(runtime=_Runtime())  # type: ignore[arg-type]
+    response = worker.handle({"id": "w", "action": "warmup", "profile": "formula", "deep": True, "prewarm": "mixed"})
+    assert response["result"]["deep_warmup_seconds"] == 0.5
+    assert response["result"]["prewarm_started"] is True
+    plain = worker.handle({"id": "p", "action": "warmup", "profile": "formula"})
+    assert "prewarm_started" not in plain["result"]
+    assert calls == [("warmup", "formula", True), ("prewarm", "mixed", True), ("warmup", "formula", None)]
+
+
+def test_worker_recognizes_mixed_batch() -> None:
+    class _FakeRuntime:
+        def recognize_mixed_batch(self, images, *, min_text_score=0.45, max_formula_new_tokens=256):
+            assert max_formula_new_tokens == FORMULA_MAX_NEW_TOKENS
+            return [
+                MixedRecognitionResult(text=str(image), regions=(), blocks=(), provider="CPUExecutionProvider")
+                for image in images
+            ]
+
+    worker = MathCraftWorker(runtime=_FakeRuntime())  # type: ignore[arg-type]
+    response = worker.handle({"id": "batch", "action": "recognize_mixed_batch", "images": ["a.png", "b.png"]})
+    assert response["ok"] is True
+    assert [item["text"] for item in response["result"]["results"]] == ["a.png", "b.png"]
+    assert worker.handle({"id": "empty", "action": "recognize_mixed_batch", "images": []})["ok"] is False
+
+
+def test_worker_reads_shared_memory_images() -> None:
+    pixels = (np.arange(24 * 32 * 3) % 251).astype(np.uint8).reshape(24, 32, 3)
+    seen: list[tuple[tuple[int, ...], bool, int]] = []
+
+    class _FakeRuntime:
+        def recognize_formula(self, image, *, max_new_tokens=256):
+            seen.append((image.shape, bool(image.flags.writeable), int(image.sum())))
+            return FormulaRecognitionResult(text="x", score=0.9, provider="CPUExecutionProvider")
+
+        def recognize_mixed_batch(self, images, *, min_text_score=0.45, max_formula_new_tokens=256):
+            return [
+                MixedRecognitionResult(
+                    text=str(getattr(image, "shape", image)), regions=(), blocks=(), provider="CPUExecutionProvider"
+                )
+                for image in images
+            ]
+
+    worker = MathCraftWorker(runtime=_FakeRuntime())  # type: ignore[arg-type]
+    with SharedImageWriter(pixels) as shared:
+        response = worker.handle({"id": "shm", "action": "recognize_formula", "image": shared.descriptor})
+        batch = worker.handle(
+            {"id": "batch", "action": "recognize_mixed_batch", "images": [shared.descriptor, "page.png"]}
+        )
+        overflow = dict(shared.descriptor, shape=[48, 32, 3])
+        rejected = worker.handle({"id": "bad", "action": "recognize_formula", "image": overflow})
+
+    assert response["ok"] is True
+    assert seen == [((24, 32, 3), False, int(pixels.sum()))]
+    assert [item["text"] for item in batch["result"]["results"]] == ["(24, 32, 3)", "page.png"]
+    assert rejected["ok"] is False
+    assert "shared image" in rejected["error"]["message"]
+
+
+def test_request_dispatcher_orders_by_priority_and_cancels_queued_requests() -> None:
+    import threading
+
+    started = threading.Event()
+    release = threading.Event()
+    handled: list[str] = []
+    responses: list[dict] = []
+
+    class _FakeWorker:
+        def track(self, request_id):
+            return None
+
+        def cancel(self, request_id):
+            return False
+
+        def handle(self, request, emit=None):
+            if request["id"] == "page-1":
+                started.set()
+                release.wait(5.0)
+            handled.append(request["id"])
+            return {"id": request["id"], "ok": True, "result": {}}
+
+    dispatcher = RequestDispatcher(_FakeWorker(), responses.append, concurrency=1)  # type: ignore[arg-type]
+    dispatcher.submit({"id": "page-1", "priority": -1})
+    assert started.wait(5.0)
+    dispatcher.submit({"id": "page-2", "priority": -1})
+    dispatcher.submit({"id": "page-3", "priority": -1})
+    dispatcher.submit({"id": "screenshot"})
+    dispatcher.submit({"id": "expired", "timeout_sec": 0.0, "priority": 5})
+    assert dispatcher.cancel("page-3") is True
+    assert dispatcher.cancel("missing") is False
+    release.set()
+    dispatcher.close()
+
+    assert handled == ["page-1", "screenshot", "page-2"]
+    errors = {item["id"]: item["error"]["type"] for item in responses if not item["ok"]}
+    assert errors == {"page-3": "RecognitionCancelled", "expired": "TimeoutError"}
+
+
+def test_worker_cancels_in_flight_request_and_stays_usable() -> None:
+    import threading
+
+    started = threading.Event()
+
+    class _Runtime:
+        def recognize_formula(self, image, max_new_tokens=0):
+            if image == "page.png":
+                started.set()
+                while True:
+                    raise_if_cancelled()
+                    time.sleep(0.01)
+            return FormulaRecognitionResult(text="x", score=0.9, provider="CPUExecutionProvider")
+
+    worker = MathCraftWorker(runtime=_Runtime())  # type: ignore[arg-type]
+    responses: list[dict] = []
+    job = threading.Thread(
+        target=lambda: responses.append(
+            worker.handle({"id": "page", "action": "recognize_formula", "image": "page.png"})
+        )
+    )
+    job.start()
+    assert started.wait(5.0)
+    cancel = worker.handle({"id": "cancel-1", "action": "cancel", "target": "page"})
+    job.join(5.0)
+
+    assert cancel["result"] == {"cancelled": True}
+    assert responses[0]["error"]["type"] == "RecognitionCancelled"
+    assert worker.cancel("page") is False
+    follow_up = worker.handle({"id": "shot", "action": "recognize_formula", "image": "shot.png"})
+    assert follow_up["ok"] is True
+    assert follow_up["result"]["text"] == "x"
+
+
+def test_worker_concurrency_env_rejects_non_integer_values(monkeypatch) -> None:
+    monkeypatch.setenv("MATHCRAFT_WORKER_CONCURRENCY", "3")
+    assert worker_concurrency_from_env() == 3
+
+    monkeypatch.setenv("MATHCRAFT_WORKER_CONCURRENCY", "two")
+    with pytest.raises(MathCraftError, match="MATHCRAFT_WORKER_CONCURRENCY"):
+        worker_concurrency_from_env()
+
+
+def test_worker_start_does_not_import_text_pipeline() -> None:
+    import subprocess
+
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "mathcraft_ocr", "worker"],
+        cwd=ROOT,
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert completed.returncode == 0, completed.stderr[-2000:]
+    imported = {
+        line.rsplit("|", 1)[-1].strip()
+        for line in completed.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+    assert "mathcraft_ocr.runtime" in imported
+    assert not {name for name in imported if name.split(".")[0] in {"rapidocr", "cv2"}}
+
+
 def test_worker_reports_unsupported_action() -> None:
     worker = MathCraftWorker(runtime=object())  # type: ignore[arg-type]
     response = worker.handle({"id": "bad", "action": "missing"})
@@ -1424,6 +3064,7 @@ def main() -> None:
         test_runtime_rejects_unsupported_table_profile,
         test_formula_warmup_succeeds_with_stubbed_onnx_handlers,
         test_successful_warmup_plan_is_cached_per_profile,
+        test_session_options_spec_parses_threads_level_and_cache_switch,
         test_failed_warmup_plan_is_not_cached,
         test_cuda_warmup_failure_does_not_repair_model_cache,
         test_runtime_prefers_complete_bundled_models_over_empty_user_cache,
@@ -1439,9 +3080,18 @@ def main() -> None:
         test_formula_line_groups_keep_compact_fraction_expression_whole,
         test_formula_line_groups_keep_synthetic_compact_fraction_expression_whole,
         test_formula_line_groups_still_split_regular_multiline_equations,
+        test_formula_line_groups_split_wide_rows_into_segments_with_page_boxes,
+        test_page_pixels_stay_shared_until_formula_masking,
         test_formula_line_groups_keep_matrix_like_wide_line_whole,
         test_formula_line_splitter_ignores_script_like_annotation_rows,
         test_latex_quality_flags_detect_repeated_and_duplicate_relation_artifacts,
+        test_manifest_declares_optional_cached_decoder_exports,
+        test_formula_greedy_pick_matches_softmax_probability,
+        test_formula_batch_plan_keeps_small_requests_in_one_batch,
+        test_formula_batch_plan_buckets_crops_by_aspect_ratio,
+        test_formula_batch_plan_caps_aspect_sum_per_batch,
+        test_formula_batch_results_are_returned_in_input_order,
+        test_formula_result_cache_persists_and_evicts_least_recent,
         test_recognize_formula_uses_formula_adapter,
         test_recognize_formula_splits_multiline_image_before_generation,
         test_recognize_formula_rejoins_extra_wide_single_row_segments,
@@ -1458,7 +3108,11 @@ def main() -> None:
         test_layout_keeps_single_column_inline_formula_line_across_midline,
         test_layout_marks_formula_adjacent_short_text_as_anchor_or_label,
         test_layout_marks_journal_running_header,
+        test_layout_line_grouping_tracks_growing_line_boxes,
+        test_layout_merge_regroups_annotated_two_column_page,
+        test_box_grid_queries_only_touching_boxes_in_insertion_order,
         test_informative_ocr_box_rejects_blank_and_tiny_crops,
+        test_image_box_stats_match_direct_crop_reductions,
         test_block_serialization_preserves_structured_fields,
         test_hardware_batch_policy_prefers_larger_gpu_batches,
         test_hardware_batch_policy_uses_total_vram_when_free_vram_unknown,
@@ -1466,7 +3120,13 @@ def main() -> None:
         test_hardware_batch_policy_keeps_cpu_batches_moderate,
         test_worker_serializes_formula_result,
         test_worker_passes_extended_formula_budget_to_mixed_runtime,
+        test_worker_reads_shared_memory_images,
+        test_worker_recognizes_mixed_batch,
+        test_worker_warmup_forwards_deep_flag_and_starts_prewarm,
+        test_worker_streams_mixed_partial_events_before_result,
+        test_worker_cancels_in_flight_request_and_stays_usable,
         test_worker_reports_unsupported_action,
+        test_worker_start_does_not_import_text_pipeline,
     ]
     for test in tests:
         test()
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import types
+
+from workers.recognition_workers import PDF_PAGE_PRIORITY, PdfPredictWorker
+
+
+class _FakePixmap:
+    def __init__(self, shade: int) -> None:
+        self.width = 4
+        self.height = 2
+        self.samples = bytes([shade]) * (self.width * self.height * 3)
+
+
+class _FakeDocument:
+    page_count = 5
+
+    def load_page(self, index: int):
+        return types.SimpleNamespace(get_pixmap=lambda dpi, alpha: _FakePixmap(index))
+
+    def close(self) -> None:
+        pass
+
+
+class _PooledWrapper:
+    pool_size = 3
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.priorities: list[int] = []
+
+    def predict_result(self, image, model_name: str = "mathcraft_mixed", *, priority: int = 0):
+        shade = image.getpixel((0, 0))[0]
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.priorities.append(priority)
+        time.sleep(0.02 * (5 - shade))
+        with self.lock:
+            self.active -= 1
+        return {"text": f"page {shade}", "mode": "mixed"}
+
+
+def test_pdf_worker_runs_pages_in_parallel_and_keeps_page_order(monkeypatch) -> None:
+    monkeypatch.setitem(sys.modules, "fitz", types.SimpleNamespace(open=lambda path: _FakeDocument()))
+    wrapper = _PooledWrapper()
+    worker = PdfPredictWorker(wrapper, "doc.pdf", [0, 1, 2, 3, 4], "mathcraft_mixed", "markdown")
+    finished: list[str] = []
+    failed: list[str] = []
+    progress: list[int] = []
+    worker.finished.connect(finished.append)
+    worker.failed.connect(failed.append)
+    worker.progress.connect(lambda current, total: progress.append(current))
+
+    worker.run()
+
+    assert failed == []
+    text = finished[0]
+    assert [text.index(f"page {index}") for index in range(5)] == sorted(
+        text.index(f"page {index}") for index in range(5)
+    )
+    assert worker.pages_done == 5
+    assert progress == [1, 2, 3, 4, 5]
+    assert wrapper.peak > 1
+    assert set(wrapper.priorities) == {PDF_PAGE_PRIORITY}
+
+
+class _JobScopedWrapper:
+    pool_size = 2
+
+    def __init__(self) -> None:
+        self.jobs: set[str] = set()
+        self.cancelled: list[str] = []
+
+    def predict_result(self, image, model_name: str = "mathcraft_mixed", *, priority: int = 0, job: str = ""):
+        self.jobs.add(job)
+        return {"text": "page", "mode": "mixed"}
+
+    def cancel_worker_requests(self, job: str) -> int:
+        self.cancelled.append(job)
+        return 0
+
+
+def test_pdf_worker_tags_pages_with_its_job_and_cancels_only_that_job(monkeypatch) -> None:
+    monkeypatch.setitem(sys.modules, "fitz", types.SimpleNamespace(open=lambda path: _FakeDocument()))
+    wrapper = _JobScopedWrapper()
+    worker = PdfPredictWorker(wrapper, "doc.pdf", [0, 1, 2], "mathcraft_mixed", "markdown")
+    other = PdfPredictWorker(wrapper, "doc.pdf", [0], "mathcraft_mixed", "markdown")
+
+    worker.run()
+    worker.cancel()
+
+    assert wrapper.jobs == {worker.job_id}
+    assert wrapper.cancelled == [worker.job_id]
+    assert other.job_id != worker.job_id